@@ -0,0 +1,193 @@
+# coding: utf-8
+# Card and action abstraction. The chance outcomes of a game are grouped into
+# buckets (e.g. by hand strength) and some of the betting actions are left out,
+# which gives a smaller abstract game to solve. Its strategy is played in the
+# real game by translating real information sets to abstract ones.
+
+import time
+
+import numpy as np
+
+import best_response
+from compiled_game import compile_game
+from extensive_game import ExtensiveGame, ExtensiveGameNode
+from vector_cfr import VectorCFR
+
+
+def bucket_cards(strengths, num_buckets):
+    """ Groups cards into 'num_buckets' buckets of (nearly) equal size by their
+    strength, where 'strengths' is a dictionary from cards to numbers. Returns a
+    dictionary from cards to the weakest card in their bucket, which stands for
+    the bucket.
+    """
+    cards = sorted(strengths, key=lambda c: strengths[c])
+    buckets = {}
+    for bucket in np.array_split(cards, num_buckets):
+        for card in bucket:
+            buckets[int(card)] = int(bucket[0])
+    return buckets
+
+
+class Abstraction:
+    """ An abstraction of the game given by the node function 'create_node' (in
+    the form of LeducPoker.create_node) and the deck 'cards'.
+    - card_bucket: a function taking the position of a chance outcome in the
+      action list and the outcome, and returning its bucket. Buckets are
+      identified by a representative outcome. They may only depend on the
+      position and the outcome itself, so that they never reveal hidden cards.
+    - action_menu: a function taking an action list of the abstract game and
+      the actions available after it, and returning the actions kept.
+    - is_chance_action: a function telling chance outcomes from betting actions
+      in an information set identifier.
+    - default_action: the action which real actions left out of the menu are
+      translated to, and which is played in real information sets that have no
+      abstract counterpart. It is assumed to close the betting round, like a
+      call.
+    """
+
+    def __init__(self, create_node, cards, card_bucket, action_menu,
+                 is_chance_action, default_action=1):
+        self.create_node = create_node
+        self.cards = cards
+        self.card_bucket = card_bucket
+        self.action_menu = action_menu
+        self.is_chance_action = is_chance_action
+        self.default_action = default_action
+
+    def create_game(self):
+        """ Creates the abstract game as an ExtensiveGame. Every abstract node
+        stands for the real nodes whose chance outcomes fall in the same buckets
+        and whose actions are the same. Chance probabilities are the total
+        probabilities of the buckets, and terminal utilities are averaged over
+        the real nodes, weighted by their chance probabilities. The real game
+        is walked node by node, and is never built in full.
+        """
+        return ExtensiveGame(self.create_abstract_node([], [([], self.cards, 1.0)]))
+
+    def create_abstract_node(self, action_list, members):
+        """ Creates the abstract node reached by 'action_list', and the tree
+        below it. 'members' is a list of the real nodes it stands for, each
+        given by its action list, its deck and its chance probability.
+        """
+        real_nodes = [(self.create_node(real_list, cards), real_list, weight)
+                      for real_list, cards, weight in members]
+        node = ExtensiveGameNode(real_nodes[0][0][0].player)
+        node.hidden_from = real_nodes[0][0][0].hidden_from
+        total = sum(weight for _, _, weight in real_nodes)
+
+        if node.player == -1:
+            node.utility = {
+                p: sum(weight * real.utility[p]
+                       for (real, _), _, weight in real_nodes) / total
+                for p in [1, 2]}
+        elif node.player == 0:
+            # Group the outcomes of all the real chance nodes by bucket.
+            buckets = {}
+            for (real, children), real_list, weight in real_nodes:
+                for card, cards in children.items():
+                    bucket = self.card_bucket(len(real_list), card)
+                    buckets.setdefault(bucket, []).append(
+                        (real_list + [card], cards,
+                         weight * real.chance_probs[card]))
+            for bucket, child_members in buckets.items():
+                node.chance_probs[bucket] = sum(
+                    weight for _, _, weight in child_members) / total
+                node.children[bucket] = self.create_abstract_node(
+                    action_list + [bucket], child_members)
+        else:
+            # The betting must not depend on the cards within a bucket.
+            actions = list(real_nodes[0][0][1].keys())
+            for (real, children), _, _ in real_nodes:
+                assert real.player == node.player and list(children) == actions
+            for action in self.action_menu(action_list, actions):
+                node.children[action] = self.create_abstract_node(
+                    action_list + [action],
+                    [(real_list + [action], children[action], weight)
+                     for (_, children), real_list, weight in real_nodes])
+        return node
+
+    def translate_info_set(self, info_set):
+        """ Maps the identifier of an information set of the real game to the
+        identifier of the abstract information set it is played as. Chance
+        outcomes are replaced by their buckets. An action left out of the menu
+        is replaced by default_action, and the actions after it in the same
+        betting round are dropped.
+        """
+        key = []
+        round_closed = False
+        for a in info_set:
+            if a == -1:
+                key.append(-1)
+            elif self.is_chance_action(a):
+                key.append(self.card_bucket(len(key), a))
+                round_closed = False
+            elif round_closed:
+                continue
+            elif len(self.action_menu(key, [a])) > 0:
+                key.append(a)
+            else:
+                key.append(self.default_action)
+                round_closed = True
+        return tuple(key)
+
+    def real_strategy(self, strategy, info_set, actions):
+        """ Returns the probabilities over 'actions' to play in the information
+        set 'info_set' of the real game, according to 'strategy', a strategy of
+        the abstract game. Actions left out of the menu are never played.
+        """
+        probs = strategy.get(self.translate_info_set(info_set))
+        if probs is None:
+            if self.default_action in actions:
+                return {a: float(a == self.default_action) for a in actions}
+            return {a: 1.0 / len(actions) for a in actions}
+        return {a: probs.get(a, 0.0) for a in actions}
+
+    def translate_strategy(self, strategy, game):
+        """ Returns the strategy in every information set of the real game
+        'game' (an ExtensiveGame) played by translating to 'strategy'.
+        """
+        info_sets = game.info_sets
+        return {key: self.real_strategy(strategy, key, actions)
+                for key, actions in zip(info_sets.keys, info_sets.actions)}
+
+
+def benchmark_abstraction(abstraction, real_game=None, num_iters=1000,
+                          eval_iters=100):
+    """ Builds the abstract game and solves it with vector_cfr.VectorCFR. Every
+    'eval_iters' iterations, records the solve time so far (excluding the
+    evaluations), the exploitability of the average strategy in the abstract
+    game and, if 'real_game' (an ExtensiveGame) is given, the exploitability
+    of the translated strategy in the real game. Returns a list of
+    dictionaries with keys "iteration", "solve_time", "abstract_exploitability"
+    and "real_exploitability".
+    """
+    start = time.perf_counter()
+    abstract_game = compile_game(abstraction.create_game())
+    build_time = time.perf_counter() - start
+    print("Abstract game: {} information sets (built in {:.2f}s)".format(
+        abstract_game.num_info_sets, build_time))
+
+    solver = VectorCFR(abstract_game)
+    solve_time = 0.0
+    results = []
+    for t in range(1, num_iters + 1):
+        start = time.perf_counter()
+        solver.iteration()
+        solve_time += time.perf_counter() - start
+
+        if t % eval_iters == 0 or t == num_iters:
+            result = {"iteration": t, "solve_time": solve_time,
+                      "abstract_exploitability": float(best_response.compute_exploitability(
+                          abstract_game, solver.state.average_strategy()[0])),
+                      "real_exploitability": None}
+            if real_game is not None:
+                strategy = solver.state.average_strategy_dict(abstract_game)
+                result["real_exploitability"] = float(best_response.compute_exploitability(
+                    real_game.compile(),
+                    abstraction.translate_strategy(strategy, real_game)))
+            print("t: {} solve time: {:.2f}s abstract exploitability: {:.4f} "
+                  "real exploitability: {}".format(
+                      t, solve_time, result["abstract_exploitability"],
+                      result["real_exploitability"]))
+            results.append(result)
+    return results
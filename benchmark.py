@@ -0,0 +1,313 @@
+# coding: utf-8
+# A benchmark harness for the solvers. Every configuration (a game, a deck size
+# and a solver) runs in a fresh process, so that its peak memory is measured on
+# its own, and records the wall time, the iterations per second and the
+# exploitability of the average strategy as the run goes on. The results are
+# written as JSON, and two result files can be compared to catch performance
+# regressions between versions.
+#
+# Usage:
+#   python benchmark.py --output results.json
+#   python benchmark.py --games leduc:3,5 --solvers vector_cfr external
+#   python benchmark.py --compare old.json new.json
+#   python benchmark.py --cache-dir ~/.cache/cfr_games
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+GAMES = ["one_card", "leduc"]
+
+SOLVERS = ["cfr", "cfr+", "dcfr", "simultaneous_cfr", "simultaneous_cfr+",
+           "simultaneous_dcfr", "pruned_cfr", "pruned_cfr+", "dealt_cfr",
+           "dealt_cfr+", "vector_cfr", "vector_cfr+", "vector_dcfr",
+           "external", "outcome", "public_tree"]
+
+DEFAULT_DECK_SIZES = {"one_card": [3, 13], "leduc": [3, 5]}
+
+
+def game_class(game_name):
+    """ Returns the class creating the game called 'game_name'.
+    """
+    if game_name == "one_card":
+        from one_card_poker import OneCardPoker
+        return OneCardPoker
+    from leduc_poker import LeducPoker
+    return LeducPoker
+
+
+def create_solver(game_name, n_cards, solver_name, seed=0, cache_dir=None):
+    """ Builds the game and the solver. Returns a function running iteration t
+    (counting from 0), and a function returning the exploitability of the
+    current average strategy. 'seed' seeds the deal streams of the dealt_
+    solvers. If 'cache_dir' is given, the compiled game is loaded from the
+    cache there (see game_cache).
+    """
+    import best_response
+    import cfr
+    import mccfr
+    import public_tree_cfr
+    from cfr_game import CFRGame
+    from deal_stream import ChanceTree, DealStream
+    from game_cache import cached_compiled_game
+    from pruning import RegretPruning, utility_range
+    from solver_state import SolverState
+    from vector_cfr import VectorCFR
+
+    game_type = game_class(game_name)
+    if solver_name == "public_tree":
+        tree = game_type.create_public_tree(n_cards)
+        r = np.ones(len(tree.hands))
+
+        def step(t):
+            public_tree_cfr.cfr_pass(tree.root, r, r)
+
+        return step, lambda: public_tree_cfr.compute_exploitability(tree)
+
+    if cache_dir is None or solver_name in ["external", "outcome"]:
+        game = game_type.create_game(n_cards)
+        compiled = game.compile()
+    else:
+        # The solvers of the compiled game don't need the game tree itself.
+        compiled = cached_compiled_game(game_type, n_cards, cache_dir)
+    if solver_name in ["cfr", "cfr+", "dcfr"] or solver_name.startswith(
+            ("simultaneous_", "pruned_", "dealt_")):
+        state = SolverState.from_game(compiled)
+        # The simultaneous_ solvers walk the tree once per iteration for both
+        # players, the pruned_ ones prune it and the dealt_ ones read the
+        # chance outcomes from pre-drawn deals (see cfr.cfr).
+        traversal = "alternating"
+        pruning = None
+        deals = None
+        variant = solver_name
+        if solver_name.startswith("simultaneous_"):
+            traversal = "simultaneous"
+            variant = solver_name[len("simultaneous_"):]
+        elif solver_name.startswith("pruned_"):
+            variant = solver_name[len("pruned_"):]
+            pruning = RegretPruning(utility_range(compiled),
+                                    regret_based=variant == "cfr")
+        elif solver_name.startswith("dealt_"):
+            variant = solver_name[len("dealt_"):]
+            deals = DealStream(ChanceTree(compiled), seed)
+
+        def step(t):
+            cfr.cfr_compiled_iteration(
+                compiled, state, t, variant, traversal=traversal,
+                pruning=pruning,
+                deal=deals.deal(t) if deals is not None else None)
+
+        return step, lambda: best_response.compute_exploitability(
+            compiled, state.average_strategy()[0])
+    elif solver_name.startswith("vector_"):
+        solver = VectorCFR(compiled)
+        variant = solver_name[len("vector_"):]
+
+        def step(t):
+            solver.step(t, variant)
+
+        return step, lambda: best_response.compute_exploitability(
+            compiled, solver.state.average_strategy()[0])
+
+    assert solver_name in ["external", "outcome"]
+    cfr_game = CFRGame(game)
+    regrets = dict()
+    action_counts = dict()
+
+    def step(t):
+        mccfr.mccfr_iteration(cfr_game, regrets, action_counts, solver_name)
+
+    def exploitability():
+        average_strategy = cfr.compute_average_strategy(action_counts)
+        return best_response.compute_exploitability(
+            compiled, compiled.complete_strategy_uniformly(
+                average_strategy, verbose=False))
+
+    return step, exploitability
+
+
+def peak_memory_mb():
+    """ The peak resident memory of this process so far, in megabytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0)
+
+
+def evaluation_points(num_iters, num_points):
+    """ Roughly geometrically spaced iterations (counting from 1) at which to
+    evaluate the exploitability, always including the last one.
+    """
+    points = np.unique(np.geomspace(1, num_iters, num_points).astype(int))
+    return set(points.tolist()) | {num_iters}
+
+
+def run_config(game_name, n_cards, solver_name, num_iters, time_budget,
+               num_points, seed, cache_dir=None):
+    """ Runs one configuration and returns its results as a dictionary. The
+    exploitability checks are not counted in the solve time. The run stops
+    after 'num_iters' iterations, or once the solve time exceeds
+    'time_budget' seconds. The games are loaded from the cache in
+    'cache_dir', if it is given.
+    """
+    np.random.seed(seed)
+    baseline_memory = peak_memory_mb()
+
+    start = time.perf_counter()
+    step, exploitability = create_solver(game_name, n_cards, solver_name, seed,
+                                         cache_dir)
+    build_time = time.perf_counter() - start
+
+    points = evaluation_points(num_iters, num_points)
+    solve_time = 0.0
+    curve = []
+    t = 0
+    while t < num_iters:
+        start = time.perf_counter()
+        step(t)
+        solve_time += time.perf_counter() - start
+        t += 1
+
+        out_of_time = time_budget is not None and solve_time > time_budget
+        if t in points or out_of_time:
+            curve.append({"iteration": t, "solve_time": solve_time,
+                          "iterations_per_second": t / solve_time,
+                          "exploitability": float(exploitability())})
+        if out_of_time:
+            break
+
+    return {"game": game_name, "n_cards": n_cards, "solver": solver_name,
+            "seed": seed, "iterations": t, "build_time": build_time,
+            "solve_time": solve_time,
+            "iterations_per_second": t / solve_time,
+            "final_exploitability": curve[-1]["exploitability"],
+            "baseline_memory_mb": baseline_memory,
+            "peak_memory_mb": peak_memory_mb(),
+            "curve": curve}
+
+
+def _run_config(args):
+    return run_config(*args)
+
+
+def version_info():
+    """ Describes the code and the machine the benchmark ran on.
+    """
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {"revision": revision, "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(),
+            "processor": platform.processor(),
+            "date": datetime.datetime.now().isoformat()}
+
+
+def run_benchmarks(configs, num_iters=1000, time_budget=None, num_points=10,
+                   seed=0, cache_dir=None):
+    """ Runs every configuration in 'configs', a list of (game name, number of
+    cards, solver name) tuples, each in a new process. Returns the results in
+    the format written by main.
+    """
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for game_name, n_cards, solver_name in configs:
+        print("{} {} {}".format(game_name, n_cards, solver_name))
+        with context.Pool(1) as pool:
+            result = pool.apply(_run_config, ((
+                game_name, n_cards, solver_name, num_iters, time_budget,
+                num_points, seed, cache_dir),))
+        print("  {} iterations, {:.1f} it/s, {:.1f} MB peak, exploitability "
+              "{:.5f}".format(result["iterations"],
+                              result["iterations_per_second"],
+                              result["peak_memory_mb"],
+                              result["final_exploitability"]))
+        runs.append(result)
+    return {"version": version_info(), "num_iters": num_iters,
+            "time_budget": time_budget, "runs": runs}
+
+
+def compare_results(old, new):
+    """ Prints the change in speed and final exploitability of every
+    configuration found in both result dictionaries, 'old' and 'new'.
+    """
+    def key(run):
+        return (run["game"], run["n_cards"], run["solver"])
+
+    old_runs = {key(run): run for run in old["runs"]}
+    print("game        cards solver        it/s old    it/s new   ratio   "
+          "expl. old   expl. new")
+    for run in new["runs"]:
+        if key(run) not in old_runs:
+            continue
+        old_run = old_runs[key(run)]
+        print("{:11s} {:5d} {:12s} {:9.1f} {:11.1f} {:7.2f} {:11.5f} {:11.5f}".format(
+            run["game"], run["n_cards"], run["solver"],
+            old_run["iterations_per_second"], run["iterations_per_second"],
+            run["iterations_per_second"] / old_run["iterations_per_second"],
+            old_run["final_exploitability"], run["final_exploitability"]))
+
+
+def parse_games(specs):
+    """ Parses game specifications like "leduc:3,5" into (game, n_cards)
+    pairs. A game without deck sizes uses DEFAULT_DECK_SIZES.
+    """
+    games = []
+    for spec in specs:
+        name, _, sizes = spec.partition(":")
+        if name not in GAMES:
+            raise ValueError("Unknown game {}.".format(name))
+        sizes = [int(n) for n in sizes.split(",")] if sizes else DEFAULT_DECK_SIZES[name]
+        games.extend((name, n) for n in sizes)
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CFR solvers.")
+    parser.add_argument("--games", nargs="+", default=GAMES,
+                        help="games to run, e.g. leduc:3,5 one_card")
+    parser.add_argument("--solvers", nargs="+", default=SOLVERS,
+                        choices=SOLVERS)
+    parser.add_argument("--iters", type=int, default=1000,
+                        help="the number of iterations of every run")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="stop every run after this many seconds")
+    parser.add_argument("--points", type=int, default=10,
+                        help="the number of exploitability evaluations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-dir", default=None,
+                        help="load the compiled games from a cache there")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        compare_results(old, new)
+        return
+
+    configs = [(game, n_cards, solver) for game, n_cards in parse_games(args.games)
+               for solver in args.solvers]
+    results = run_benchmarks(configs, args.iters, args.time_budget,
+                             args.points, args.seed, args.cache_dir)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("Wrote {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
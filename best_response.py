@@ -2,6 +2,11 @@
 # Computes a best response for a given strategy in a given game.
 import itertools
 
+import numpy as np
+
+from compiled_game import CompiledGame
+from traversal import Traversal
+
 
 def br(game, info_set, reach_probs, strategy, br_strategy, i):
     """- game is an ExtensiveGame object, defining a game by a game tree.
@@ -18,90 +23,201 @@ def br(game, info_set, reach_probs, strategy, br_strategy, i):
     - info_set_ids is a dictionary from nodes in the game tree to identifiers
       for the information set containing that node. The information set is for
       the player in the given node.
+    The walk over the tree of information sets (a BestResponseWalk) keeps an
+    explicit stack, so it is not limited by the recursion limit.
     """
-    # Check if the information set is terminal (i.e. has a terminal node in it).
-    if info_set[0].player == -1:
-        # It's a terminal node, so we return the utility for player i, weighted
-        # by the reach probabilities.
-        utility = 0.0
-        for node in info_set:
-            utility += reach_probs[node] * node.utility[i]
-        return utility
-    # The information set is not terminal
-    if info_set[0].player != i:
-        # The information set belongs to an opponent of i (including chance)
-        info_sets = {}
-        new_reach_probs = {}
-        for node in info_set:
-            for action, child in node.children.items():
-                # Add child to the information set corresponding to taking
-                # action 'action'.
-                if action not in info_sets:
-                    info_sets[action] = []
-                info_sets[action].append(child)
-
-                # Update the reach probability by multiplying by the chance the
-                # opponent takes this action.
-
-                # It's a chance player:
-                if node.player == 0:
-                    new_prob = node.chance_probs[action]
-                else:
-                    new_prob = strategy[game.info_set_ids[node]][action]
-                new_reach_probs[child] = reach_probs[node] * new_prob
-
-        # Convert the information sets into a list, partitioned by actions.
-        info_sets = [info_sets[a] for a in info_sets]
-
-        # If the actions in the node are not hidden from i, then we need a new
-        # information set for each action. If they are hidden from i, then all
-        # the child nodes are in the same information set.
-        if i in info_set[0].hidden_from:
-            # Concatenate the lists in info_sets into one list. Put it inside a
-            # list again, so that we have a list of information sets (i.e. a
-            # list of lists).
-            info_sets = [list(itertools.chain(*info_sets))]
-
-        # For each resulting information set, compute the best response, and
-        # return the sum
-        br_sum = 0.0
-        for I in info_sets:
-            br_sum += br(game, I, new_reach_probs, strategy, br_strategy, i)
-        return br_sum
-    else:
-        # The info set belongs to i. Player i chooses the action with maximum
-        # value returned by br.
-        brs = []
-        actions = []
-        for action in info_set[0].children:
-            next_info_set = [node.children[action] for node in info_set]
-            # The reach probabilities don't change, since it's i's information
-            # set.
-            next_reach_probs = {
-                node.children[action]: reach_probs[node] for node in info_set}
-            brs.append(br(game, next_info_set, next_reach_probs, strategy,
-                          br_strategy, i))
-            actions.append(action)
-
-        # Player i chooses action with maximum value.
-        info_set_id = game.info_set_ids[info_set[0]]
-        br_strategy[info_set_id] = {a: 0.0 for a in info_set[0].children}
-
-        # Get the maximum br and its corresponding action.
-        best_action, best_br = max(zip(actions, brs), key=(lambda x: x[1]))
-
-        # Set the best action to have probability 1
-        br_strategy[info_set_id][best_action] = 1.0
-        return best_br
+    return BestResponseWalk(game, strategy, br_strategy, i).walk(
+        (info_set, reach_probs))
+
+
+class BestResponseWalk(Traversal):
+    """ The walk of br over the tree of information sets of player i (see
+    traversal.Traversal). Its nodes are pairs of an information set (a list of
+    nodes) and the reach probabilities of its nodes. The buffers hold the
+    information set expanded at each depth and its children.
+    """
+
+    def __init__(self, game, strategy, br_strategy, i):
+        Traversal.__init__(self, {"info_sets": None, "children": None})
+        self.game = game
+        self.strategy = strategy
+        self.br_strategy = br_strategy
+        self.i = i
+        self.info_sets = self.buffers.info_sets
+        self.children = self.buffers.children
+
+    def enter(self, depth, k):
+        info_set, reach_probs = (self.root if depth == 0 else
+                                 self.children[depth - 1][k])
+        i = self.i
+        if info_set[0].player == -1:
+            # It's a terminal information set, so its value is the utility
+            # for player i, weighted by the reach probabilities.
+            value = 0.0
+            for node in info_set:
+                value += reach_probs[node] * node.utility[i]
+            self.leaf_value = value
+            return 0
+
+        if info_set[0].player != i:
+            # The information set belongs to an opponent of i (including
+            # chance)
+            info_sets = {}
+            new_reach_probs = {}
+            for node in info_set:
+                for action, child in node.children.items():
+                    # Add child to the information set corresponding to taking
+                    # action 'action'.
+                    if action not in info_sets:
+                        info_sets[action] = []
+                    info_sets[action].append(child)
+
+                    # Update the reach probability by multiplying by the
+                    # chance the opponent takes this action.
+
+                    # It's a chance player:
+                    if node.player == 0:
+                        new_prob = node.chance_probs[action]
+                    else:
+                        new_prob = self.strategy[self.game.info_set_ids[node]][action]
+                    new_reach_probs[child] = reach_probs[node] * new_prob
+
+            # Convert the information sets into a list, partitioned by
+            # actions.
+            info_sets = [info_sets[a] for a in info_sets]
+
+            # If the actions in the node are not hidden from i, then we need a
+            # new information set for each action. If they are hidden from i,
+            # then all the child nodes are in the same information set.
+            if i in info_set[0].hidden_from:
+                # Concatenate the lists in info_sets into one list. Put it
+                # inside a list again, so that we have a list of information
+                # sets (i.e. a list of lists).
+                info_sets = [list(itertools.chain(*info_sets))]
+            children = [(I, new_reach_probs) for I in info_sets]
+        else:
+            # The info set belongs to i. There is a child information set for
+            # each action. The reach probabilities don't change, since it's
+            # i's information set.
+            children = [
+                ([node.children[action] for node in info_set],
+                 {node.children[action]: reach_probs[node] for node in info_set})
+                for action in info_set[0].children]
+
+        self.info_sets[depth] = info_set
+        self.children[depth] = children
+        return len(children)
+
+    def leave(self, depth, values):
+        info_set = self.info_sets[depth]
+        if info_set[0].player != self.i:
+            # Return the sum of the best responses of the resulting
+            # information sets.
+            value = 0.0
+            for k in range(len(self.children[depth])):
+                value += values[k]
+        else:
+            # Player i chooses action with maximum value.
+            info_set_id = self.game.info_set_ids[info_set[0]]
+            self.br_strategy[info_set_id] = {a: 0.0 for a in info_set[0].children}
+
+            # Get the maximum br and its corresponding action.
+            best_action, value = max(zip(info_set[0].children, values),
+                                     key=(lambda x: x[1]))
+
+            # Set the best action to have probability 1
+            self.br_strategy[info_set_id][best_action] = 1.0
+        return value
+
+
+def best_response_arrays(game, strategy):
+    """ Computes the best response of both players in a single bottom up pass
+    over a CompiledGame. Returns an array with the best response value of
+    player 1 and of player 2, and an array with the position of the action
+    chosen by the best response in every information set (of either player).
+    - strategy: either a strategy dictionary, or an array of shape
+      (num_info_sets, max_actions) as returned by game.strategy_to_array.
+    """
+    if isinstance(strategy, dict):
+        strategy = game.strategy_to_array(strategy)
+    edge = game.edge_probs(strategy)
+
+    # values[node, i - 1] is the best response value of the subtree below node
+    # for player i, weighted by the probability that chance and -i play to
+    # reach the node.
+    values = np.zeros((game.num_nodes, 2))
+    for i in [1, 2]:
+        pi_minus_i = game.chance_reach * game.player_reach(edge, 3 - i)
+        values[:, i - 1] = pi_minus_i * game.utility[:, i - 1]
+
+    # The action chosen by the best response in each information set. The
+    # nodes in an information set all have the same depth, so every
+    # information set is decided while handling the level of its children.
+    best_actions = np.zeros(game.num_info_sets, dtype=np.int64)
+    mask = game.action_mask
+    max_actions = game.max_actions
+    for start, end, parents, inverse in reversed(game.levels):
+        parent_player = game.player[parents]
+        for i in [1, 2]:
+            # Nodes of -i (and chance) sum the values of their children.
+            sums = np.bincount(inverse, values[start:end, i - 1], len(parents))
+            others = parent_player != i
+            values[parents[others], i - 1] = sums[others]
+
+            # Nodes of i add up the value of each action over the information
+            # set, and play the best one in every node of the information set.
+            own = parents[parent_player == i]
+            if len(own) == 0:
+                continue
+            children = np.arange(start, end)
+            children = children[game.player[game.parent[children]] == i]
+            flat = (game.info_set[game.parent[children]] * max_actions +
+                    children - game.child_start[game.parent[children]])
+            low = flat.min() - flat.min() % max_actions
+            action_values = np.bincount(
+                flat - low, values[children, i - 1],
+                flat.max() - low + max_actions - flat.max() % max_actions
+            ).reshape(-1, max_actions)
+            # Only the information sets of i are decided here. The rows of
+            # action_values cover every id between the lowest and highest of
+            # them, which can include information sets of -i.
+            info_sets = np.unique(game.info_set[own])
+            rows = action_values[info_sets - low // max_actions]
+            best_actions[info_sets] = np.argmax(
+                np.where(mask[info_sets], rows, -np.inf), axis=1)
+            values[own, i - 1] = values[
+                game.child_start[own] + best_actions[game.info_set[own]], i - 1]
+
+    return values[game.root], best_actions
+
+
+def compute_best_responses(game, strategy):
+    """ Returns a dictionary from each player i to the same (br_value,
+    br_strategy) pair as compute_best_response(game, strategy, i), computing
+    both with best_response_arrays.
+    """
+    br_values, best_actions = best_response_arrays(game, strategy)
+    best_responses = {}
+    for i in [1, 2]:
+        br_strategy = {}
+        for idx in np.flatnonzero(game.info_set_player == i):
+            actions = game.info_set_actions[idx, :game.info_set_num_actions[idx]]
+            br_strategy[game.info_set_keys[idx]] = {
+                int(a): 1.0 if k == best_actions[idx] else 0.0
+                for k, a in enumerate(actions)}
+        best_responses[i] = (br_values[i - 1], br_strategy)
+    return best_responses
 
 
 def compute_best_response(game, strategy, i):
-    """ Given a game (defined by an ExtensiveGame) and a strategy (defined by a
-    dictionary from nodes in the game tree to probabilities over actions),
-    returns the best response for player i against the other player.
+    """ Given a game (defined by an ExtensiveGame or a CompiledGame) and a
+    strategy (defined by a dictionary from nodes in the game tree to
+    probabilities over actions), returns the best response for player i against the other player.
     - strategy: dictionary from information set identifiers for player -i to
       probabilities over their actions.
     """
+    if isinstance(game, CompiledGame):
+        return compute_best_responses(game, strategy)[i]
     br_strategy = {}
     br_value = br(game, [game.root], {game.root: 1.0}, strategy, br_strategy, i)
     return br_value, br_strategy
@@ -109,8 +225,13 @@ def compute_best_response(game, strategy, i):
 
 def compute_exploitability(game, strategy):
     """ Computes the exploitability of a given strategy. The strategy must
-    implement both player 1 and player 2 information sets.
+    implement both player 1 and player 2 information sets. For a CompiledGame
+    the strategy may also be an array, as in best_response_arrays.
     """
+    if isinstance(game, CompiledGame):
+        br_values, _ = best_response_arrays(game, strategy)
+        return br_values.sum()
+
     # First compute the best response against the strategy when the strategy
     # plays as player 1. Then compute the best response against the strategy
     # when it plays as player 2.
@@ -2,12 +2,114 @@
 # This implements Counterfactual Regret Minimization in a general zero sum two
 # player game.
 
+import collections.abc
+import math
+import os
+import statistics
+
 import numpy as np
 
 import best_response
+import checkpoint
+import mccfr
+from compiled_game import CompiledGame, compile_game
+from deal_stream import DealtGame, chance_depths
+from lazy_game import LazyGame
+from metrics import NULL_METRICS
+from pruning import RegretPruning, utility_range
+from solver_state import SolverState, compare_strategy_arrays
+from traversal import Traversal
+
+
+def cfr(game, num_iters=10000, info_iters=100, algorithm="chance",
+        variant="cfr", alpha=1.5, beta=0.0, gamma=2.0, checkpoint_path=None,
+        checkpoint_iters=5000, resume=False, metrics=None,
+        traversal="alternating", pruning=None, deals=None):
+    """ Runs CFR on a CFRGame and returns the average strategy.
+    - algorithm: "chance" for chance sampled CFR, or "external" or "outcome"
+      for the Monte Carlo CFR variants in mccfr, which only take 'metrics' of
+      the arguments below.
+    - variant: how regrets and the average strategy are accumulated by chance
+      sampled CFR. "cfr" is plain CFR. "cfr+" floors the regrets at zero,
+      weights the average strategy linearly in t and alternates the updates of
+      the players. "dcfr" is Discounted CFR (Brown and Sandholm, 2019), which
+      alternates updates and after iteration t multiplies positive regrets by
+      t^alpha / (t^alpha + 1), negative regrets by t^beta / (t^beta + 1) and
+      the action counts by (t / (t + 1))^gamma.
+    - traversal: how chance sampled CFR walks the tree in an iteration.
+      "alternating" walks it once for each player, sampling the chance
+      outcomes separately each time, and only updates the regrets and action
+      counts of that player. "simultaneous" walks it once, computing the
+      values of both players and updating both of them on the way, which
+      visits half as many nodes. With "simultaneous", both players' updates
+      use the strategy from the start of the iteration, even for the variants
+      that otherwise alternate updates.
+    - pruning: None to walk every subtree, "partial" to skip the subtrees
+      neither player reaches (both reach probabilities are zero), or "regret"
+      to also skip actions whose regret guarantees they won't be played for a
+      number of iterations (see pruning.py). Regret-based pruning needs plain
+      CFR ("cfr", since CFR+ has no negative regrets and DCFR discounts them)
+      and the utility range of the game, so it can't be used on a LazyGame.
+      Pruning only applies to the alternating traversal.
+    - deals: a deal_stream.DealStream to read the chance outcomes of chance
+      sampled CFR from, deal t in iteration t, instead of sampling every
+      chance node as it is visited. Both walks of an alternating iteration
+      then see the same deal. A LazyGame can't use it, since it is never
+      compiled.
+    - checkpoint_path: if given, chance sampled CFR writes a checkpoint (see
+      checkpoint.save_checkpoint) to this file every 'checkpoint_iters'
+      iterations. With resume=True, the run continues from the checkpoint in
+      the file if there is one; num_iters counts from the start of the run.
+    - metrics: a metrics.Metrics object collecting the time spent in each
+      phase of every iteration, the nodes visited and so on. By default
+      nothing is collected.
+    """
+    assert variant in ["cfr", "cfr+", "dcfr"]
+    assert traversal in ["alternating", "simultaneous"]
+    assert pruning in [None, "partial", "regret"]
+    assert pruning is None or traversal == "alternating"
+    assert pruning != "regret" or variant == "cfr"
+    if algorithm in ["external", "outcome"]:
+        assert variant == "cfr" and traversal == "alternating"
+        assert pruning is None and deals is None
+        assert checkpoint_path is None and not resume
+        return mccfr.mccfr(game, num_iters, info_iters, algorithm,
+                           metrics=metrics)
+
+    # Games compiled to arrays use the array backed solver state instead.
+    if isinstance(game.game, CompiledGame):
+        return cfr_compiled(game.game, num_iters, info_iters, variant, alpha,
+                            beta, gamma, checkpoint_path, checkpoint_iters,
+                            resume, metrics, traversal, pruning, deals)
 
+    if metrics is None:
+        metrics = NULL_METRICS
+    # The traversals run on a wrapper counting the nodes they visit, if
+    # counting is on.
+    traversal_game = metrics.counting_game(game)
+    cfr_plus = variant == "cfr+"
+
+    # The exploitability checks run on a compiled copy of the game, which uses
+    # the vectorized best response. A LazyGame is never generated in full, so
+    # it is solved without them (and without checkpoints, which are stored in
+    # the layout of the compiled game).
+    compiled = None
+    if not isinstance(game.game, LazyGame):
+        compiled = compile_game(game.game)
+    else:
+        assert checkpoint_path is None, "Lazy games can't be checkpointed."
+        assert pruning != "regret", "Lazy games have no known utility range."
+        assert deals is None, "Lazy games have no deal streams."
+    if deals is not None:
+        # Sampling chance nodes reads the outcomes of the current deal.
+        traversal_game = DealtGame(traversal_game, chance_depths(game.game.root))
+
+    pruning_state = None
+    if pruning is not None:
+        pruning_state = RegretPruning(
+            utility_range(compiled) if pruning == "regret" else None,
+            regret_based=pruning == "regret")
 
-def cfr(game, num_iters=10000, info_iters=100):
     # regrets is a dictionary where the keys are the information sets and values
     # are dictionaries from actions available in that information set to the
     # counterfactual regret for not playing that action in that information set.
@@ -23,19 +125,30 @@ def cfr(game, num_iters=10000, info_iters=100):
     strategy_t = dict()
     strategy_t_1 = dict()
 
-    average_strategy = None
-    average_strategy_snapshot = None
+    start = 0
+    if resume and checkpoint_path is not None and os.path.exists(checkpoint_path):
+        state, last_iter = checkpoint.load_checkpoint(
+            checkpoint_path, compiled.action_mask)
+        regrets, action_counts, strategy_t = state_to_tables(compiled, state)
+        strategy_t_1 = strategy_t.copy()
+        start = last_iter + 1
+        print("Resuming from iteration {}".format(start))
 
-    # Each information set is uniquely identified with an action tuple.
-    for t in range(num_iters):
-        for i in [1, 2]:
-            cfr_recursive(game, game.game.root, i, t, 1.0, 1.0, regrets,
-                          action_counts, strategy_t, strategy_t_1)
+    # The average strategy is a view normalizing action_counts on demand, and
+    # is only built in full when it is returned. It also keeps the snapshot for
+    # the convergence check.
+    average_strategy = AverageStrategy(action_counts)
 
-        if (t % info_iters == 0) and (average_strategy is not None):
+    # Each information set is uniquely identified with an action tuple.
+    for t in range(start, num_iters):
+        metrics.start_iteration(t)
+        # The convergence check looks at the average strategy after the
+        # previous iteration.
+        if (t % info_iters == 0) and (t > start):
             print("t: {}".format(t))
-            if average_strategy_snapshot is not None:
-                snapshot_distance = compare_strategies(average_strategy, average_strategy_snapshot)
+            if average_strategy.has_snapshot():
+                with metrics.timer("compare_strategies"):
+                    snapshot_distance = average_strategy.snapshot_distance()
                 print("Distance between strategies (t - 100): {:.10f}".format(snapshot_distance))
 
                 # If the snapshot distance is small enough, then return the
@@ -43,13 +156,50 @@ def cfr(game, num_iters=10000, info_iters=100):
                 # the strategy at time t and at time t - 100 is small, which is
                 # hopefully sufficient for convergence.
                 if snapshot_distance < 1e-5:
-                    complete_strategy = game.game.complete_strategy_uniformly(average_strategy)
-                    exploitability = best_response.compute_exploitability(game.game, complete_strategy)
-                    print("Avg strategy exploitability: {:.4f}".format(exploitability))
-                    return average_strategy
+                    with metrics.timer("average_strategy"):
+                        average = average_strategy.materialize()
+                    if compiled is not None:
+                        with metrics.timer("exploitability"):
+                            complete_strategy = game.game.complete_strategy_uniformly(average)
+                            exploitability = best_response.compute_exploitability(compiled, complete_strategy)
+                        print("Avg strategy exploitability: {:.4f}".format(exploitability))
+                    metrics.end_iteration(t)
+                    return average
+
+            average_strategy.take_snapshot()
+
+        weight = averaging_weight(t, variant)
+        if deals is not None:
+            traversal_game.deal = deals.deal(t)
+        with metrics.timer("traversal"):
+            if traversal == "simultaneous":
+                cfr_recursive_simultaneous(
+                    traversal_game, game.game.root, 1.0, 1.0, regrets,
+                    action_counts, strategy_t, strategy_t_1, cfr_plus, weight,
+                    average_strategy)
+            elif pruning_state is not None:
+                for i in [1, 2]:
+                    cfr_recursive_pruned(
+                        traversal_game, game.game.root, i, t, 1.0, 1.0, regrets,
+                        action_counts, strategy_t, strategy_t_1, pruning_state,
+                        cfr_plus, weight, average_strategy)
+                    if variant != "cfr":
+                        strategy_t = strategy_t_1.copy()
+            else:
+                for i in [1, 2]:
+                    cfr_recursive(traversal_game, game.game.root, i, t, 1.0, 1.0,
+                                  regrets, action_counts, strategy_t, strategy_t_1,
+                                  cfr_plus, weight, average_strategy)
+                    # With alternating updates, player 2 already plays against
+                    # the updated strategy of player 1.
+                    if variant != "cfr":
+                        strategy_t = strategy_t_1.copy()
 
-            average_strategy_snapshot = average_strategy.copy()
-        average_strategy = compute_average_strategy(action_counts)
+        if variant == "dcfr":
+            # Discounting scales all the action counts of an information set
+            # alike, so the average strategy doesn't change.
+            with metrics.timer("discount"):
+                discount_tables(regrets, action_counts, t + 1, alpha, beta, gamma)
 
         # Update strategy_t to equal strategy_t_1. We update strategy_t_1 inside
         # cfr_recursive.  We take a copy because we update it inside
@@ -57,16 +207,201 @@ def cfr(game, num_iters=10000, info_iters=100):
         # compare.
         strategy_t = strategy_t_1.copy()
 
+        if t % 1000 == 0 and compiled is not None:
+            # We also compute the best response to the current strategy.
+            with metrics.timer("exploitability"):
+                complete_strategy = game.game.complete_strategy_uniformly(strategy_t)
+                exploitability = best_response.compute_exploitability(compiled, complete_strategy)
+            print("Current strategy exploitability: {:.4f}".format(exploitability))
+
+        if checkpoint_path is not None and (t + 1) % checkpoint_iters == 0:
+            with metrics.timer("checkpoint"):
+                checkpoint.save_checkpoint(
+                    checkpoint_path,
+                    tables_to_state(compiled, regrets, action_counts, strategy_t), t)
+        metrics.end_iteration(t)
+
+    average = average_strategy.materialize()
+    if compiled is not None:
+        complete_strategy = game.game.complete_strategy_uniformly(average)
+        exploitability = best_response.compute_exploitability(compiled, complete_strategy)
+        print("Avg strategy exploitability: {:.4f}".format(exploitability))
+    return average
+
+
+def cfr_compiled(game, num_iters=10000, info_iters=100, variant="cfr",
+                 alpha=1.5, beta=0.0, gamma=2.0, checkpoint_path=None,
+                 checkpoint_iters=5000, resume=False, metrics=None,
+                 traversal="alternating", pruning=None, deals=None):
+    """ The same as cfr, but on a CompiledGame with the regrets, action counts
+    and strategies held in a SolverState. Regret matching and strategy
+    averaging are done once per iteration over all information sets.
+    """
+    state = SolverState.from_game(game)
+
+    start = 0
+    if resume and checkpoint_path is not None and os.path.exists(checkpoint_path):
+        state, last_iter = checkpoint.load_checkpoint(
+            checkpoint_path, game.action_mask)
+        start = last_iter + 1
+        print("Resuming from iteration {}".format(start))
+
+    average_strategy = None
+    average_visited = None
+    average_strategy_snapshot = None
+    snapshot_visited = None
+
+    pruning_state = None
+    if pruning is not None:
+        pruning_state = RegretPruning(
+            utility_range(game), regret_based=pruning == "regret")
+
+    if metrics is None:
+        metrics = NULL_METRICS
+    for t in range(start, num_iters):
+        metrics.start_iteration(t)
+        deal = deals.deal(t) if deals is not None else None
+        cfr_compiled_iteration(game, state, t, variant, alpha, beta, gamma,
+                               traversal, metrics, pruning_state, deal)
+
+        if (t % info_iters == 0) and (average_strategy is not None):
+            print("t: {}".format(t))
+            if average_strategy_snapshot is not None:
+                with metrics.timer("compare_strategies"):
+                    rows = np.flatnonzero(average_visited & snapshot_visited)
+                    snapshot_distance = compare_strategy_arrays(
+                        average_strategy, average_strategy_snapshot,
+                        state.action_mask, rows)
+                print("Distance between strategies (t - 100): {:.10f}".format(snapshot_distance))
+
+                if snapshot_distance < 1e-5:
+                    with metrics.timer("exploitability"):
+                        exploitability = best_response.compute_exploitability(
+                            game, state.average_strategy()[0])
+                    print("Avg strategy exploitability: {:.4f}".format(exploitability))
+                    metrics.end_iteration(t)
+                    return state.average_strategy_dict(game)
+
+            average_strategy_snapshot = average_strategy
+            snapshot_visited = average_visited
+        # The average strategy is only needed by the convergence check in the
+        # next iteration.
+        if (t + 1) % info_iters == 0:
+            with metrics.timer("average_strategy"):
+                average_strategy, average_visited = state.average_strategy()
+
         if t % 1000 == 0:
             # We also compute the best response to the current strategy.
-            complete_strategy = game.game.complete_strategy_uniformly(strategy_t)
-            exploitability = best_response.compute_exploitability(game.game, complete_strategy)
+            with metrics.timer("exploitability"):
+                exploitability = best_response.compute_exploitability(game, state.strategy)
             print("Current strategy exploitability: {:.4f}".format(exploitability))
 
-    complete_strategy = game.game.complete_strategy_uniformly(average_strategy)
-    exploitability = best_response.compute_exploitability(game.game, complete_strategy)
+        if checkpoint_path is not None and (t + 1) % checkpoint_iters == 0:
+            with metrics.timer("checkpoint"):
+                checkpoint.save_checkpoint(checkpoint_path, state, t)
+        metrics.end_iteration(t)
+
+    exploitability = best_response.compute_exploitability(
+        game, state.average_strategy()[0])
     print("Avg strategy exploitability: {:.4f}".format(exploitability))
-    return average_strategy
+    return state.average_strategy_dict(game)
+
+
+def cfr_compiled_iteration(game, state, t, variant="cfr", alpha=1.5, beta=0.0,
+                           gamma=2.0, traversal="alternating",
+                           metrics=NULL_METRICS, pruning=None, deal=None):
+    """ Runs iteration t (counting from 0) of cfr_compiled on the CompiledGame
+    'game', updating the SolverState 'state' in place, including the strategy
+    for the next iteration. The phases are timed in 'metrics' (see
+    metrics.Metrics). 'pruning' is a pruning.RegretPruning to prune the
+    alternating traversals with, or None. 'deal' is the deal_stream.Deal to
+    take the chance outcomes from, or None to sample them as they are visited.
+    """
+    weight = averaging_weight(t, variant)
+    traversal_game = metrics.counting_compiled_game(game)
+    if traversal == "simultaneous":
+        with metrics.timer("traversal"):
+            cfr_recursive_compiled_simultaneous(
+                traversal_game, game.root, 1.0, 1.0, state, variant == "cfr+",
+                weight, deal)
+    else:
+        for i in [1, 2]:
+            with metrics.timer("traversal"):
+                if pruning is not None:
+                    cfr_recursive_compiled_pruned(
+                        traversal_game, game.root, i, t, 1.0, 1.0, state,
+                        pruning, variant == "cfr+", weight, deal)
+                else:
+                    cfr_recursive_compiled(traversal_game, game.root, i, 1.0,
+                                           1.0, state, variant == "cfr+", weight,
+                                           deal)
+            if variant != "cfr":
+                with metrics.timer("regret_matching"):
+                    state.update_strategy()
+
+    if variant == "dcfr":
+        with metrics.timer("discount"):
+            state.discount(t + 1, alpha, beta, gamma)
+
+    # The regrets have been updated in place during the traversals, so the
+    # strategy for the next iteration is a single regret matching step.
+    with metrics.timer("regret_matching"):
+        state.update_strategy()
+
+
+def resume_cfr(game, checkpoint_path, num_iters=10000, checkpoint_iters=5000,
+               **kwargs):
+    """ Continues a run of cfr from the checkpoint in 'checkpoint_path' (or
+    starts it, if there is no checkpoint yet), and keeps checkpointing to the
+    same file. The other arguments are passed on to cfr, and should be the same
+    as for the original run.
+    """
+    return cfr(game, num_iters, checkpoint_path=checkpoint_path,
+               checkpoint_iters=checkpoint_iters, resume=True, **kwargs)
+
+
+def tables_to_state(game, regrets, action_counts, strategy_t):
+    """ Converts the dictionaries used by cfr into a SolverState for the
+    CompiledGame 'game'.
+    """
+    return SolverState.from_arrays(
+        game.action_mask, game.table_to_array(regrets),
+        game.table_to_array(action_counts), game.strategy_to_array(strategy_t))
+
+
+def state_to_tables(game, state):
+    """ The inverse of tables_to_state. Returns the regrets, action_counts and
+    strategy dictionaries used by cfr.
+    """
+    counted = np.flatnonzero(state.action_counts.sum(axis=1) > 0)
+    return (game.array_to_strategy(state.regrets),
+            game.array_to_strategy(state.action_counts, counted),
+            game.array_to_strategy(state.strategy))
+
+
+def averaging_weight(t, variant):
+    """ The weight of iteration t (counting from 0) in the average strategy.
+    CFR+ uses linear averaging; otherwise all iterations count the same (DCFR
+    discounts the action counts separately).
+    """
+    if variant == "cfr+":
+        return float(t + 1)
+    return 1.0
+
+
+def discount_tables(regrets, action_counts, t, alpha, beta, gamma):
+    """ Applies the Discounted CFR discounts after iteration t (counting from 1)
+    to the regrets and action counts dictionaries.
+    """
+    positive = t ** alpha / (t ** alpha + 1.0)
+    negative = t ** beta / (t ** beta + 1.0)
+    counts = (t / (t + 1.0)) ** gamma
+    for information_set in regrets:
+        for a, r in regrets[information_set].items():
+            regrets[information_set][a] = r * (positive if r > 0 else negative)
+    for information_set in action_counts:
+        for a in action_counts[information_set]:
+            action_counts[information_set][a] *= counts
 
 
 def compute_average_strategy(action_counts):
@@ -80,6 +415,82 @@ def compute_average_strategy(action_counts):
     return average_strategy
 
 
+class AverageStrategy(collections.abc.Mapping):
+    """ The average strategy of cfr, as a read only dictionary from information
+    sets to dictionaries from actions to probabilities, which normalizes the
+    cumulative 'action_counts' of an information set when it is looked up. As
+    with compute_average_strategy, information sets whose counts are all zero
+    are left out.
+
+    It also keeps a snapshot of the strategy for the convergence check.
+    Rather than copying the whole strategy, the snapshot stores the old
+    strategy of an information set when its counts are first updated after
+    the snapshot is taken (see touch), so that the distance to the snapshot
+    only looks at the information sets touched since.
+    """
+
+    def __init__(self, action_counts):
+        self.action_counts = action_counts
+        # The strategies before the first update after the snapshot, or None
+        # if there is no snapshot.
+        self.changed = None
+        self.snapshot_size = 0
+
+    def __getitem__(self, information_set):
+        counts = self.action_counts[information_set]
+        total = sum(counts.values())
+        if total <= 0:
+            raise KeyError(information_set)
+        return {a: float(v) / float(total) for a, v in counts.items()}
+
+    def __iter__(self):
+        return (information_set for information_set, counts in self.action_counts.items()
+                if sum(counts.values()) > 0)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def materialize(self):
+        """ Returns the average strategy as a dictionary, as returned by
+        compute_average_strategy.
+        """
+        return compute_average_strategy(self.action_counts)
+
+    def touch(self, information_set):
+        """ Must be called before the action counts of 'information_set' are
+        updated.
+        """
+        if self.changed is not None and information_set not in self.changed:
+            self.changed[information_set] = self.get(information_set)
+
+    def take_snapshot(self):
+        """ Makes the current average strategy the snapshot. The action counts
+        only ever grow, or are scaled down as a whole, so the information sets
+        in the snapshot stay in the strategy.
+        """
+        self.changed = dict()
+        self.snapshot_size = len(self)
+
+    def has_snapshot(self):
+        return self.changed is not None
+
+    def snapshot_distance(self):
+        """ The same as compare_strategies between the current strategy and the
+        snapshot. Information sets that haven't been touched since the snapshot
+        add zero distance, so only the touched ones are compared.
+        """
+        if self.snapshot_size == 0:
+            return np.nan
+        total = 0.0
+        for information_set, old in self.changed.items():
+            if old is None:
+                # Not in the snapshot.
+                continue
+            new = self[information_set]
+            total += math.sqrt(sum(float(new[a] - old[a]) ** 2 for a in new) / len(new))
+        return total / self.snapshot_size
+
+
 def compare_strategies(s1, s2):
     """ Takes the average Euclidean distance between the probability distributions.
     """
@@ -96,68 +507,563 @@ def compare_strategies(s1, s2):
 # information set label for that game state, which uniquely identifies the
 # information set and is the same for all states in that information set.
 def cfr_recursive(game, node, i, t, pi_1, pi_2, regrets, action_counts,
-                  strategy_t, strategy_t_1, cfr_plus=False):
-    # If the node is terminal, just return the payoffs
-    if game.is_terminal(node):
-        return game.payoffs(node)[i]
-    # If the next player is chance, then sample one chance action
-    elif game.which_player(node) == 0:
-        a = game.sample_chance_action(node)
-        return cfr_recursive(
-            game, node.children[a], i, t, pi_1, pi_2,
-            regrets, action_counts, strategy_t, strategy_t_1)
-
-    # Get the information set
-    information_set = game.information_set(node)
-
-    # Get the player to play and initialise values
-    player = game.which_player(node)
-    value = 0
-    available_actions = game.available_actions(node)
-    values_Itoa = {a: 0 for a in available_actions}
-
-    # Initialise strategy_t[information_set] uniformly at random.
-    if information_set not in strategy_t:
-        strategy_t[information_set] = {
-            a: 1.0 / float(len(available_actions)) for a in available_actions}
-
-    # Compute the counterfactual value of this information set by computing the counterfactual
-    # value of the information sets where the player plays each available action and taking
-    # the expected value (by weighting by the strategy).
-    for a in available_actions:
-        if player == 1:
-            values_Itoa[a] = cfr_recursive(
-                game, node.children[a], i, t, strategy_t[information_set][a] *
-                pi_1, pi_2, regrets, action_counts, strategy_t, strategy_t_1, cfr_plus)
+                  strategy_t, strategy_t_1, cfr_plus=False, weight=1.0,
+                  average_strategy=None):
+    """ Walks the tree below 'node' for player i, updating the regrets, action
+    counts and strategy_t_1 of player i, and returns the value of the node for
+    player i. The walk (a CFRWalk) keeps an explicit stack, so the depth of
+    the tree is not limited by the recursion limit.
+    """
+    return CFRWalk(game, i, regrets, action_counts, strategy_t, strategy_t_1,
+                   cfr_plus, weight, average_strategy).walk_from(node, pi_1, pi_2)
+
+
+def cfr_recursive_pruned(game, node, i, t, pi_1, pi_2, regrets, action_counts,
+                         strategy_t, strategy_t_1, pruning, cfr_plus=False,
+                         weight=1.0, average_strategy=None):
+    """ The same as cfr_recursive, but skipping the subtrees and actions that
+    'pruning' (a pruning.RegretPruning) prunes in iteration t.
+    """
+    return CFRPrunedWalk(game, i, t, regrets, action_counts, strategy_t,
+                         strategy_t_1, pruning, cfr_plus, weight,
+                         average_strategy).walk_from(node, pi_1, pi_2)
+
+
+def cfr_recursive_simultaneous(game, node, pi_1, pi_2, regrets, action_counts,
+                               strategy_t, strategy_t_1, cfr_plus=False,
+                               weight=1.0, average_strategy=None):
+    """ The same as cfr_recursive, but for both players in a single traversal:
+    returns the pair of values of the node for players 1 and 2, and updates the
+    regrets, action counts and strategy_t_1 of every information set it passes
+    through for the player to play in it.
+    """
+    return CFRSimultaneousWalk(game, regrets, action_counts, strategy_t,
+                               strategy_t_1, cfr_plus, weight,
+                               average_strategy).walk_from(node, pi_1, pi_2)
+
+
+def cfr_recursive_compiled(game, node, i, pi_1, pi_2, state, cfr_plus=False,
+                           weight=1.0, deal=None):
+    """ The same walk as cfr_recursive on a CompiledGame. Information sets are
+    integer ids into the arrays of 'state' (a SolverState), and actions are
+    positions within the information set. The strategy used is state.strategy,
+    which is only updated between iterations. The chance outcomes are taken
+    from 'deal' (a deal_stream.Deal) if it is given.
+    """
+    return CompiledCFRWalk(game, i, state, cfr_plus, weight,
+                           deal).walk_from(node, pi_1, pi_2)
+
+
+def cfr_recursive_compiled_pruned(game, node, i, t, pi_1, pi_2, state, pruning,
+                                  cfr_plus=False, weight=1.0, deal=None):
+    """ The same as cfr_recursive_pruned on a CompiledGame, as
+    cfr_recursive_compiled is to cfr_recursive. Actions are identified by
+    (information set id, action position) keys in 'pruning'.
+    """
+    return CompiledCFRPrunedWalk(game, i, t, state, pruning, cfr_plus, weight,
+                                 deal).walk_from(node, pi_1, pi_2)
+
+
+def cfr_recursive_compiled_simultaneous(game, node, pi_1, pi_2, state,
+                                        cfr_plus=False, weight=1.0, deal=None):
+    """ The same as cfr_recursive_simultaneous on a CompiledGame, as
+    cfr_recursive_compiled is to cfr_recursive. Returns an array of the values
+    of the node for players 1 and 2.
+    """
+    return CompiledCFRSimultaneousWalk(game, state, cfr_plus, weight,
+                                       deal).walk_from(node, pi_1, pi_2)
+
+
+class CFRWalk(Traversal):
+    """ The walk of cfr_recursive (see traversal.Traversal). The buffers hold,
+    for the decision node expanded at each depth, the node, its player,
+    information set, available actions and strategy, and the reach
+    probabilities of players 1 and 2. A chance node is passed straight
+    through: the sampled child is expanded in its place, at the same depth.
+    """
+
+    def __init__(self, game, i, regrets, action_counts, strategy_t,
+                 strategy_t_1, cfr_plus=False, weight=1.0,
+                 average_strategy=None):
+        Traversal.__init__(self, {"nodes": None, "players": 0,
+                                  "information_sets": None, "actions": None,
+                                  "strategies": None, "pi_1": 0.0, "pi_2": 0.0})
+        self.game = game
+        self.i = i
+        self.regrets = regrets
+        self.action_counts = action_counts
+        self.strategy_t = strategy_t
+        self.strategy_t_1 = strategy_t_1
+        self.cfr_plus = cfr_plus
+        self.weight = weight
+        self.average_strategy = average_strategy
+        buffers = self.buffers
+        self.nodes = buffers.nodes
+        self.players = buffers.players
+        self.information_sets = buffers.information_sets
+        self.actions = buffers.actions
+        self.strategies = buffers.strategies
+        self.pi_1 = buffers.pi_1
+        self.pi_2 = buffers.pi_2
+
+    def walk_from(self, node, pi_1, pi_2):
+        """ Walks the tree below 'node', reached with probabilities pi_1 and
+        pi_2, and returns its value.
+        """
+        self.pi_1[0] = pi_1
+        self.pi_2[0] = pi_2
+        return self.walk(node)
+
+    def terminal_value(self, node):
+        return self.game.payoffs(node)[self.i]
+
+    def enter(self, depth, k):
+        game = self.game
+        if depth == 0:
+            node = self.root
         else:
-            values_Itoa[a] = cfr_recursive(
-                game, node.children[a], i, t, pi_1,
-                strategy_t[information_set][a] * pi_2, regrets, action_counts,
-                strategy_t, strategy_t_1, cfr_plus)
-        value += strategy_t[information_set][a] * values_Itoa[a]
-
-    # Update regrets now that we have computed the counterfactual value of the
-    # information set as well as the counterfactual values of playing each
-    # action in the information set.  First initialise regrets with this
-    # information set if necessary.
-    if information_set not in regrets:
-        regrets[information_set] = {ad: 0.0 for ad in available_actions}
-    if player == i:
-        for a in available_actions:
-            pi_minus_i = pi_1 if i == 2 else pi_2
-            pi_i = pi_1 if i == 1 else pi_2
-            regrets[information_set][a] += (values_Itoa[a] - value) * pi_minus_i
-            if cfr_plus:
-                regrets[information_set][a] = max(0.0, regrets[information_set][a])
+            node = game.child(self.nodes[depth - 1], self.actions[depth - 1][k])
+        while True:
+            # If the node is terminal, just return the payoffs
+            if game.is_terminal(node):
+                self.leaf_value = self.terminal_value(node)
+                return 0
+            # If the next player is chance, then sample one chance action
+            player = game.which_player(node)
+            if player != 0:
+                break
+            node = game.child(node, game.sample_chance_action(node))
+
+        if depth > 0:
+            d = depth - 1
+            a = self.actions[d][k]
+            if self.players[d] == 1:
+                self.pi_1[depth] = self.strategies[d][a] * self.pi_1[d]
+                self.pi_2[depth] = self.pi_2[d]
+            else:
+                self.pi_1[depth] = self.pi_1[d]
+                self.pi_2[depth] = self.strategies[d][a] * self.pi_2[d]
+
+        # Get the information set, and initialise strategy_t uniformly at
+        # random the first time it is seen.
+        information_set = game.information_set(node)
+        available_actions = game.available_actions(node)
+        strategy = self.strategy_t.get(information_set)
+        if strategy is None:
+            strategy = self.strategy_t[information_set] = {
+                a: 1.0 / float(len(available_actions)) for a in available_actions}
+
+        self.nodes[depth] = node
+        self.players[depth] = player
+        self.information_sets[depth] = information_set
+        self.actions[depth] = available_actions
+        self.strategies[depth] = strategy
+        return len(available_actions)
+
+    def leave(self, depth, values):
+        # Compute the counterfactual value of this information set by taking
+        # the expected value of the counterfactual values of the actions (by
+        # weighting by the strategy).
+        information_set = self.information_sets[depth]
+        available_actions = self.actions[depth]
+        strategy = self.strategies[depth]
+        value = 0
+        for a, v in zip(available_actions, values):
+            value += strategy[a] * v
+
+        # Update regrets now that we have computed the counterfactual value of
+        # the information set as well as the counterfactual values of playing
+        # each action in the information set.  First initialise regrets with
+        # this information set if necessary.
+        regrets = self.regrets
+        if information_set not in regrets:
+            regrets[information_set] = {ad: 0.0 for ad in available_actions}
+        i = self.i
+        if self.players[depth] == i:
+            # Let the average strategy (an AverageStrategy) keep its snapshot
+            # of the counts about to change.
+            if self.average_strategy is not None:
+                self.average_strategy.touch(information_set)
+            pi_minus_i = self.pi_1[depth] if i == 2 else self.pi_2[depth]
+            pi_i = self.pi_1[depth] if i == 1 else self.pi_2[depth]
+            action_counts = self.action_counts
             if information_set not in action_counts:
                 action_counts[information_set] = {ad: 0.0 for ad in available_actions}
-            action_counts[information_set][a] += pi_i * strategy_t[information_set][a]
+            information_set_regrets = regrets[information_set]
+            information_set_counts = action_counts[information_set]
+            weight = self.weight
+            for a, v in zip(available_actions, values):
+                information_set_regrets[a] += (v - value) * pi_minus_i
+                if self.cfr_plus:
+                    information_set_regrets[a] = max(0.0, information_set_regrets[a])
+                information_set_counts[a] += weight * pi_i * strategy[a]
+
+            # Update strategy t plus 1
+            self.strategy_t_1[information_set] = compute_regret_matching(
+                information_set_regrets)
 
-        # Update strategy t plus 1
-        strategy_t_1[information_set] = compute_regret_matching(regrets[information_set])
+        # Return the value
+        return value
 
-    # Return the value
-    return value
+
+class CFRPrunedWalk(CFRWalk):
+    """ The walk of cfr_recursive_pruned. The value of an action skipped by
+    regret-based pruning is None, and that of an action cut by partial
+    pruning PRUNED.
+    """
+
+    PRUNED = object()
+
+    def __init__(self, game, i, t, regrets, action_counts, strategy_t,
+                 strategy_t_1, pruning, cfr_plus=False, weight=1.0,
+                 average_strategy=None):
+        CFRWalk.__init__(self, game, i, regrets, action_counts, strategy_t,
+                         strategy_t_1, cfr_plus, weight, average_strategy)
+        self.t = t
+        self.pruning = pruning
+
+    def enter(self, depth, k):
+        if depth > 0:
+            d = depth - 1
+            a = self.actions[d][k]
+            strategy = self.strategies[d]
+            player = self.players[d]
+            # Regret-based pruning: skip the unplayed actions of player i
+            # whose regret is known to stay negative.
+            if (player == self.i and strategy[a] == 0.0 and
+                    self.pruning.is_skipped((self.information_sets[d], a), self.t)):
+                self.leaf_value = None
+                return 0
+            if player == 1:
+                pi_1 = strategy[a] * self.pi_1[d]
+                pi_2 = self.pi_2[d]
+            else:
+                pi_1 = self.pi_1[d]
+                pi_2 = strategy[a] * self.pi_2[d]
+        else:
+            pi_1 = self.pi_1[0]
+            pi_2 = self.pi_2[0]
+        # Partial pruning: nothing below changes the regrets or action counts
+        # of player i, and the value is weighted by zero above.
+        if pi_1 == 0.0 and pi_2 == 0.0:
+            self.pruning.num_pruned_subtrees += 1
+            self.leaf_value = self.PRUNED if depth > 0 else 0.0
+            return 0
+        return CFRWalk.enter(self, depth, k)
+
+    def leave(self, depth, values):
+        information_set = self.information_sets[depth]
+        available_actions = self.actions[depth]
+        strategy = self.strategies[depth]
+        value = 0.0
+        for a, v in zip(available_actions, values):
+            if v is not None and v is not self.PRUNED:
+                value += strategy[a] * v
+
+        regrets = self.regrets
+        if information_set not in regrets:
+            regrets[information_set] = {ad: 0.0 for ad in available_actions}
+        i = self.i
+        if self.players[depth] == i:
+            if self.average_strategy is not None:
+                self.average_strategy.touch(information_set)
+            action_counts = self.action_counts
+            if information_set not in action_counts:
+                action_counts[information_set] = {ad: 0.0 for ad in available_actions}
+            pi_minus_i = self.pi_1[depth] if i == 2 else self.pi_2[depth]
+            pi_i = self.pi_1[depth] if i == 1 else self.pi_2[depth]
+            pruning = self.pruning
+            for a, v in zip(available_actions, values):
+                key = (information_set, a)
+                walked = v is not None and v is not self.PRUNED
+                if walked:
+                    regrets[information_set][a] += (
+                        v * pruning.catch_up_reach(key, pi_minus_i) -
+                        value * pi_minus_i)
+                elif v is None:
+                    # The value of the action is caught up when it is walked
+                    # again.
+                    pruning.record_skip(key, pi_minus_i)
+                    regrets[information_set][a] -= value * pi_minus_i
+                else:
+                    # Cut by partial pruning: the reach of the opponent is
+                    # zero, so a reach skipped before is left to be caught up
+                    # at the next walk of the action.
+                    regrets[information_set][a] -= value * pi_minus_i
+                if self.cfr_plus:
+                    regrets[information_set][a] = max(0.0, regrets[information_set][a])
+                elif walked:
+                    pruning.update(key, regrets[information_set][a], i, self.t)
+                action_counts[information_set][a] += self.weight * pi_i * strategy[a]
+            self.strategy_t_1[information_set] = compute_regret_matching(
+                regrets[information_set])
+
+        return value
+
+
+class CFRSimultaneousWalk(CFRWalk):
+    """ The walk of cfr_recursive_simultaneous, whose values are pairs of the
+    values for players 1 and 2.
+    """
+
+    def __init__(self, game, regrets, action_counts, strategy_t, strategy_t_1,
+                 cfr_plus=False, weight=1.0, average_strategy=None):
+        CFRWalk.__init__(self, game, None, regrets, action_counts, strategy_t,
+                         strategy_t_1, cfr_plus, weight, average_strategy)
+
+    def terminal_value(self, node):
+        payoffs = self.game.payoffs(node)
+        return payoffs[1], payoffs[2]
+
+    def leave(self, depth, values):
+        information_set = self.information_sets[depth]
+        available_actions = self.actions[depth]
+        strategy = self.strategies[depth]
+        player = self.players[depth]
+        value_1 = 0.0
+        value_2 = 0.0
+        for a, v in zip(available_actions, values):
+            value_1 += strategy[a] * v[0]
+            value_2 += strategy[a] * v[1]
+
+        # Update the regrets and action counts of the player to play, as
+        # CFRWalk does for player i.
+        regrets = self.regrets
+        action_counts = self.action_counts
+        if information_set not in regrets:
+            regrets[information_set] = {ad: 0.0 for ad in available_actions}
+        if information_set not in action_counts:
+            action_counts[information_set] = {ad: 0.0 for ad in available_actions}
+        if self.average_strategy is not None:
+            self.average_strategy.touch(information_set)
+        value = value_1 if player == 1 else value_2
+        pi_minus_i = self.pi_2[depth] if player == 1 else self.pi_1[depth]
+        pi_i = self.pi_1[depth] if player == 1 else self.pi_2[depth]
+        for a, v in zip(available_actions, values):
+            regrets[information_set][a] += (v[player - 1] - value) * pi_minus_i
+            if self.cfr_plus:
+                regrets[information_set][a] = max(0.0, regrets[information_set][a])
+            action_counts[information_set][a] += self.weight * pi_i * strategy[a]
+        self.strategy_t_1[information_set] = compute_regret_matching(
+            regrets[information_set])
+
+        return value_1, value_2
+
+
+class CompiledCFRWalk(Traversal):
+    """ The walk of cfr_recursive_compiled, as CFRWalk is for cfr_recursive.
+    The buffers hold, for the decision node expanded at each depth, its
+    player, information set, first child, number of children and strategy,
+    and the reach probabilities of players 1 and 2. The values of the
+    children at each depth are written in a reused array, with 'value_shape'
+    the shape of a value, and 'rows' are the other rows of the subclass (see
+    traversal.DepthBuffers).
+    """
+
+    def __init__(self, game, i, state, cfr_plus=False, weight=1.0, deal=None,
+                 value_shape=(), rows=None):
+        max_actions = state.strategy.shape[1]
+        Traversal.__init__(
+            self, {"players": 0, "information_sets": 0, "starts": 0,
+                   "counts": 0, "strategies": None, "pi_1": 0.0, "pi_2": 0.0},
+            rows, value_row=lambda: np.zeros((max_actions,) + value_shape))
+        self.game = game
+        self.i = i
+        self.state = state
+        self.cfr_plus = cfr_plus
+        self.weight = weight
+        self.deal = deal
+        # The columns of game.utility making the value of a terminal node.
+        self.utility_columns = i - 1 if i is not None else slice(None)
+        buffers = self.buffers
+        self.players = buffers.players
+        self.information_sets = buffers.information_sets
+        self.starts = buffers.starts
+        self.counts = buffers.counts
+        self.strategies = buffers.strategies
+        self.pi_1 = buffers.pi_1
+        self.pi_2 = buffers.pi_2
+
+    def walk_from(self, node, pi_1, pi_2):
+        """ Walks the tree below 'node', reached with probabilities pi_1 and
+        pi_2, and returns its value.
+        """
+        self.pi_1[0] = pi_1
+        self.pi_2[0] = pi_2
+        return self.walk(node)
+
+    def enter(self, depth, k):
+        game = self.game
+        node = self.root if depth == 0 else self.starts[depth - 1] + k
+        player = game.player[node]
+        # If the next player is chance, then sample one chance action
+        while player == 0:
+            if self.deal is not None:
+                node = self.deal.child(node)
+            else:
+                start = game.child_start[node]
+                count = game.child_count[node]
+                probs = game.chance_prob[start:start + count]
+                node = start + np.random.choice(count, p=probs)
+            player = game.player[node]
+        # If the node is terminal, just return the payoffs
+        if player == -1:
+            self.leaf_value = game.utility[node, self.utility_columns]
+            return 0
+
+        if depth > 0:
+            d = depth - 1
+            if self.players[d] == 1:
+                self.pi_1[depth] = self.strategies[d][k] * self.pi_1[d]
+                self.pi_2[depth] = self.pi_2[d]
+            else:
+                self.pi_1[depth] = self.pi_1[d]
+                self.pi_2[depth] = self.strategies[d][k] * self.pi_2[d]
+        count = game.child_count[node]
+        information_set = game.info_set[node]
+        self.players[depth] = player
+        self.information_sets[depth] = information_set
+        self.starts[depth] = game.child_start[node]
+        self.counts[depth] = count
+        self.strategies[depth] = self.state.strategy[information_set, :count]
+        return count
+
+    def leave(self, depth, values):
+        strategy = self.strategies[depth]
+        count = self.counts[depth]
+        values_Itoa = values[:count]
+        value = np.dot(strategy, values_Itoa)
+
+        i = self.i
+        if self.players[depth] == i:
+            state = self.state
+            information_set = self.information_sets[depth]
+            pi_minus_i = self.pi_1[depth] if i == 2 else self.pi_2[depth]
+            pi_i = self.pi_1[depth] if i == 1 else self.pi_2[depth]
+            regrets = state.regrets[information_set, :count]
+            regrets += (values_Itoa - value) * pi_minus_i
+            if self.cfr_plus:
+                np.maximum(regrets, 0.0, out=regrets)
+            state.action_counts[information_set, :count] += self.weight * pi_i * strategy
+
+        return value
+
+
+class CompiledCFRPrunedWalk(CompiledCFRWalk):
+    """ The walk of cfr_recursive_compiled_pruned, as CFRPrunedWalk is for
+    cfr_recursive_pruned. A skipped or cut action has the value 0, and
+    whether each action was walked, or cut by partial pruning, is kept in
+    reused arrays per depth.
+    """
+
+    def __init__(self, game, i, t, state, pruning, cfr_plus=False, weight=1.0,
+                 deal=None):
+        max_actions = state.strategy.shape[1]
+        CompiledCFRWalk.__init__(
+            self, game, i, state, cfr_plus, weight, deal,
+            rows={"walked": lambda: np.ones(max_actions, dtype=bool),
+                  "cut": lambda: np.zeros(max_actions, dtype=bool)})
+        self.t = t
+        self.pruning = pruning
+        self.walked = self.buffers.walked
+        self.cut = self.buffers.cut
+
+    def enter(self, depth, k):
+        if depth > 0:
+            d = depth - 1
+            strategy = self.strategies[d]
+            player = self.players[d]
+            skipped = (player == self.i and strategy[k] == 0.0 and
+                       self.pruning.is_skipped((self.information_sets[d], k), self.t))
+            self.walked[d][k] = not skipped
+            self.cut[d][k] = False
+            if skipped:
+                self.leaf_value = 0.0
+                return 0
+            if player == 1:
+                pi_1 = strategy[k] * self.pi_1[d]
+                pi_2 = self.pi_2[d]
+            else:
+                pi_1 = self.pi_1[d]
+                pi_2 = strategy[k] * self.pi_2[d]
+        else:
+            pi_1 = self.pi_1[0]
+            pi_2 = self.pi_2[0]
+        if pi_1 == 0.0 and pi_2 == 0.0:
+            self.pruning.num_pruned_subtrees += 1
+            if depth > 0:
+                self.walked[depth - 1][k] = False
+                self.cut[depth - 1][k] = True
+            self.leaf_value = 0.0
+            return 0
+        return CompiledCFRWalk.enter(self, depth, k)
+
+    def leave(self, depth, values):
+        strategy = self.strategies[depth]
+        count = self.counts[depth]
+        values_Itoa = values[:count]
+        value = np.dot(strategy, values_Itoa)
+
+        i = self.i
+        if self.players[depth] == i:
+            state = self.state
+            pruning = self.pruning
+            walked = self.walked[depth][:count]
+            cut = self.cut[depth][:count]
+            information_set = self.information_sets[depth]
+            pi_minus_i = self.pi_1[depth] if i == 2 else self.pi_2[depth]
+            pi_i = self.pi_1[depth] if i == 1 else self.pi_2[depth]
+            regrets = state.regrets[information_set, :count]
+            for a in range(count):
+                key = (information_set, a)
+                if walked[a]:
+                    regrets[a] += (values_Itoa[a] * pruning.catch_up_reach(key, pi_minus_i) -
+                                   value * pi_minus_i)
+                else:
+                    # An action cut by partial pruning keeps its skipped
+                    # reach for its next walk.
+                    if not cut[a]:
+                        pruning.record_skip(key, pi_minus_i)
+                    regrets[a] -= value * pi_minus_i
+            if self.cfr_plus:
+                np.maximum(regrets, 0.0, out=regrets)
+            else:
+                for a in np.flatnonzero(walked):
+                    pruning.update((information_set, a), regrets[a], i, self.t)
+            state.action_counts[information_set, :count] += self.weight * pi_i * strategy
+
+        return value
+
+
+class CompiledCFRSimultaneousWalk(CompiledCFRWalk):
+    """ The walk of cfr_recursive_compiled_simultaneous, whose values are
+    arrays of the values for players 1 and 2. The values of the children at
+    each depth are a reused array with one row per action and one column per
+    player.
+    """
+
+    def __init__(self, game, state, cfr_plus=False, weight=1.0, deal=None):
+        CompiledCFRWalk.__init__(self, game, None, state, cfr_plus, weight,
+                                 deal, value_shape=(2,))
+
+    def leave(self, depth, values):
+        state = self.state
+        strategy = self.strategies[depth]
+        player = self.players[depth]
+        information_set = self.information_sets[depth]
+        count = self.counts[depth]
+        values_Itoa = values[:count]
+        value = np.dot(strategy, values_Itoa)
+
+        pi_minus_i = self.pi_2[depth] if player == 1 else self.pi_1[depth]
+        pi_i = self.pi_1[depth] if player == 1 else self.pi_2[depth]
+        regrets = state.regrets[information_set, :count]
+        regrets += (values_Itoa[:, player - 1] - value[player - 1]) * pi_minus_i
+        if self.cfr_plus:
+            np.maximum(regrets, 0.0, out=regrets)
+        state.action_counts[information_set, :count] += self.weight * pi_i * strategy
+
+        return value
 
 
 def compute_regret_matching(regrets):
@@ -179,11 +1085,26 @@ def compute_regret_matching(regrets):
         return {k: max(0.0, v) / denominator for k, v in regrets.items()}
 
 
-def evaluate_strategies(game, strategy, num_iters=500):
+def evaluate_strategies(game, strategy, num_iters=500, exact=False):
     """ Given a strategy in the form of a dictionary from information sets to
     probability distributions over actions, sample a number of games to
-    approximate the expected value of player 1.
+    approximate the expected value of player 1. With exact=True, the expected
+    value is computed exactly instead, and returned as the only value.
     """
+    if exact:
+        value = game.game.exact_expected_value(strategy, strategy)
+        return np.array([value]), value
     values = game.game.expected_value(strategy, strategy, num_iters)
     values_mean = np.mean(values)
     return values, values_mean
+
+
+def confidence_interval(values, confidence=0.95):
+    """ Returns the mean of sampled game values (e.g. from evaluate_strategies)
+    and a normal approximation confidence interval (low, high) around it.
+    """
+    values = np.asarray(values)
+    mean = float(values.mean())
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2.0)
+    half_width = float(z * values.std(ddof=1) / np.sqrt(len(values)))
+    return mean, (mean - half_width, mean + half_width)
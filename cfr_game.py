@@ -31,6 +31,11 @@ class CFRGame():
         """
         return [a for a in node.children.keys()]
 
+    def child(self, node, action):
+        """ Returns the node reached by taking 'action' in 'node'.
+        """
+        return node.children[action]
+
     def sample_chance_action(self, node):
         """ If the player for the game state corresponding to the action
         sequence is the chance player, then sample one of the available actions.
@@ -48,3 +53,64 @@ class CFRGame():
         to the player who is to play following the action sequence.
         """
         return self.game.info_set_ids[node]
+
+
+class CompiledCFRGame(CFRGame):
+    """ The CFRGame interface on top of a CompiledGame, where nodes are integer
+    node ids rather than ExtensiveGameNode objects.
+    """
+
+    def payoffs(self, node):
+        return {1: self.game.utility[node, 0], 2: self.game.utility[node, 1]}
+
+    def is_terminal(self, node):
+        return self.game.player[node] == -1
+
+    def which_player(self, node):
+        return self.game.player[node]
+
+    def available_actions(self, node):
+        return [int(self.game.action[c]) for c in self.game.children(node)]
+
+    def child(self, node, action):
+        return self.game.child(node, action)
+
+    def sample_chance_action(self, node):
+        assert self.game.player[node] == 0
+        children = self.game.children(node)
+        c = np.random.choice(children, p=self.game.chance_prob[children])
+        return int(self.game.action[c])
+
+    def information_set(self, node):
+        return self.game.info_set_keys[self.game.info_set[node]]
+
+
+class LazyCFRGame(CFRGame):
+    """ The CFRGame interface on top of a LazyGame, where nodes are states
+    (tuples of actions from the root) and are only created when visited.
+    """
+
+    def payoffs(self, node):
+        return self.game.node(node).utility
+
+    def is_terminal(self, node):
+        return self.game.node(node).player == -1
+
+    def which_player(self, node):
+        return self.game.node(node).player
+
+    def available_actions(self, node):
+        return self.game.actions(node)
+
+    def child(self, node, action):
+        return self.game.child(node, action)
+
+    def sample_chance_action(self, node):
+        chance_probs = self.game.node(node).chance_probs
+        assert self.game.node(node).player == 0
+        actions = [a for a in chance_probs]
+        probs = [v for a, v in chance_probs.items()]
+        return actions[np.random.choice(len(actions), p=probs)]
+
+    def information_set(self, node):
+        return self.game.information_set(node)
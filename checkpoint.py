@@ -0,0 +1,49 @@
+# coding: utf-8
+# Saving and loading the state of a CFR run, so that a long solve can be
+# resumed after a crash or preemption.
+
+import os
+
+import numpy as np
+
+from solver_state import SolverState
+
+
+def save_checkpoint(path, state, t):
+    """ Writes the tables in 'state' (a SolverState), the number of the last
+    completed iteration 't' and the state of NumPy's global random number
+    generator to 'path', as an uncompressed .npz file. The file is first
+    written next to 'path' and then renamed over it, so a crash while writing
+    leaves the previous checkpoint intact.
+    """
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, regrets=state.regrets, action_counts=state.action_counts,
+                 strategy=state.strategy, action_mask=state.action_mask,
+                 iteration=t, rng_keys=keys,
+                 rng_state=np.array([pos, has_gauss]),
+                 rng_gaussian=cached_gaussian)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, action_mask=None):
+    """ Reads a checkpoint written by save_checkpoint and restores the state
+    of NumPy's global random number generator. Returns the SolverState and
+    the number of the last completed iteration. If 'action_mask' is given, it
+    is checked against the checkpoint, to catch resuming on a different game.
+    """
+    with np.load(path) as data:
+        if action_mask is not None and not np.array_equal(
+                data["action_mask"], action_mask):
+            raise ValueError(
+                "The checkpoint {} was written for a different game.".format(path))
+        state = SolverState.from_arrays(
+            data["action_mask"], data["regrets"], data["action_counts"],
+            data["strategy"])
+        pos, has_gauss = data["rng_state"]
+        np.random.set_state(("MT19937", data["rng_keys"], int(pos),
+                             int(has_gauss), float(data["rng_gaussian"])))
+        return state, int(data["iteration"])
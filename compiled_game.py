@@ -0,0 +1,384 @@
+# coding: utf-8
+# A compact, array-backed representation of an ExtensiveGame. The object graph
+# of ExtensiveGameNode instances is flattened into NumPy arrays so that solvers
+# can walk the tree by integer node ids instead of Python objects.
+
+import collections
+
+import numpy as np
+
+
+class CompiledGame:
+    """ A game tree stored as flat arrays. Nodes are numbered in breadth first
+    order, so the root is node 0, the children of every node are contiguous, and
+    all nodes at the same depth form a contiguous block.
+
+    Per node arrays (indexed by node id):
+    - player: -1 for terminal, 0 for chance, 1 or 2 for the players.
+    - parent: the parent node id (-1 for the root).
+    - depth: the number of actions taken to reach the node.
+    - child_start: node id of the first child (children are contiguous).
+    - child_count: number of children.
+    - action: the action taken in the parent to reach this node (-1 for root).
+    - chance_prob: the probability of this node given its parent, if the parent
+      is a chance node, otherwise 1.
+    - utility: array of shape (num_nodes, 2) with the utility to players 1 and 2
+      (only relevant for terminal nodes).
+    - info_set: the integer id of the information set containing the node, from
+      the perspective of the player to play (-1 for chance and terminal nodes).
+    - hidden_from: bitmask of players the node's actions are hidden from (bit 0
+      for player 1, bit 1 for player 2).
+
+    Per information set arrays (indexed by info set id):
+    - info_set_keys: the hashable identifier used by ExtensiveGame.info_set_ids.
+    - info_set_player: the player to act.
+    - info_set_num_actions: the number of actions available.
+    - info_set_actions: array of shape (num_info_sets, max_actions) with the
+      actions available, padded with -1.
+    """
+
+    def __init__(self, player, parent, depth, child_start, child_count, action,
+                 chance_prob, utility, info_set, hidden_from, info_set_keys,
+                 info_set_player, info_set_actions):
+        self.player = player
+        self.parent = parent
+        self.depth = depth
+        self.child_start = child_start
+        self.child_count = child_count
+        self.action = action
+        self.chance_prob = chance_prob
+        self.utility = utility
+        self.info_set = info_set
+        self.hidden_from = hidden_from
+
+        self.info_set_keys = info_set_keys
+        self.info_set_player = info_set_player
+        self.info_set_actions = info_set_actions
+        self.info_set_num_actions = (info_set_actions >= 0).sum(axis=1)
+        self.info_set_index = {k: i for i, k in enumerate(info_set_keys)}
+
+        # The root is always node 0.
+        self.root = 0
+
+        # level_start[d] is the first node at depth d; the nodes at depth d are
+        # level_start[d] up to (but excluding) level_start[d + 1].
+        self.level_start = np.searchsorted(
+            depth, np.arange(depth.max() + 2)).astype(np.int64)
+
+        self._levels = None
+        self._chance_reach = None
+
+        # The file the game was loaded from by game_cache.load_compiled_game,
+        # and whether its arrays are memory mapped.
+        self.cache_path = None
+        self.cache_mmap = False
+
+    def __reduce_ex__(self, protocol):
+        # A game loaded from the cache is pickled (e.g. to be sent to worker
+        # processes) as the path of its file, which is loaded again instead of
+        # copying the arrays.
+        if self.cache_path is None:
+            return super().__reduce_ex__(protocol)
+        import game_cache
+        return game_cache.load_compiled_game, (self.cache_path, self.cache_mmap)
+
+    @property
+    def num_nodes(self):
+        return len(self.player)
+
+    @property
+    def num_info_sets(self):
+        return len(self.info_set_keys)
+
+    @property
+    def max_actions(self):
+        return self.info_set_actions.shape[1]
+
+    @property
+    def action_mask(self):
+        """ Boolean array of shape (num_info_sets, max_actions), True where the
+        action slot is in use.
+        """
+        return self.info_set_actions >= 0
+
+    @property
+    def levels(self):
+        """ A list with one entry for each depth level below the root, holding
+        (start, end, parents, inverse): the range of node ids in the level, the
+        distinct parents of the nodes in the level and the position of each
+        node's parent within 'parents'.
+        """
+        if self._levels is None:
+            self._levels = []
+            for d in range(1, len(self.level_start) - 1):
+                start, end = self.level_start[d], self.level_start[d + 1]
+                parents, inverse = np.unique(self.parent[start:end],
+                                             return_inverse=True)
+                self._levels.append((start, end, parents, inverse))
+        return self._levels
+
+    @property
+    def chance_reach(self):
+        """ The product of the chance probabilities on the path to each node.
+        """
+        if self._chance_reach is None:
+            self._chance_reach = self.reach(self.chance_prob)
+        return self._chance_reach
+
+    def reach(self, edge):
+        """ Multiplies edge probabilities (see edge_probs) down the tree, one
+        level at a time. Returns the probability of reaching each node.
+        """
+        reach = np.ones(self.num_nodes)
+        for start, end, _, _ in self.levels:
+            reach[start:end] = reach[self.parent[start:end]] * edge[start:end]
+        return reach
+
+    def player_reach(self, edge, player):
+        """ The contribution of 'player' alone to the probability of reaching
+        each node, given edge probabilities from edge_probs.
+        """
+        return self.reach(np.where(self.player[self.parent] == player, edge, 1.0))
+
+    def children(self, node):
+        """ Returns the range of child node ids of the given node.
+        """
+        start = self.child_start[node]
+        return range(start, start + self.child_count[node])
+
+    def child(self, node, action):
+        """ Returns the child reached by taking 'action' in 'node'.
+        """
+        for c in self.children(node):
+            if self.action[c] == action:
+                return c
+        raise KeyError(action)
+
+    def is_hidden_from(self, node, player):
+        return bool(self.hidden_from[node] & (1 << (player - 1)))
+
+    def strategy_to_array(self, strategy):
+        """ Converts a strategy dictionary (from information set identifiers to
+        dictionaries from actions to probabilities) into an array of shape
+        (num_info_sets, max_actions). Missing information sets are completed
+        uniformly.
+        """
+        probs = np.zeros(self.info_set_actions.shape)
+        for idx, key in enumerate(self.info_set_keys):
+            actions = self.info_set_actions[idx, :self.info_set_num_actions[idx]]
+            if key in strategy:
+                probs[idx, :len(actions)] = [strategy[key][a] for a in actions]
+            else:
+                probs[idx, :len(actions)] = 1.0 / len(actions)
+        return probs
+
+    def table_to_array(self, table):
+        """ Converts a dictionary from information set identifiers to
+        dictionaries from actions to values (e.g. regrets) into an array of
+        shape (num_info_sets, max_actions). Missing entries are zero.
+        """
+        values = np.zeros(self.info_set_actions.shape)
+        for key, action_values in table.items():
+            idx = self.info_set_index[key]
+            actions = self.info_set_actions[idx, :self.info_set_num_actions[idx]]
+            values[idx, :len(actions)] = [action_values[a] for a in actions]
+        return values
+
+    def array_to_strategy(self, probs, info_sets=None):
+        """ Converts an array of shape (num_info_sets, max_actions) back into a
+        strategy dictionary. If 'info_sets' is given, only those information set
+        ids are included.
+        """
+        if info_sets is None:
+            info_sets = range(self.num_info_sets)
+        strategy = {}
+        for idx in info_sets:
+            n = self.info_set_num_actions[idx]
+            strategy[self.info_set_keys[idx]] = {
+                int(a): float(p) for a, p in
+                zip(self.info_set_actions[idx, :n], probs[idx, :n])}
+        return strategy
+
+    def edge_probs(self, probs):
+        """ Given a strategy array of shape (num_info_sets, max_actions),
+        returns for every node the probability of reaching it from its parent:
+        the chance probability below chance nodes, and the strategy probability
+        of the action below player nodes. The root gets probability 1.
+        """
+        edge = self.chance_prob.copy()
+        nodes = np.arange(1, self.num_nodes)
+        parents = self.parent[nodes]
+        player_edges = self.player[parents] > 0
+        nodes = nodes[player_edges]
+        parents = parents[player_edges]
+        edge[nodes] = probs[self.info_set[parents],
+                            nodes - self.child_start[parents]]
+        return edge
+
+    def complete_strategy_uniformly(self, strategy, verbose=True):
+        """ Same as ExtensiveGame.complete_strategy_uniformly.
+        """
+        new_strategy = strategy.copy()
+        num_missing = 0
+        for idx, key in enumerate(self.info_set_keys):
+            if key not in new_strategy:
+                actions = self.info_set_actions[idx, :self.info_set_num_actions[idx]]
+                new_strategy[key] = {
+                    int(a): 1.0 / float(len(actions)) for a in actions}
+                num_missing += 1
+        if num_missing > 0 and verbose:
+            print("Completed strategy at {} information sets.".format(num_missing))
+        return new_strategy
+
+    def subtree_values(self, edge):
+        """ Computes the expected utility of the subtree below each node for
+        both players, given edge probabilities from edge_probs, summing
+        children into their parents one level at a time from the bottom of the
+        tree. Returns an array of shape (num_nodes, 2).
+        """
+        values = self.utility.copy()
+        for start, end, parents, inverse in reversed(self.levels):
+            weights = edge[start:end]
+            for p in range(2):
+                values[parents, p] = np.bincount(
+                    inverse, weights * values[start:end, p], len(parents))
+        return values
+
+    def profile_edge_probs(self, strategy_1, strategy_2):
+        """ Returns edge_probs for the profile where player 1's information
+        sets use strategy_1 and player 2's use strategy_2. Missing information
+        sets are played uniformly.
+        """
+        probs = self.strategy_to_array(strategy_1)
+        player_2 = self.info_set_player == 2
+        probs[player_2] = self.strategy_to_array(strategy_2)[player_2]
+        edge = self.edge_probs(probs)
+
+        # Make sure the probabilities below every node sum to 1.
+        nonterminal = self.child_count > 0
+        sums = np.bincount(self.parent[1:], edge[1:], self.num_nodes)
+        assert np.all(np.abs(1.0 - sums[nonterminal]) < 1e-5)
+        return edge
+
+    def sample_terminals(self, edge, num_games):
+        """ Plays 'num_games' games at once, with actions sampled according to
+        the edge probabilities, and returns the terminal node of each game.
+        All games still in progress advance one action per step.
+        """
+        # cumulative[node, k] is the probability of sampling one of the first
+        # k + 1 children of node. Unused slots are never sampled.
+        max_children = max(self.child_count.max(), 1)
+        cumulative = np.zeros((self.num_nodes, max_children))
+        nodes = np.arange(1, self.num_nodes)
+        cumulative[self.parent[nodes], nodes - self.child_start[self.parent[nodes]]] = edge[nodes]
+        cumulative = np.cumsum(cumulative, axis=1)
+
+        games = np.full(num_games, self.root, dtype=np.int64)
+        active = np.flatnonzero(self.player[games] != -1)
+        while len(active) > 0:
+            current = games[active]
+            u = np.random.random(len(active))
+            offsets = (u[:, None] >= cumulative[current]).sum(axis=1)
+            # Guard against rounding in the cumulative sums.
+            offsets = np.minimum(offsets, self.child_count[current] - 1)
+            games[active] = self.child_start[current] + offsets
+            active = active[self.player[games[active]] != -1]
+        return games
+
+    def expected_value(self, strategy_1, strategy_2, num_iters):
+        """ Same as ExtensiveGame.expected_value: plays num_iters games of
+        strategy_1 against strategy_2, all at once, and returns an array with
+        the result of each game for player 1.
+        """
+        edge = self.profile_edge_probs(strategy_1, strategy_2)
+        return self.utility[self.sample_terminals(edge, num_iters), 0]
+
+    def exact_expected_value(self, strategy_1, strategy_2):
+        """ The exact expected value for player 1 of strategy_1 against
+        strategy_2, computed by a single pass over the tree instead of by
+        sampling games.
+        """
+        edge = self.profile_edge_probs(strategy_1, strategy_2)
+        return self.subtree_values(edge)[self.root, 0]
+
+
+def compile_game(game):
+    """ Flattens an ExtensiveGame into a CompiledGame. Nodes are visited in
+    breadth first order, and information sets are numbered in the order they
+    are first reached.
+    """
+    player = []
+    parent = []
+    depth = []
+    child_start = []
+    child_count = []
+    action = []
+    chance_prob = []
+    utility = []
+    info_set = []
+    hidden_from = []
+
+    info_set_index = {}
+    info_set_keys = []
+    info_set_player = []
+    info_set_actions = []
+
+    # Each queue entry is (node, parent id, depth, action, chance prob).
+    queue = collections.deque([(game.root, -1, 0, -1, 1.0)])
+    num_nodes = 1
+    while len(queue) > 0:
+        node, parent_id, d, a, p = queue.popleft()
+        node_id = len(player)
+
+        player.append(node.player)
+        parent.append(parent_id)
+        depth.append(d)
+        action.append(a)
+        chance_prob.append(p)
+        utility.append((node.utility.get(1, 0.0), node.utility.get(2, 0.0)))
+        hidden_from.append(sum(1 << (q - 1) for q in node.hidden_from))
+
+        # Children are numbered in the order they are queued, so they are
+        # contiguous starting from the current node count.
+        child_start.append(num_nodes)
+        child_count.append(len(node.children))
+        for child_action, child in node.children.items():
+            child_p = node.chance_probs[child_action] if node.player == 0 else 1.0
+            queue.append((child, node_id, d + 1, child_action, child_p))
+        num_nodes += len(node.children)
+
+        if node.player in [1, 2]:
+            key = game.info_set_ids[node]
+            actions = list(node.children.keys())
+            if key not in info_set_index:
+                info_set_index[key] = len(info_set_keys)
+                info_set_keys.append(key)
+                info_set_player.append(node.player)
+                info_set_actions.append(actions)
+            idx = info_set_index[key]
+            # All nodes in an information set should present the actions in
+            # the same order, since strategies are stored by action position.
+            assert info_set_actions[idx] == actions
+            info_set.append(idx)
+        else:
+            info_set.append(-1)
+
+    max_actions = max([len(a) for a in info_set_actions] + [1])
+    action_table = np.full((len(info_set_keys), max_actions), -1, dtype=np.int32)
+    for idx, actions in enumerate(info_set_actions):
+        action_table[idx, :len(actions)] = actions
+
+    return CompiledGame(
+        player=np.array(player, dtype=np.int8),
+        parent=np.array(parent, dtype=np.int32),
+        depth=np.array(depth, dtype=np.int32),
+        child_start=np.array(child_start, dtype=np.int32),
+        child_count=np.array(child_count, dtype=np.int32),
+        action=np.array(action, dtype=np.int32),
+        chance_prob=np.array(chance_prob, dtype=np.float64),
+        utility=np.array(utility, dtype=np.float64),
+        info_set=np.array(info_set, dtype=np.int32),
+        hidden_from=np.array(hidden_from, dtype=np.uint8),
+        info_set_keys=info_set_keys,
+        info_set_player=np.array(info_set_player, dtype=np.int8),
+        info_set_actions=action_table)
@@ -0,0 +1,262 @@
+# coding: utf-8
+# Chance sampling from pre-drawn deals. Instead of sampling every chance node
+# as it is visited (one np.random.choice call each, e.g. CFRGame.
+# sample_chance_action), whole deals are drawn ahead of time, thousands of
+# iterations at once, and the traversal of iteration t reads its chance
+# outcomes from deal t.
+#
+# A deal is the sequence of outcomes of the chance nodes along a path, e.g. the
+# hole cards of both players followed by the board cards. The k-th chance node
+# on any path from the root (its chance depth, counting from 0) takes the k-th
+# outcome of the deal, so every betting sequence of an iteration sees the same
+# cards. This needs the outcomes available at a chance node and their
+# probabilities to depend only on the outcomes dealt before it, which holds
+# for the card games here; ChanceTree checks it.
+#
+# Deal t is always drawn from the same uniform random numbers, whatever the
+# batch size, so a stream is reproducible from its seed and deals can be read
+# in any order (e.g. after resuming from a checkpoint). Independent streams,
+# e.g. one per worker process, are spawned from the seed of a stream with
+# NumPy's SeedSequence.
+#
+# Usage:
+#   deals = DealStream(ChanceTree(compiled), seed=0)
+#   cfr.cfr(CFRGame(game), deals=deals)
+
+import numpy as np
+
+
+class ChanceTree:
+    """ The tree of the sequences of chance outcomes of a CompiledGame. Every
+    node of the game is mapped to the node of this tree reached by the chance
+    outcomes on its path (its prefix), and every chance node to its chance
+    depth. Per node of the chance tree (indexed by chance tree node id, the
+    root being 0):
+    - depth: the number of outcomes dealt to reach it.
+    - outcome: the action of the last outcome dealt (-1 for the root).
+    - child_count: the number of outcomes of the next chance node (0 if none
+      follows).
+    - children: array of shape (num_nodes, max_outcomes) with the chance tree
+      nodes reached by each outcome, in the order of the children of the game
+      nodes, padded with -1.
+    - cumulative: the probability of drawing one of the first k + 1 outcomes,
+      with the same shape and padded with 2 so that the padding is never drawn.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        num_nodes = game.num_nodes
+
+        # The chance tree node of every game node, built down the game tree one
+        # level at a time. An outcome after the same earlier outcomes can be
+        # dealt at different depths of the game tree (e.g. the board after
+        # different betting sequences), so the chance tree nodes are looked up
+        # by (prefix, outcome) across levels.
+        prefix = np.zeros(num_nodes, dtype=np.int64)
+        ids = {}
+        depth = [0]
+        outcome = [-1]
+        num_outcomes = int(game.action.max()) + 1
+        for start, end, _, _ in game.levels:
+            parents = game.parent[start:end]
+            prefix[start:end] = prefix[parents]
+            dealt = start + np.flatnonzero(game.player[parents] == 0)
+            if len(dealt) == 0:
+                continue
+            keys = prefix[game.parent[dealt]] * num_outcomes + game.action[dealt]
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            unique_ids = np.zeros(len(unique_keys), dtype=np.int64)
+            for k, key in enumerate(unique_keys.tolist()):
+                if key not in ids:
+                    ids[key] = len(depth)
+                    depth.append(depth[key // num_outcomes] + 1)
+                    outcome.append(key % num_outcomes)
+                unique_ids[k] = ids[key]
+            prefix[dealt] = unique_ids[inverse]
+        self.prefix = prefix
+        self.depth = np.array(depth, dtype=np.int64)
+        self.outcome = np.array(outcome, dtype=np.int64)
+        self.num_nodes = len(depth)
+
+        chance_nodes = np.flatnonzero(game.player == 0)
+        self.chance_depth = np.full(num_nodes, -1, dtype=np.int64)
+        self.chance_depth[chance_nodes] = self.depth[prefix[chance_nodes]]
+        self.max_depth = int(self.chance_depth.max()) + 1 if len(chance_nodes) > 0 else 0
+
+        # The outcomes and probabilities of every chance node, as padded rows.
+        counts = game.child_count[chance_nodes]
+        max_outcomes = max(int(counts.max()), 1) if len(chance_nodes) > 0 else 1
+        rows = np.repeat(np.arange(len(chance_nodes)), counts)
+        columns = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        children = np.repeat(game.child_start[chance_nodes], counts) + columns
+        child_table = np.full((len(chance_nodes), max_outcomes), -1, dtype=np.int64)
+        child_table[rows, columns] = prefix[children]
+        prob_table = np.zeros((len(chance_nodes), max_outcomes))
+        prob_table[rows, columns] = game.chance_prob[children]
+
+        # The chance nodes with the same prefix must deal the same outcomes
+        # with the same probabilities. The first one stands for all of them.
+        first = np.full(self.num_nodes, -1, dtype=np.int64)
+        unique_prefixes, first_index = np.unique(prefix[chance_nodes],
+                                                 return_index=True)
+        first[unique_prefixes] = first_index
+        same = first[prefix[chance_nodes]]
+        assert (np.array_equal(child_table, child_table[same]) and
+                np.allclose(prob_table, prob_table[same])), \
+            "The chance outcomes must only depend on the earlier outcomes."
+
+        self.child_count = np.zeros(self.num_nodes, dtype=np.int64)
+        self.children = np.full((self.num_nodes, max_outcomes), -1, dtype=np.int64)
+        self.cumulative = np.full((self.num_nodes, max_outcomes), 2.0)
+        has_children = first >= 0
+        self.child_count[has_children] = counts[first[has_children]]
+        self.children[has_children] = child_table[first[has_children]]
+        cumulative = np.cumsum(prob_table[first[has_children]], axis=1)
+        self.cumulative[has_children] = np.where(
+            child_table[first[has_children]] >= 0, cumulative, 2.0)
+
+    def sample(self, u, start=0):
+        """ Draws one deal for every row of 'u', an array of shape (num_deals,
+        max_depth) of uniform random numbers, from the chance tree node
+        'start' on. Returns two arrays of shape (num_deals, max_depth): the
+        position of the outcome of each chance depth among the children of
+        the chance nodes, and its action. Chance depths before 'start' or
+        after the last chance node of the deal are -1.
+        """
+        num_deals = len(u)
+        offsets = np.full((num_deals, self.max_depth), -1, dtype=np.int64)
+        outcomes = np.full((num_deals, self.max_depth), -1, dtype=np.int64)
+        current = np.full(num_deals, start, dtype=np.int64)
+        for k in range(self.depth[start], self.max_depth):
+            active = np.flatnonzero(self.child_count[current] > 0)
+            if len(active) == 0:
+                break
+            nodes = current[active]
+            offset = (u[active, k, None] >= self.cumulative[nodes]).sum(axis=1)
+            # Guard against rounding in the cumulative sums.
+            offset = np.minimum(offset, self.child_count[nodes] - 1)
+            current[active] = self.children[nodes, offset]
+            offsets[active, k] = offset
+            outcomes[active, k] = self.outcome[current[active]]
+        return offsets, outcomes
+
+
+class Deal:
+    """ The chance outcomes of one iteration, read by the traversals at every
+    chance node they visit.
+    """
+
+    def __init__(self, chance_tree, offsets, outcomes):
+        self.child_start = chance_tree.game.child_start
+        self.chance_depth = chance_tree.chance_depth
+        self.offsets = offsets
+        self.outcomes = outcomes
+
+    def child(self, node):
+        """ The child of the chance node 'node' of the CompiledGame dealt.
+        """
+        return self.child_start[node] + self.offsets[self.chance_depth[node]]
+
+
+class DealStream:
+    """ A reproducible stream of deals, drawn 'batch_size' deals at a time.
+    - chance_tree: the ChanceTree of the game.
+    - seed: an integer, a list of integers or a np.random.SeedSequence.
+    - start: the node of the game the deals start at, or None for the root.
+      The outcomes above it are fixed and left out of the deals (-1).
+    """
+
+    def __init__(self, chance_tree, seed=0, batch_size=4096, start=None):
+        self.chance_tree = chance_tree
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence = seed
+        self.batch_size = batch_size
+        self.start = start
+        self.start_prefix = 0 if start is None else int(chance_tree.prefix[start])
+
+        # The batch of deals drawn last, and the bit generator positioned at
+        # the start of the next batch.
+        self.batch_index = None
+        self.offsets = None
+        self.outcomes = None
+        self.bit_generator = None
+
+    def spawn(self, starts):
+        """ Returns one new stream for each node in 'starts' (None for the
+        root), independent of this one and of each other. The k-th stream is
+        always seeded with the k-th child of this stream's seed, so spawning
+        again gives the same streams (unlike SeedSequence.spawn, which counts
+        the children spawned so far).
+        """
+        seed = self.seed_sequence
+        return [DealStream(self.chance_tree,
+                           np.random.SeedSequence(
+                               seed.entropy, spawn_key=seed.spawn_key + (k,),
+                               pool_size=seed.pool_size),
+                           self.batch_size, start)
+                for k, start in enumerate(starts)]
+
+    def draw(self, b):
+        """ Draws batch b, which holds deals b * batch_size up to (b + 1) *
+        batch_size.
+        """
+        max_depth = self.chance_tree.max_depth
+        if self.bit_generator is None or self.batch_index != b - 1:
+            # Every deal takes max_depth random numbers, so skip those of the
+            # earlier batches.
+            self.bit_generator = np.random.PCG64(self.seed_sequence)
+            self.bit_generator.advance(b * self.batch_size * max_depth)
+        u = np.random.Generator(self.bit_generator).random(
+            (self.batch_size, max_depth))
+        offsets, outcomes = self.chance_tree.sample(u, self.start_prefix)
+        # Lists are faster to index from Python than arrays.
+        self.offsets = offsets.tolist()
+        self.outcomes = outcomes.tolist()
+        self.batch_index = b
+
+    def deal(self, t):
+        """ Returns deal t (a Deal), drawing its batch if needed.
+        """
+        b = t // self.batch_size
+        if b != self.batch_index:
+            self.draw(b)
+        k = t - b * self.batch_size
+        return Deal(self.chance_tree, self.offsets[k], self.outcomes[k])
+
+
+def chance_depths(root):
+    """ Returns a dictionary from the chance nodes of the ExtensiveGame tree
+    below 'root' to their chance depths.
+    """
+    depths = {}
+    node_stack = [(root, 0)]
+    while len(node_stack) > 0:
+        node, k = node_stack.pop()
+        if node.player == 0:
+            depths[node] = k
+            k += 1
+        for child in node.children.values():
+            node_stack.append((child, k))
+    return depths
+
+
+class DealtGame:
+    """ Wraps a CFRGame on an ExtensiveGame so that sample_chance_action
+    returns the outcomes of 'deal' (a Deal), which is set before every
+    iteration. The other methods are looked up on the wrapped game once, and
+    then called directly.
+    """
+
+    def __init__(self, game, depths):
+        self.cfr_game = game
+        self.depths = depths
+        self.deal = None
+
+    def sample_chance_action(self, node):
+        return self.deal.outcomes[self.depths[node]]
+
+    def __getattr__(self, name):
+        value = getattr(self.cfr_game, name)
+        setattr(self, name, value)
+        return value
@@ -15,22 +15,15 @@ def uniformly_random_strategy(game, player):
     actions.
     - game is an ExtensiveGame instance.
     """
-    info_sets = game.info_set_ids
+    info_sets = game.info_sets
 
-    # Restrict to information sets where the given player has to take an action.
-    player_info_sets = {k: v for k, v in info_sets.items() if k.player == player}
-
-    # Now randomly generate player 1's strategy and player 2's strategy. Define
-    # a strategy as being a dictionary from information set identifiers to
-    # probabilities over actions available in that information set.
+    # Define a strategy as being a dictionary from information set identifiers
+    # to probabilities over actions available in that information set. Only the
+    # information sets where the given player has to take an action are needed.
     strategy = {}
-    for node, identifier in player_info_sets.items():
-        actions = node.children.keys()
-        # Only need to add to the strategy for nodes whose information set has
-        # not been included already.
-        if identifier not in strategy:
-            # Sample actions uniformly at random. Can change this later.
-            strategy[identifier] = {a: 1.0 / float(len(actions)) for a in actions}
+    for k in info_sets.player_ids(player):
+        actions = info_sets.actions[k]
+        strategy[info_sets.keys[k]] = {a: 1.0 / float(len(actions)) for a in actions}
 
     return strategy
 
@@ -40,23 +33,16 @@ def dirichlet_random_strategy(game, player):
     over actions for the given player.
     - game is an ExtensiveGame instance.
     """
-    info_sets = game.build_information_sets(player)
-
-    # Restrict to information sets where the given player has to take an action.
-    player_info_sets = {k: v for k, v in info_sets.items() if k.player == player}
+    info_sets = game.info_sets
 
-    # Now randomly generate player 1's strategy and player 2's strategy. Define
-    # a strategy as being a dictionary from information set identifiers to
-    # probabilities over actions available in that information set.
+    # Define a strategy as being a dictionary from information set identifiers
+    # to probabilities over actions available in that information set. Only the
+    # information sets where the given player has to take an action are needed.
     strategy = {}
-    for node, identifier in player_info_sets.items():
-        actions = node.children.keys()
-        # Only need to add to the strategy for nodes whose information set has
-        # not been included already.
-        if identifier not in strategy:
-            # Sample actions uniformly at random. Can change this later.
-            probs = random_distribution(len(actions))
-            strategy[identifier] = {a: p for a, p in zip(actions, probs)}
+    for k in info_sets.player_ids(player):
+        actions = info_sets.actions[k]
+        probs = random_distribution(len(actions))
+        strategy[info_sets.keys[k]] = {a: p for a, p in zip(actions, probs)}
 
     return strategy
 
@@ -67,26 +53,19 @@ def constant_action_strategy(game, player, action):
     player.
     - game is an ExtensiveGame instance.
     """
-    info_sets = game.build_information_sets(player)
-
-    # Restrict to information sets where the given player has to take an action.
-    player_info_sets = {k: v for k, v in info_sets.items() if k.player == player}
+    info_sets = game.info_sets
 
-    # Now randomly generate player 1's strategy and player 2's strategy. Define
-    # a strategy as being a dictionary from information set identifiers to
-    # probabilities over actions available in that information set.
+    # Define a strategy as being a dictionary from information set identifiers
+    # to probabilities over actions available in that information set. Only the
+    # information sets where the given player has to take an action are needed.
     strategy = {}
-    for node, identifier in player_info_sets.items():
-        actions = node.children.keys()
-        # Only need to add to the strategy for nodes whose information set has
-        # not been included already.
-        if identifier not in strategy:
-            # Play the action specified. If it's not available, play uniformly
-            # over all actions.
-            strategy[identifier] = {a: 0.0 for a in actions}
-            if action in actions:
-                strategy[identifier][action] = 1.0
-            else:
-                strategy[identifier] = {a: 1.0 / len(actions) for a in actions}
+    for k in info_sets.player_ids(player):
+        actions = info_sets.actions[k]
+        # Play the action specified. If it's not available, play uniformly
+        # over all actions.
+        if action in actions:
+            strategy[info_sets.keys[k]] = {a: float(a == action) for a in actions}
+        else:
+            strategy[info_sets.keys[k]] = {a: 1.0 / len(actions) for a in actions}
 
     return strategy
@@ -1,6 +1,7 @@
 # coding: utf-8
 
-import numpy as np
+from compiled_game import compile_game
+from traversal import Traversal
 
 
 class ExtensiveGameNode:
@@ -30,26 +31,81 @@ class ExtensiveGameNode:
         self.chance_probs = {}
 
 
+class InformationSets:
+    """ The information sets of an ExtensiveGame, numbered 0, 1, ... in the
+    order in which they are first reached. For an information set id:
+    - keys[id] is its identifier, the tuple of actions visible to the player
+      to play (as in ExtensiveGame.info_set_ids).
+    - players[id] is the player to play.
+    - nodes[id] is the list of nodes in it.
+    - actions[id] is the list of actions available in it.
+    Also, ids is a dictionary from identifiers to ids, and node_ids is a
+    dictionary from nodes of players 1 and 2 to the id of their information
+    set.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.players = []
+        self.nodes = []
+        self.actions = []
+        self.ids = {}
+        self.node_ids = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, node, key):
+        """ Adds 'node', with identifier 'key', to its information set, creating
+        the information set if this is the first node in it.
+        """
+        info_set_id = self.ids.get(key)
+        if info_set_id is None:
+            info_set_id = len(self.keys)
+            self.ids[key] = info_set_id
+            self.keys.append(key)
+            self.players.append(node.player)
+            self.nodes.append([])
+            self.actions.append(list(node.children.keys()))
+        self.nodes[info_set_id].append(node)
+        self.node_ids[node] = info_set_id
+
+    def player_ids(self, player):
+        """ Returns the ids of the information sets of 'player'.
+        """
+        return [k for k, p in enumerate(self.players) if p == player]
+
+
 class ExtensiveGame:
 
     def __init__(self, root):
         # set the root node.
         self.root = root
 
-        # Also build the information set ids.
-        self.info_set_ids = self.build_info_set_ids()
+        # Index the information sets of both players, and the information set
+        # id of each node, in one pass over the tree.
+        self.info_sets = self.build_info_set_index()
+        self.info_set_ids = {
+            node: self.info_sets.keys[k]
+            for node, k in self.info_sets.node_ids.items()}
+
+        # The array backed copy of the game, built on first use by compile.
+        self.compiled = None
+
+    def compile(self):
+        """ Returns the CompiledGame for this game, building it the first time.
+        """
+        if self.compiled is None:
+            self.compiled = compile_game(self)
+        return self.compiled
 
     @staticmethod
     def print_tree_recursive(node, action_list, only_leaves):
-        """ Prints out a list of all nodes in the tree rooted at 'node'.
+        """ Prints out a list of all nodes in the tree rooted at 'node'. The
+        tree is walked with an explicit stack (see PrintTreeWalk), so it can be
+        deeper than the recursion limit.
         """
-        if only_leaves and len(node.children) == 0:
-            print(action_list, node.utility)
-        elif not only_leaves:
-            print(action_list)
-        for action, child in node.children.items():
-            ExtensiveGame.print_tree_recursive(
-                child, action_list + [action], only_leaves)
+        PrintTreeWalk(action_list, only_leaves).walk(node)
 
     def print_tree(self, only_leaves=False):
         """ Prints out a list of all nodes in the tree by the list of actions
@@ -57,56 +113,41 @@ class ExtensiveGame:
         """
         ExtensiveGame.print_tree_recursive(self.root, [], only_leaves)
 
-    def build_information_sets(self, player):
-        """ Returns a dictionary from nodes to a unique identifier for the
-        information set containing the node. This is all for the given player.
+    def build_info_set_index(self):
+        """ Returns the InformationSets of the game, built by a single depth
+        first traversal of the tree. The visible actions of both players are
+        kept in two buffers shared by all nodes, which are cut back to the depth
+        of each node as it is visited, and only copied into a tuple at the nodes
+        where the player is to play.
         """
-        info_set = {}
-
-        # We just recursively walk over the tree using a stack to store the
-        # nodes to explore.
-        node_stack = [self.root]
-        visible_actions_stack = [[]]
+        info_sets = InformationSets()
+        visible = {1: [], 2: []}
 
-        # First build the information sets for player 1.
+        # The stack holds the nodes to explore, with their depth, and the
+        # action leading to them as seen by players 1 and 2.
+        node_stack = [(self.root, 0, None, None)]
         while len(node_stack) > 0:
-            node = node_stack.pop()
-            visible_actions = visible_actions_stack.pop()
-
-            # Add the information set for the node, indexed by the
-            # visible_actions list, to the information set dictionary. Use a
-            # tuple instead of a list so that it is hashable if we want later
-            # on.
-            info_set[node] = tuple(visible_actions)
+            node, depth, action_1, action_2 = node_stack.pop()
+            if depth > 0:
+                # Every node visited since the parent is in the subtree of the
+                # parent, so the entries before depth - 1 are the actions
+                # leading to the parent.
+                del visible[1][depth - 1:]
+                del visible[2][depth - 1:]
+                visible[1].append(action_1)
+                visible[2].append(action_2)
+
+            if node.player in [1, 2]:
+                info_sets.add(node, tuple(visible[node.player]))
 
             for action, child in node.children.items():
-                # Add all the children to the node stack and also the visible
-                # actions to the action stack. If an action is hidden from the
-                # player, then add -1 to signify this.
-                node_stack.append(child)
-                if player in node.hidden_from:
-                    visible_actions_stack.append(visible_actions + [-1])
-                else:
-                    visible_actions_stack.append(visible_actions + [action])
-
-        return info_set
-
-    def build_info_set_ids(self):
-        """ Join the two info set dictionaries. The keys are nodes in the game
-        tree belonging to player 1 or player 2, and the values are the
-        identifier for the information set the node belongs to, from the
-        perspective of the player to play in the node.
-        """
-        info_sets_1 = self.build_information_sets(1)
-        info_sets_2 = self.build_information_sets(2)
-        info_set_ids = {}
-        for k, v in info_sets_1.items():
-            if k.player == 1:
-                info_set_ids[k] = v
-        for k, v in info_sets_2.items():
-            if k.player == 2:
-                info_set_ids[k] = v
-        return info_set_ids
+                # If an action is hidden from a player, then they see -1.
+                node_stack.append((
+                    child, depth + 1,
+                    -1 if 1 in node.hidden_from else action,
+                    -1 if 2 in node.hidden_from else action))
+
+        return info_sets
 
     def expected_value(self, strategy_1, strategy_2, num_iters):
         """ Given a strategy for player 1 and a strategy for player 2, compute
@@ -115,47 +156,18 @@ class ExtensiveGame:
           for player 1 for all of player 1's nodes to probabilities over actions
           available in that information set.
         - strategy_2: same for player 2.
-        Returns the result of each game of strategy_1 versus strategy_2.
+        Returns an array with the result of each game of strategy_1 versus
+        strategy_2.
         """
-        results = []
-        for t in range(num_iters):
-            node = self.root
-            while node.player != -1:
-                # Default to playing randomly.
-                actions = [a for a in node.children.keys()]
-                probs = [1.0 / float(len(actions)) for a in actions]
-
-                # If it's a chance node, then sample an outcome.
-                if node.player == 0:
-                    probs = node.chance_probs.values()
-                elif node.player == 1:
-                    # It's player 1's node, so use their strategy to make a
-                    # decision.
-                    info_set = self.info_set_ids[node]
-                    if info_set in strategy_1:
-                        probs = strategy_1[info_set].values()
-                elif node.player == 2:
-                    # It's player 2's node, so use their strategy to make a
-                    # decision.
-                    info_set = self.info_set_ids[node]
-                    if info_set in strategy_2:
-                        probs = strategy_2[info_set].values()
-
-                probs = [p for p in probs]
-
-                # Make sure the probabilities sum to 1
-                assert abs(1.0 - sum(probs)) < 1e-5
-
-                # Sample an action from the probability distribution.
-                action = np.random.choice(np.array(actions), p=np.array(probs))
-
-                # Move into the child node.
-                node = node.children[action]
-
-            # The node is terminal. Add the utility for player 1 to the results.
-            results.append(node.utility[1])
-
-        return results
+        # The games are simulated in a batch on the compiled game.
+        return self.compile().expected_value(strategy_1, strategy_2, num_iters)
+
+    def exact_expected_value(self, strategy_1, strategy_2):
+        """ The exact expected value for player 1 of strategy_1 against
+        strategy_2 (with the same arguments as expected_value), computed by a
+        single pass over the tree.
+        """
+        return self.compile().exact_expected_value(strategy_1, strategy_2)
 
     def complete_strategy_uniformly(self, strategy, verbose=True):
         """ Given a partial strategy, i.e. a dictionary from a subset of the
@@ -165,12 +177,45 @@ class ExtensiveGame:
         """
         new_strategy = strategy.copy()
         num_missing = 0
-        for node, info_set_id in self.info_set_ids.items():
+        for info_set_id, actions in zip(self.info_sets.keys,
+                                        self.info_sets.actions):
             if info_set_id not in new_strategy:
-                actions = node.children.keys()
                 new_strategy[info_set_id] = {
                     a: 1.0 / float(len(actions)) for a in actions}
                 num_missing += 1
         if num_missing > 0 and verbose:
             print("Completed strategy at {} information sets.".format(num_missing))
         return new_strategy
+
+
+class PrintTreeWalk(Traversal):
+    """ Prints every node of a tree (or only the leaves, with their utility)
+    by the list of actions leading to it, for ExtensiveGame.print_tree_recursive.
+    'action_list' is the list of actions leading to the root of the walk.
+    """
+
+    def __init__(self, action_list, only_leaves):
+        # The list of actions leading to the node being walked at each depth,
+        # and its children by action.
+        Traversal.__init__(self, {"action_lists": None, "children": None})
+        self.only_leaves = only_leaves
+        self.action_lists = self.buffers.action_lists
+        self.children = self.buffers.children
+        self.action_lists[0] = action_list
+
+    def enter(self, depth, k):
+        if depth == 0:
+            node = self.root
+        else:
+            action, node = self.children[depth - 1][k]
+            self.action_lists[depth] = self.action_lists[depth - 1] + [action]
+        action_list = self.action_lists[depth]
+        if self.only_leaves and len(node.children) == 0:
+            print(action_list, node.utility)
+        elif not self.only_leaves:
+            print(action_list)
+        self.children[depth] = list(node.children.items())
+        return len(node.children)
+
+    def leave(self, depth, values):
+        return None
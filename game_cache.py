@@ -0,0 +1,161 @@
+# coding: utf-8
+# A cache of compiled games on disk. Building a game tree node by node and
+# indexing its information sets takes a while, so the CompiledGame of a game
+# is saved the first time it is built, as an uncompressed .npz file holding its
+# arrays and its information set identifiers, and loaded from the file by
+# later runs. The arrays can be memory mapped straight from the file, so that
+# loading only reads the pages used, and all processes using the same game
+# share one copy in the page cache. A memory mapped game is also sent to
+# worker processes as the path of its file (see CompiledGame.__reduce_ex__).
+#
+# The files are named by the game class, the game parameters and a hash of
+# the source of the modules building the tree, so that changing the game or
+# the compiler never loads a stale tree.
+#
+# Usage:
+#   game = cached_compiled_game(LeducPoker, 5)
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+import sys
+import zipfile
+
+import numpy as np
+
+from compiled_game import CompiledGame
+
+# The version of the file layout.
+FORMAT_VERSION = 1
+
+# The arrays of a CompiledGame stored in the file, as passed to its
+# constructor.
+ARRAYS = ["player", "parent", "depth", "child_start", "child_count", "action",
+          "chance_prob", "utility", "info_set", "hidden_from",
+          "info_set_player", "info_set_actions"]
+
+# The modules, besides the module of the game class, whose source the cached
+# trees depend on.
+MODULES = ["compiled_game", "extensive_game", "isomorphism"]
+
+
+def default_cache_dir():
+    """ The directory of the cache: $CFR_GAME_CACHE if it is set, or
+    ~/.cache/cfr_games.
+    """
+    return os.environ.get("CFR_GAME_CACHE", os.path.join(
+        os.path.expanduser("~"), ".cache", "cfr_games"))
+
+
+def version_hash(game_type):
+    """ Returns a hash of the file format version and of the source of the
+    modules building the tree of games of the class 'game_type'.
+    """
+    digest = hashlib.sha256(str(FORMAT_VERSION).encode())
+    for name in [game_type.__module__] + MODULES:
+        __import__(name)
+        with open(sys.modules[name].__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def cache_path(game_type, n_cards, cache_dir=None):
+    """ The path of the file caching game_type.create_game(n_cards).
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    return os.path.join(cache_dir, "{}_{}_{}.npz".format(
+        game_type.__name__, n_cards, version_hash(game_type)))
+
+
+def save_compiled_game(path, game):
+    """ Writes the arrays and the information set identifiers (tuples of
+    integers) of the CompiledGame 'game' to 'path', as an uncompressed .npz
+    file. The file is first written next to 'path' and then renamed over it,
+    so readers, including other processes building the same game, never see a
+    partial file.
+    """
+    keys = game.info_set_keys
+    assert all(isinstance(a, (int, np.integer)) for key in keys for a in key), \
+        "Only information set identifiers made of integers can be cached."
+    arrays = {name: getattr(game, name) for name in ARRAYS}
+    # The identifiers are stored as their concatenated entries and lengths.
+    arrays["info_set_key_entries"] = np.array(
+        [a for key in keys for a in key], dtype=np.int64)
+    arrays["info_set_key_lengths"] = np.array(
+        [len(key) for key in keys], dtype=np.int64)
+    arrays["format_version"] = np.array(FORMAT_VERSION)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _map_arrays(path):
+    """ Returns a dictionary from the names of the arrays in the uncompressed
+    .npz file 'path' to read only views of them on top of a memory map of the
+    file.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for info in archive.infolist():
+            assert info.compress_type == zipfile.ZIP_STORED
+            # The data of a member follows its local header: 30 bytes, then
+            # its name and an extra field of the lengths given at bytes 26
+            # and 28.
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            if np.lib.format.read_magic(f) == (1, 0):
+                header = np.lib.format.read_array_header_1_0(f)
+            else:
+                header = np.lib.format.read_array_header_2_0(f)
+            shape, fortran_order, dtype = header
+            array = np.frombuffer(buffer, dtype=dtype, count=math.prod(shape),
+                                  offset=f.tell())
+            arrays[info.filename[:-len(".npy")]] = array.reshape(
+                shape, order="F" if fortran_order else "C")
+    return arrays
+
+
+def load_compiled_game(path, mmap=True):
+    """ Reads a CompiledGame written by save_compiled_game. With mmap=True,
+    its arrays are read only memory maps of the file.
+    """
+    if mmap:
+        arrays = _map_arrays(path)
+    else:
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+    if int(arrays["format_version"]) != FORMAT_VERSION:
+        raise ValueError("{} is not a compiled game file of version {}.".format(
+            path, FORMAT_VERSION))
+
+    entries = arrays["info_set_key_entries"].tolist()
+    ends = np.cumsum(arrays["info_set_key_lengths"]).tolist()
+    keys = [tuple(entries[end - length:end]) for end, length in
+            zip(ends, arrays["info_set_key_lengths"].tolist())]
+    game = CompiledGame(info_set_keys=keys,
+                        **{name: arrays[name] for name in ARRAYS})
+    game.cache_path = path
+    game.cache_mmap = mmap
+    return game
+
+
+def cached_compiled_game(game_type, n_cards, cache_dir=None, mmap=True):
+    """ Returns the CompiledGame of game_type.create_game(n_cards) (e.g. for
+    LeducPoker or OneCardPoker), loaded from the cache in 'cache_dir' (by
+    default default_cache_dir()), or built and added to the cache if it isn't
+    there yet.
+    """
+    path = cache_path(game_type, n_cards, cache_dir)
+    if not os.path.exists(path):
+        save_compiled_game(path, game_type.create_game(n_cards).compile())
+    return load_compiled_game(path, mmap)
@@ -0,0 +1,299 @@
+# coding: utf-8
+# A configurable limit hold'em game, built from tables of per round settings
+# instead of a hand written tree builder. Leduc Hold'em, and larger or smaller
+# games like it, are instances of it.
+#
+# The state of a node (the cards dealt, the betting in the current round, the
+# bets and whether the game is over) is packed into a single integer, which is
+# all that is needed to create the node and its children. The states are the
+# decks in the node function protocol of LeducPoker.create_node, so the games
+# can be built eagerly, generated lazily (lazy_game.LazyGame) or abstracted
+# (abstraction.Abstraction) like the other games.
+#
+# Betting actions are 0 (fold), 1 (check or call) and 2 (bet or raise). Chance
+# outcomes are card ranks 0, 1, ..., num_ranks - 1. The suits never matter
+# (hands are ranked by pairs, trips and so on, and there are no straights or
+# flushes), so the cards of a rank are dealt as one outcome, weighted by the
+# number of them left in the deck.
+
+import collections
+import itertools
+
+import numpy as np
+
+from extensive_game import ExtensiveGame, ExtensiveGameNode
+from isomorphism import create_tree
+from lazy_game import LazyGame
+
+FOLD, CALL, RAISE = 0, 1, 2
+
+# The 'done' field of a state.
+IN_PLAY, FOLDED, SHOWDOWN = 0, 1, 2
+
+
+class StateLayout:
+    """ Packs named unsigned integer fields into a single integer. 'fields' is
+    a list of the field names and their widths in bits.
+    """
+
+    def __init__(self, fields):
+        self.offsets = {}
+        self.masks = {}
+        offset = 0
+        for name, bits in fields:
+            self.offsets[name] = offset
+            self.masks[name] = (1 << bits) - 1
+            offset += bits
+        self.bits = offset
+
+    def get(self, state, name):
+        return (state >> self.offsets[name]) & self.masks[name]
+
+    def set(self, state, name, value):
+        mask = self.masks[name]
+        assert 0 <= value <= mask, "{} = {} does not fit.".format(name, value)
+        offset = self.offsets[name]
+        return (state & ~(mask << offset)) | (value << offset)
+
+    def unpack(self, state):
+        """ Returns a dictionary from the field names to their values.
+        """
+        return {name: self.get(state, name) for name in self.offsets}
+
+
+def bits_for(n):
+    """ The number of bits needed to store the integers 0 up to n.
+    """
+    return max(1, int(n).bit_length())
+
+
+def hand_value(ranks, hand_size=5):
+    """ Returns a tuple which orders hands made of the card ranks in 'ranks':
+    more cards of a kind beat fewer (e.g. trips beat two pair, which beats a
+    pair), then higher ranks beat lower ones. With more than 'hand_size' cards,
+    the best 'hand_size' of them are used.
+    """
+    if len(ranks) > hand_size:
+        return max(hand_value(hand, hand_size)
+                   for hand in itertools.combinations(ranks, hand_size))
+    counts = collections.Counter(ranks)
+    groups = sorted(counts.items(), key=lambda g: (g[1], g[0]), reverse=True)
+    return (tuple(count for _, count in groups),
+            tuple(rank for rank, _ in groups))
+
+
+class LimitHoldem:
+    """ A two player limit hold'em game.
+    - num_ranks, copies: the deck has 'copies' cards of each of 'num_ranks'
+      ranks.
+    - hole_cards: the number of private cards dealt to each player.
+    - board_cards: the number of public cards dealt at the start of each
+      betting round. Its length is the number of rounds.
+    - bet_sizes: the size of a bet or raise in each round.
+    - raise_caps: the maximum number of bets and raises in each round.
+    - first_player: the player to act first in each round.
+    - ante: the forced bet of each player.
+    The defaults are standard Leduc Hold'em (288 information sets, worth
+    about -0.0856 to player 1). LeducPoker differs from it: player 2 acts first
+    in the second round, up to 4 bets and raises are allowed per round, a fold
+    does not end the game and player 2 wins ties.
+    """
+
+    def __init__(self, num_ranks=3, copies=2, hole_cards=1, board_cards=(0, 1),
+                 bet_sizes=(2, 4), raise_caps=(2, 2), first_player=(1, 1),
+                 ante=1):
+        num_rounds = len(board_cards)
+        assert len(bet_sizes) == len(raise_caps) == len(first_player) == num_rounds
+        self.num_ranks = num_ranks
+        self.copies = copies
+        self.hole_cards = hole_cards
+        self.board_cards = list(board_cards)
+        self.bet_sizes = list(bet_sizes)
+        self.raise_caps = list(raise_caps)
+        self.first_player = list(first_player)
+        self.ante = ante
+        self.num_rounds = num_rounds
+
+        # The number of cards dealt before the betting of each round starts.
+        self.cards_before_round = [
+            2 * hole_cards + sum(self.board_cards[:r + 1])
+            for r in range(num_rounds)]
+        self.num_cards = self.cards_before_round[-1]
+        assert self.num_cards <= num_ranks * copies, "The deck is too small."
+
+        max_bet = ante + sum(s * c for s, c in zip(bet_sizes, raise_caps))
+        max_actions = max(raise_caps) + 2
+        # The possible hole cards of a player (sorted tuples of ranks), and the
+        # showdown tables by board (see showdown_table).
+        self.holes = [
+            hole for hole in itertools.combinations_with_replacement(
+                range(num_ranks), hole_cards)
+            if max(collections.Counter(hole).values()) <= copies]
+        self.hole_index = {hole: k for k, hole in enumerate(self.holes)}
+        self.showdown_tables = {}
+
+        # Card slots store the rank plus one, so that 0 means not dealt.
+        self.layout = StateLayout(
+            [("round", bits_for(num_rounds - 1)),
+             ("raises", bits_for(max(raise_caps))),
+             ("actions", bits_for(max_actions)),
+             ("bet_1", bits_for(max_bet)),
+             ("bet_2", bits_for(max_bet)),
+             ("done", 2),
+             ("folder", 2),
+             ("num_dealt", bits_for(self.num_cards))] +
+            [("card_{}".format(k), bits_for(num_ranks))
+             for k in range(self.num_cards)])
+
+    def initial_state(self):
+        """ The state at the root: no cards dealt, and both players have paid
+        the ante.
+        """
+        state = self.layout.set(0, "bet_1", self.ante)
+        return self.layout.set(state, "bet_2", self.ante)
+
+    def dealt_cards(self, state):
+        """ Returns the ranks of the cards dealt in 'state', in the order they
+        were dealt: the hole cards of player 1, those of player 2, then the
+        board.
+        """
+        return [self.layout.get(state, "card_{}".format(k)) - 1
+                for k in range(self.layout.get(state, "num_dealt"))]
+
+    def create_node(self, action_list, state):
+        """ Creates the node with the packed state 'state', without its
+        children, in the form of LeducPoker.create_node. 'action_list' is not
+        needed, since the state holds everything about the node. Returns the
+        node and a dictionary from its actions to the states of its children.
+        """
+        layout = self.layout
+        done = layout.get(state, "done")
+        if done != IN_PLAY:
+            node = ExtensiveGameNode(-1)
+            node.utility = self.compute_utility(state)
+            return node, {}
+
+        num_dealt = layout.get(state, "num_dealt")
+        if num_dealt < self.cards_before_round[layout.get(state, "round")]:
+            return self.create_chance_node(state, num_dealt)
+
+        # A betting node.
+        r = layout.get(state, "round")
+        num_actions = layout.get(state, "actions")
+        player = self.first_player[r]
+        if num_actions % 2 == 1:
+            player = 3 - player
+        node = ExtensiveGameNode(player)
+        bets = {1: layout.get(state, "bet_1"), 2: layout.get(state, "bet_2")}
+
+        actions = []
+        if bets[player] < bets[3 - player]:
+            actions.append(FOLD)
+        actions.append(CALL)
+        if layout.get(state, "raises") < self.raise_caps[r]:
+            actions.append(RAISE)
+        return node, {a: self.apply_action(state, player, bets, a)
+                      for a in actions}
+
+    def create_chance_node(self, state, num_dealt):
+        """ Creates the chance node dealing the next card in 'state'. The hole
+        cards are hidden from the opponent.
+        """
+        node = ExtensiveGameNode(0)
+        if num_dealt < self.hole_cards:
+            node.hidden_from = [2]
+        elif num_dealt < 2 * self.hole_cards:
+            node.hidden_from = [1]
+
+        # The number of cards of each rank left in the deck.
+        remaining = [self.copies] * self.num_ranks
+        for rank in self.dealt_cards(state):
+            remaining[rank] -= 1
+        num_remaining = float(sum(remaining))
+
+        children = {}
+        for rank, count in enumerate(remaining):
+            if count > 0:
+                node.chance_probs[rank] = count / num_remaining
+                child = self.layout.set(
+                    state, "card_{}".format(num_dealt), rank + 1)
+                children[rank] = self.layout.set(
+                    child, "num_dealt", num_dealt + 1)
+        return node, children
+
+    def apply_action(self, state, player, bets, action):
+        """ Returns the state after 'player' takes the betting 'action' in
+        'state', where 'bets' holds the current bets of both players.
+        """
+        layout = self.layout
+        r = layout.get(state, "round")
+        if action == FOLD:
+            state = layout.set(state, "done", FOLDED)
+            return layout.set(state, "folder", player)
+
+        bet = bets[3 - player]
+        if action == RAISE:
+            bet += self.bet_sizes[r]
+            state = layout.set(state, "raises", layout.get(state, "raises") + 1)
+        state = layout.set(state, "bet_{}".format(player), bet)
+        num_actions = layout.get(state, "actions") + 1
+
+        if action == CALL and num_actions >= 2:
+            # A call (or a second check) closes the round.
+            if r == self.num_rounds - 1:
+                return layout.set(state, "done", SHOWDOWN)
+            state = layout.set(state, "round", r + 1)
+            state = layout.set(state, "raises", 0)
+            return layout.set(state, "actions", 0)
+        return layout.set(state, "actions", num_actions)
+
+    def compute_utility(self, state):
+        """ The utility of both players at a terminal state. The loser loses
+        their bet to the winner; tied hands split the pot.
+        """
+        layout = self.layout
+        bets = {1: layout.get(state, "bet_1"), 2: layout.get(state, "bet_2")}
+        if layout.get(state, "done") == FOLDED:
+            loser = layout.get(state, "folder")
+        else:
+            cards = self.dealt_cards(state)
+            h = self.hole_cards
+            result = self.showdown_table(cards[2 * h:])[
+                self.hole_index[tuple(sorted(cards[:h]))],
+                self.hole_index[tuple(sorted(cards[h:2 * h]))]]
+            if result == 0:
+                return {1: 0.0, 2: 0.0}
+            loser = 2 if result > 0 else 1
+        winner = 3 - loser
+        return {winner: float(bets[loser]), loser: -float(bets[loser])}
+
+    def showdown_table(self, board):
+        """ Returns the result of the showdown for player 1 with the board
+        cards 'board', for every pair of hole cards in self.holes: an array of
+        shape (num_holes, num_holes) holding 1 if player 1 wins, -1 if they
+        lose and 0 for a tie. The table of every board is built once and then
+        looked up. Pairs of hole cards which can't be dealt with the board are
+        included, so the rows are the same for all boards.
+        """
+        board = tuple(sorted(board))
+        table = self.showdown_tables.get(board)
+        if table is None:
+            values = [hand_value(hole + board) for hole in self.holes]
+            # Rank the hands so that they can be compared as integers.
+            order = {v: k for k, v in enumerate(sorted(set(values)))}
+            strengths = np.array([order[v] for v in values])
+            table = np.sign(strengths[:, None] - strengths[None, :])
+            self.showdown_tables[board] = table
+        return table
+
+    def create_game(self):
+        """ Builds the whole game tree as an ExtensiveGame.
+        """
+        return ExtensiveGame(create_tree(self.create_node, [],
+                                         self.initial_state()))
+
+    def create_lazy_game(self):
+        """ Returns the game as a LazyGame, whose nodes are only created when
+        they are visited.
+        """
+        return LazyGame(self.create_node, self.initial_state())
@@ -0,0 +1,86 @@
+# coding: utf-8
+# Merging isomorphic chance outcomes. If relabelling some chance outcomes (e.g.
+# the suits of the cards in a game without flushes) leaves the rest of the game
+# unchanged, the subtrees below them are identical, and it suffices to keep one
+# representative with the summed chance probability. A strategy of the smaller,
+# canonical game is then mapped back to the full game.
+#
+# An isomorphism is given by a function 'canonical_action', which maps every
+# action of the full game to its representative. Actions that are not merged
+# (such as the betting actions) map to themselves, and -1 (a hidden action in
+# an information set identifier) must map to itself.
+
+from extensive_game import ExtensiveGame
+
+
+def canonical_node_fn(create_node, canonical_action):
+    """ Returns a node function of the canonical game, in the form of
+    LeducPoker.create_node, given the node function 'create_node' of the full
+    game. The deck passed to the returned function is a pair of the action
+    list of the full game leading to the node and the remaining deck of the
+    full game, so it is called with ([], cards) at the root.
+    """
+    def create_canonical_node(action_list, state):
+        full_actions, cards = state
+        node, children = create_node(full_actions, cards)
+        if node.player != 0:
+            return node, {a: (full_actions + [a], child_cards)
+                          for a, child_cards in children.items()}
+
+        # The first chance outcome with a given representative stands in for
+        # all of them.
+        canonical_children = {}
+        chance_probs = {}
+        for a, child_cards in children.items():
+            c = canonical_action(a)
+            if c not in canonical_children:
+                canonical_children[c] = (full_actions + [a], child_cards)
+                chance_probs[c] = 0.0
+            chance_probs[c] += node.chance_probs[a]
+        node.chance_probs = chance_probs
+        return node, canonical_children
+
+    return create_canonical_node
+
+
+def create_tree(create_node, action_list, cards):
+    """ Creates the tree below the node reached by 'action_list', using a node
+    function in the form of LeducPoker.create_node.
+    """
+    node, children = create_node(action_list, cards)
+    for action, child_cards in children.items():
+        node.children[action] = create_tree(
+            create_node, action_list + [action], child_cards)
+    return node
+
+
+def create_canonical_game(create_node, cards, canonical_action):
+    """ Creates the canonical game (an ExtensiveGame) of the game with node
+    function 'create_node' and deck 'cards', under 'canonical_action'. Its
+    actions and information set identifiers are those of the full game, mapped
+    through 'canonical_action'.
+    """
+    return ExtensiveGame(create_tree(
+        canonical_node_fn(create_node, canonical_action), [], ([], cards)))
+
+
+def canonical_info_set(info_set, canonical_action):
+    """ Returns the identifier of the information set of the canonical game
+    containing the information set 'info_set' of the full game.
+    """
+    return tuple(canonical_action(a) for a in info_set)
+
+
+def expand_strategy(strategy, full_game, canonical_action):
+    """ Maps a strategy of the canonical game, as returned by cfr.cfr, to a
+    strategy of 'full_game' (an ExtensiveGame), which plays the same in every
+    information set as in its canonical information set. Information sets
+    missing from 'strategy' are left out.
+    """
+    info_sets = full_game.info_sets
+    full_strategy = {}
+    for key, actions in zip(info_sets.keys, info_sets.actions):
+        probs = strategy.get(canonical_info_set(key, canonical_action))
+        if probs is not None:
+            full_strategy[key] = {a: probs[canonical_action(a)] for a in actions}
+    return full_strategy
@@ -0,0 +1,83 @@
+# coding: utf-8
+# A game whose tree is generated on demand rather than built up front. Nodes are
+# identified by a compact state, the tuple of actions (including the chance
+# outcomes, such as the cards dealt) taken from the root, and are only created
+# when a solver first reaches them. Sampling solvers such as chance sampled CFR
+# and MCCFR then only ever create the part of the tree they visit.
+
+
+class LazyGame:
+    """ A game tree generated from a node function, with the same information
+    set identifiers as the equivalent ExtensiveGame.
+    - create_node: a function taking an action list and the remaining deck, and
+      returning the ExtensiveGameNode reached by the action list (without its
+      children) and a dictionary from the actions available in it to the deck
+      after each of them, e.g. LeducPoker.create_node.
+    - cards: the deck at the root.
+    """
+
+    def __init__(self, create_node, cards):
+        self.create_node = create_node
+        self.cards = cards
+        self.root = ()
+
+        # The nodes created so far. The keys are states, and the values are
+        # tuples of the node, the dictionary from actions to the deck after
+        # them, and the actions visible to players 1 and 2 on the way to the
+        # node (from which the information set identifiers are read off).
+        self.nodes = dict()
+        self.clear()
+
+    def clear(self):
+        """ Forgets all the nodes created so far, except the root.
+        """
+        node, children = self.create_node([], self.cards)
+        self.nodes = {self.root: (node, children, ((), ()))}
+
+    def expand(self, state):
+        """ Returns the record of 'state' (see self.nodes), creating it, and
+        any of its ancestors that are missing, if it has not been seen before.
+        """
+        record = self.nodes.get(state)
+        if record is None:
+            parent, parent_children, (visible_1, visible_2) = self.expand(state[:-1])
+            action = state[-1]
+            node, children = self.create_node(
+                list(state), parent_children[action])
+            # Hidden actions are replaced by -1, as in
+            # ExtensiveGame.build_info_set_index.
+            visible_1 += (-1,) if 1 in parent.hidden_from else (action,)
+            visible_2 += (-1,) if 2 in parent.hidden_from else (action,)
+            record = (node, children, (visible_1, visible_2))
+            self.nodes[state] = record
+        return record
+
+    def node(self, state):
+        """ Returns the ExtensiveGameNode of 'state'. Its children are not set;
+        use actions and child instead.
+        """
+        return self.expand(state)[0]
+
+    def actions(self, state):
+        """ Returns the actions available in 'state'.
+        """
+        return list(self.expand(state)[1].keys())
+
+    def child(self, state, action):
+        """ Returns the state reached by taking 'action' in 'state'.
+        """
+        assert action in self.expand(state)[1]
+        return state + (action,)
+
+    def information_set(self, state):
+        """ Returns the identifier of the information set containing 'state',
+        from the perspective of the player to play in it.
+        """
+        node, _, visible = self.expand(state)
+        assert node.player in [1, 2]
+        return visible[node.player - 1]
+
+    def num_nodes(self):
+        """ Returns the number of nodes created so far.
+        """
+        return len(self.nodes)
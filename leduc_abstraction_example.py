@@ -0,0 +1,30 @@
+# coding: utf-8
+# Solving abstractions of Leduc Hold'em, and comparing how exploitable their
+# strategies are in the real game against how long they take to solve.
+
+from abstraction import benchmark_abstraction
+from leduc_poker import LeducPoker
+
+if __name__ == "__main__":
+    n_cards = 5
+    real_game = LeducPoker.create_game(n_cards)
+
+    # (hole card buckets, board card buckets, bets and raises per round). The
+    # first abstraction is the real game.
+    configs = [(n_cards, n_cards, 4), (n_cards, n_cards, 2), (3, n_cards, 4),
+               (3, 3, 2), (2, 2, 1)]
+    summary = []
+    for hole_buckets, board_buckets, max_raises in configs:
+        print("Hole buckets: {}, board buckets: {}, max raises: {}".format(
+            hole_buckets, board_buckets, max_raises))
+        abstraction = LeducPoker.create_abstraction(
+            n_cards, hole_buckets, board_buckets, max_raises)
+        results = benchmark_abstraction(abstraction, real_game, num_iters=1000,
+                                        eval_iters=250)
+        summary.append((hole_buckets, board_buckets, max_raises, results[-1]))
+
+    print("hole board raises | solve time | abstract expl. | real expl.")
+    for hole_buckets, board_buckets, max_raises, result in summary:
+        print("{:4d} {:5d} {:6d} | {:9.2f}s | {:14.4f} | {:10.4f}".format(
+            hole_buckets, board_buckets, max_raises, result["solve_time"],
+            result["abstract_exploitability"], result["real_exploitability"]))
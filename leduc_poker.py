@@ -1,7 +1,15 @@
 # coding: utf-8
 # This implements Leduc Hold'em.
 
+import functools
+
+import numpy as np
+
+from abstraction import Abstraction, bucket_cards
 from extensive_game import ExtensiveGame, ExtensiveGameNode
+from isomorphism import create_tree
+from lazy_game import LazyGame
+from public_tree_cfr import PublicTree, create_public_tree
 
 
 class LeducPoker(ExtensiveGame):
@@ -52,22 +60,46 @@ class LeducPoker(ExtensiveGame):
         return bets
 
     @staticmethod
-    def compute_utility(action_list):
+    @functools.lru_cache(maxsize=None)
+    def betting_line_bets(line):
+        """ The bets of players 1 and 2 after the betting line 'line': the
+        tuple of the actions after the hole cards, with the board card replaced
+        by 10. The bets of every line are computed once and then looked up.
+        The returned dictionary is shared, so it must not be modified.
+        """
+        return LeducPoker.compute_bets([-1, -1] + list(line))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def showdown_table(n_cards):
+        """ Returns the winner (1 or 2) of the showdown for every deal in the
+        game with 'n_cards' values, as an array of shape (n_cards, n_cards,
+        n_cards) indexed by the values (minus 10) of player 1's card, player
+        2's card and the board card. Built once for each number of values.
+        """
+        values = np.arange(n_cards)
+        h1 = values[:, None, None]
+        h2 = values[None, :, None]
+        board = values[None, None, :]
+        # A pair with the board wins, then the higher card. Player 2 wins ties.
+        p1_wins = (h1 == board) | ((h2 != board) & (h1 > h2))
+        return np.where(p1_wins, 1, 2)
+
+    @staticmethod
+    def compute_utility(action_list, n_cards=None):
         """ Given actions in 'action_list', including the cards dealt, compute
-        the utility for both players at a terminal node.
+        the utility for both players at a terminal node. The winner and the
+        bets are looked up in showdown_table and betting_line_bets. 'n_cards'
+        is the number of values in the deck; by default just enough for the
+        cards in 'action_list'.
         """
-        bets = Leduc.compute_bets(action_list)
-        hole_cards = {1: action_list[0], 2: action_list[1]}
-        board = [a for a in action_list[2:] if a >= 10][0]
-
-        if hole_cards[1] == board:
-            winner = 1
-        elif hole_cards[2] == board:
-            winner = 2
-        elif hole_cards[1] > hole_cards[2]:
-            winner = 1
-        else:
-            winner = 2
+        line = tuple([a if a < 10 else 10 for a in action_list[2:]])
+        board = action_list[2 + line.index(10)]
+        if n_cards is None:
+            n_cards = max(action_list[0], action_list[1], board) - 9
+        winner = int(LeducPoker.showdown_table(n_cards)[
+            action_list[0] - 10, action_list[1] - 10, board - 10])
+        bets = LeducPoker.betting_line_bets(line)
         loser = 1 if winner == 2 else 2
         # The winner wins the amount the loser bet, and the loser loses this
         # amount.
@@ -80,6 +112,23 @@ class LeducPoker(ExtensiveGame):
         excluding cards that have been dealt). Initially this should be called
         with 'action_list' being an empty list.
         """
+        node, children = LeducPoker.create_node(action_list, cards)
+        for action, child_cards in children.items():
+            node.children[action] = LeducPoker.create_leduc_tree(
+                action_list + [action], child_cards)
+        if len(action_list) == 0:
+            return ExtensiveGame(node)
+        return node
+
+    @staticmethod
+    def create_node(action_list, cards):
+        """ Creates the node of Leduc Hold'em reached by 'action_list', where
+        'cards' is the remainder of the deck (as in create_leduc_tree), without
+        creating its children. Returns the node and a dictionary from the
+        actions available in the node to the remainder of the deck after each
+        of them.
+        """
+        children = {}
         if len(action_list) == 0:
             # We are at the root of the tree, so we create a chance node for
             # player 1.
@@ -88,15 +137,14 @@ class LeducPoker(ExtensiveGame):
             root.hidden_from = [2]
             for card in cards:
                 # Create a game tree below this node.
-                if card not in root.children:
+                if card not in children:
                     remaining_cards = cards.copy()
                     remaining_cards.remove(card)
-                    root.children[card] = Leduc.create_leduc_tree(
-                        action_list + [card], remaining_cards)
+                    children[card] = remaining_cards
                     root.chance_probs[card] = 1.0 / float(len(cards))
                 else:
                     root.chance_probs[card] += 1.0 / float(len(cards))
-            return ExtensiveGame(root)
+            return root, children
         elif len(action_list) == 1:
             # We are at a chance node for player 2, so we create this chance
             # node, including its children.
@@ -105,15 +153,14 @@ class LeducPoker(ExtensiveGame):
             node.hidden_from = [1]
             for card in cards:
                 # Otherwise create a child node below
-                if card not in node.children:
+                if card not in children:
                     remaining_cards = cards.copy()
                     remaining_cards.remove(card)
-                    node.children[card] = Leduc.create_leduc_tree(
-                        action_list + [card], remaining_cards)
+                    children[card] = remaining_cards
                     node.chance_probs[card] = 1.0 / float(len(cards))
                 else:
                     node.chance_probs[card] += 1.0 / float(len(cards))
-            return node
+            return node, children
 
         # We have dealt both players a card. We first see which round we are in.
         betting_rounds = []
@@ -161,29 +208,28 @@ class LeducPoker(ExtensiveGame):
                     # in a player 2 node (player 2 goes first in round 2).
                     # They have the actions check and raise available.
                     node = ExtensiveGameNode(2)
-                    node.children[1] = Leduc.create_leduc_tree(
-                        action_list + [1], cards)
-                    node.children[2] = Leduc.create_leduc_tree(
-                        action_list + [2], cards)
-                    return node
+                    children[1] = cards
+                    children[2] = cards
+                    return node, children
                 else:
                     # We need to create the chance node for the board.
                     node = ExtensiveGameNode(0)
                     for card in cards:
-                        if card not in node.children:
+                        if card not in children:
                             remaining_cards = cards.copy()
                             remaining_cards.remove(card)
-                            node.children[card] = Leduc.create_leduc_tree(
-                                action_list + [card], remaining_cards)
+                            children[card] = remaining_cards
                             node.chance_probs[card] = 1.0 / float(len(cards))
                         else:
                             node.chance_probs[card] += 1.0 / float(len(cards))
-                    return node
+                    return node, children
             else:
                 # This is the end of the game. So compute utilities.
                 node = ExtensiveGameNode(-1)
-                node.utility = Leduc.compute_utility(action_list)
-                return node
+                # All but the 3 dealt cards are left in the deck.
+                node.utility = LeducPoker.compute_utility(
+                    action_list, (len(cards) + 3) // 2)
+                return node, children
         else:
             # The round is not terminal. We first find out whose turn it
             # is: even number of actions means player 1, else player 2.
@@ -213,11 +259,10 @@ class LeducPoker(ExtensiveGame):
             elif betting_round == [1, 2, 2, 2, 2]:
                 available_actions = [0, 1]
 
-            # Now create the child node for each available action:
+            # The betting actions leave the deck unchanged.
             for action in available_actions:
-                node.children[action] = Leduc.create_leduc_tree(
-                    action_list + [action], cards)
-            return node
+                children[action] = cards
+            return node, children
 
     @staticmethod
     def create_game(n_cards):
@@ -225,6 +270,145 @@ class LeducPoker(ExtensiveGame):
         cards in the deck, numbered 9 + 1 up to 9 + n_cards, each repeated
         twice.
         """
-        game_tree = Leduc.create_leduc_tree(
+        game_tree = LeducPoker.create_leduc_tree(
             [], 2 * [a for a in range(10, n_cards + 10)])
         return game_tree
+
+    @staticmethod
+    def card_value(action):
+        """ Returns the value of a card of the suited deck (see
+        create_suited_game), and any other action unchanged.
+        """
+        return action % 100 if action >= 10 else action
+
+    @staticmethod
+    def create_suited_node(action_list, cards):
+        """ The same as create_node, for the suited deck of create_suited_game,
+        where every card is a separate chance outcome.
+        """
+        node, children = LeducPoker.create_node(
+            [LeducPoker.card_value(a) for a in action_list],
+            [LeducPoker.card_value(c) for c in cards])
+        if node.player != 0:
+            return node, {a: cards for a in children}
+        node.chance_probs = {c: 1.0 / float(len(cards)) for c in cards}
+        return node, {c: [d for d in cards if d != c] for c in cards}
+
+    @staticmethod
+    def create_suited_game(n_cards):
+        """ Creates Leduc Poker with the two cards of every value told apart by
+        their suit: card 100 * s + v is the card of value v (as in create_game)
+        and suit s. The suits never matter, so create_game is the canonical game
+        of this one under card_value (see isomorphism), with the cards of the
+        same value merged. A strategy of create_game is mapped to this game by
+        isomorphism.expand_strategy(strategy, game, LeducPoker.card_value).
+        """
+        cards = [100 * s + v for s in range(2) for v in range(10, n_cards + 10)]
+        return ExtensiveGame(create_tree(LeducPoker.create_suited_node, [], cards))
+
+    @staticmethod
+    def hand_strengths(n_cards):
+        """ Returns a dictionary from the card values to the probability of
+        winning the showdown with the card against a random card of the
+        opponent and a random board card, in the game with 'n_cards' values
+        (see create_game).
+        """
+        values = list(range(10, n_cards + 10))
+        strengths = {}
+        for hole in values:
+            deck = 2 * values
+            deck.remove(hole)
+            wins = 0.0
+            deals = 0
+            for i, opponent in enumerate(deck):
+                for j, board in enumerate(deck):
+                    if i != j:
+                        utility = LeducPoker.compute_utility(
+                            [hole, opponent, 1, 1, board, 1, 1])
+                        wins += utility[1] > 0
+                        deals += 1
+            strengths[hole] = wins / deals
+        return strengths
+
+    @staticmethod
+    def raise_cap_menu(max_raises):
+        """ Returns an action menu (see abstraction.Abstraction) allowing at
+        most 'max_raises' bets and raises in each betting round. The real game
+        allows 4.
+        """
+        def action_menu(action_list, actions):
+            # The actions of the current round are those after the last card.
+            betting_round = []
+            for a in action_list[2:]:
+                betting_round = [] if a >= 10 else betting_round + [a]
+            if betting_round.count(2) >= max_raises:
+                return [a for a in actions if a != 2]
+            return actions
+        return action_menu
+
+    @staticmethod
+    def create_abstraction(n_cards, hole_buckets, board_buckets, max_raises=4):
+        """ Creates an abstraction.Abstraction of the game with 'n_cards'
+        values (see create_game), which groups the hole cards into
+        'hole_buckets' buckets by hand strength, the board cards into
+        'board_buckets' buckets by value, and allows at most 'max_raises' bets
+        and raises per round.
+        """
+        hole = bucket_cards(LeducPoker.hand_strengths(n_cards), hole_buckets)
+        board = bucket_cards(
+            {v: v for v in range(10, n_cards + 10)}, board_buckets)
+
+        def card_bucket(position, card):
+            return hole[card] if position < 2 else board[card]
+
+        return Abstraction(LeducPoker.create_node,
+                           2 * [a for a in range(10, n_cards + 10)],
+                           card_bucket, LeducPoker.raise_cap_menu(max_raises),
+                           lambda a: a >= 10)
+
+    @staticmethod
+    def create_lazy_game(n_cards):
+        """ Creates the Leduc Poker game with the given number of numbered
+        cards (see create_game) as a LazyGame, whose nodes are only created
+        when they are visited.
+        """
+        return LazyGame(LeducPoker.create_node,
+                        2 * [a for a in range(10, n_cards + 10)])
+
+    @staticmethod
+    def create_public_tree(n_cards):
+        """ Creates the public tree of Leduc Poker with the given number of
+        numbered cards (see create_game), for use with public_tree_cfr. The
+        private hands are the card values.
+        """
+        hands = np.arange(10, n_cards + 10)
+        n_deck = 2 * n_cards
+        h1, h2 = hands[:, None], hands[None, :]
+
+        # The probability of dealing each pair of hole cards.
+        deal_weights = (2.0 / n_deck) * (2.0 - (h1 == h2)) / (n_deck - 1.0)
+
+        def board_fn(history, card):
+            # Two of each card value are in the deck, minus the hole cards.
+            return (2.0 - (h1 == card) - (h2 == card)) / (n_deck - 2.0)
+
+        def bets_fn(history):
+            return LeducPoker.betting_line_bets(
+                tuple([a if a < 10 else 10 for a in history]))
+
+        showdown = LeducPoker.showdown_table(n_cards)
+
+        def showdown_fn(history):
+            # All showdowns of the betting line at once.
+            board = [a for a in history if a >= 10][0]
+            return showdown[:, :, board - 10] == 1
+
+        # The betting tree is the same below every deal. Deal two different
+        # values, so that all values remain possible on the board.
+        cards = 2 * [a for a in range(10, n_cards + 10)]
+        cards.remove(10)
+        cards.remove(11)
+        betting_root = LeducPoker.create_leduc_tree([10, 11], cards)
+        root = create_public_tree(betting_root, [], deal_weights, hands,
+                                  bets_fn, showdown_fn, board_fn)
+        return PublicTree(root, [int(h) for h in hands])
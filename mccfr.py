@@ -0,0 +1,318 @@
+# coding: utf-8
+# Monte Carlo CFR variants from Lanctot et al., "Monte Carlo Sampling for Regret
+# Minimization in Extensive Games" (2009): external sampling and outcome
+# sampling. Both work on the same CFRGame interface as cfr.cfr.
+
+import numpy as np
+
+import best_response
+import cfr
+from compiled_game import CompiledGame, compile_game
+from lazy_game import LazyGame
+from metrics import NULL_METRICS
+from traversal import Traversal
+
+
+def mccfr(game, num_iters=10000, info_iters=1000, algorithm="external",
+          epsilon=0.6, metrics=None):
+    """ Runs Monte Carlo CFR on a CFRGame and returns the average strategy in
+    the same format as cfr.cfr.
+    - algorithm: "external" for external sampling, which samples chance and
+      opponent actions and traverses all of the traverser's actions, or
+      "outcome" for outcome sampling, which samples a single terminal history
+      per traversal.
+    - epsilon: the exploration used by outcome sampling at the traverser's
+      nodes.
+    - metrics: a metrics.Metrics object collecting per iteration metrics, as
+      in cfr.cfr.
+    """
+    assert algorithm in ["external", "outcome"]
+    if metrics is None:
+        metrics = NULL_METRICS
+    traversal_game = metrics.counting_game(game)
+
+    # regrets and action_counts are dictionaries from information sets to
+    # dictionaries from actions to values, as in cfr.cfr.
+    regrets = dict()
+    action_counts = dict()
+
+    # The exploitability is only reported for games that can be compiled, i.e.
+    # not for a LazyGame, which is only generated where it is sampled.
+    compiled = None
+    if isinstance(game.game, CompiledGame):
+        compiled = game.game
+    elif not isinstance(game.game, LazyGame):
+        compiled = compile_game(game.game)
+
+    for t in range(num_iters):
+        metrics.start_iteration(t)
+        with metrics.timer("traversal"):
+            mccfr_iteration(traversal_game, regrets, action_counts, algorithm,
+                            epsilon)
+
+        if t % info_iters == 0:
+            print("t: {}".format(t))
+        if t % info_iters == 0 and compiled is not None:
+            with metrics.timer("exploitability"):
+                average_strategy = cfr.compute_average_strategy(action_counts)
+                complete_strategy = compiled.complete_strategy_uniformly(
+                    average_strategy, verbose=False)
+                exploitability = best_response.compute_exploitability(compiled, complete_strategy)
+            print("Avg strategy exploitability: {:.4f}".format(exploitability))
+        metrics.end_iteration(t)
+
+    average_strategy = cfr.compute_average_strategy(action_counts)
+    if compiled is not None:
+        complete_strategy = compiled.complete_strategy_uniformly(average_strategy)
+        exploitability = best_response.compute_exploitability(compiled, complete_strategy)
+        print("Avg strategy exploitability: {:.4f}".format(exploitability))
+    return average_strategy
+
+
+def mccfr_iteration(game, regrets, action_counts, algorithm="external",
+                    epsilon=0.6):
+    """ Runs one iteration of mccfr, i.e. one sampled traversal for each
+    player, updating the 'regrets' and 'action_counts' dictionaries.
+    """
+    for i in [1, 2]:
+        if algorithm == "external":
+            external_sampling_recursive(
+                game, game.game.root, i, regrets, action_counts)
+        else:
+            outcome_sampling_recursive(
+                game, game.game.root, i, 1.0, 1.0, 1.0, regrets,
+                action_counts, epsilon)
+
+
+def current_strategy(regrets, information_set, available_actions):
+    """ Returns the regret matching strategy in the information set, creating
+    its regrets if it has not been seen before.
+    """
+    if information_set not in regrets:
+        regrets[information_set] = {a: 0.0 for a in available_actions}
+    return cfr.compute_regret_matching(regrets[information_set])
+
+
+def sample_action(probs):
+    """ Samples an action from a dictionary from actions to probabilities.
+    """
+    actions = list(probs.keys())
+    return actions[np.random.choice(len(actions), p=list(probs.values()))]
+
+
+def external_sampling_recursive(game, node, i, regrets, action_counts):
+    """ One external sampling traversal for player i. Chance and the opponent
+    play a single sampled action, while every action of player i is explored.
+    The sampled counterfactual values are unbiased without any importance
+    weights, so the regrets are updated with the plain value differences.
+    Returns the sampled value of the node for player i. The walk (an
+    ExternalSamplingWalk) keeps an explicit stack, so the depth of the tree
+    is not limited by the recursion limit.
+    """
+    return ExternalSamplingWalk(game, i, regrets, action_counts).walk(node)
+
+
+def outcome_sampling_recursive(game, node, i, pi_i, pi_o, s, regrets,
+                               action_counts, epsilon):
+    """ One outcome sampling traversal for player i, following a single history
+    to a terminal node. Player i samples from an epsilon-on-policy mixture of
+    their strategy and the uniform distribution; chance and the opponent sample
+    on policy.
+    - pi_i, pi_o: the reach probabilities of player i and the opponent.
+    - s: the probability of having sampled the history so far.
+    Returns the terminal utility divided by the probability of sampling the
+    whole history, and the probability of the rest of the history (from this
+    node to the terminal) under the current strategy. The history is walked
+    by an OutcomeSamplingWalk.
+    """
+    return OutcomeSamplingWalk(game, i, regrets, action_counts,
+                               epsilon).walk_from(node, pi_i, pi_o, s)
+
+
+class ExternalSamplingWalk(Traversal):
+    """ The walk of external_sampling_recursive (see traversal.Traversal). The
+    buffers hold, for the node of player i expanded at each depth, the node,
+    its information set, available actions and strategy. Chance and opponent
+    nodes are passed straight through: the sampled child is expanded in their
+    place, at the same depth.
+    """
+
+    def __init__(self, game, i, regrets, action_counts):
+        Traversal.__init__(self, {"nodes": None, "information_sets": None,
+                                  "actions": None, "strategies": None})
+        self.game = game
+        self.i = i
+        self.regrets = regrets
+        self.action_counts = action_counts
+        buffers = self.buffers
+        self.nodes = buffers.nodes
+        self.information_sets = buffers.information_sets
+        self.actions = buffers.actions
+        self.strategies = buffers.strategies
+
+    def enter(self, depth, k):
+        game = self.game
+        regrets = self.regrets
+        if depth == 0:
+            node = self.root
+        else:
+            node = game.child(self.nodes[depth - 1], self.actions[depth - 1][k])
+        while True:
+            if game.is_terminal(node):
+                self.leaf_value = game.payoffs(node)[self.i]
+                return 0
+            player = game.which_player(node)
+            if player == 0:
+                node = game.child(node, game.sample_chance_action(node))
+                continue
+
+            information_set = game.information_set(node)
+            available_actions = game.available_actions(node)
+            strategy = current_strategy(regrets, information_set, available_actions)
+            if player == self.i:
+                break
+
+            # Update the average strategy of the opponent ("simple
+            # averaging"), then follow one of their actions.
+            action_counts = self.action_counts
+            if information_set not in action_counts:
+                action_counts[information_set] = {a: 0.0 for a in available_actions}
+            for a in available_actions:
+                action_counts[information_set][a] += strategy[a]
+            node = game.child(node, sample_action(strategy))
+
+        self.nodes[depth] = node
+        self.information_sets[depth] = information_set
+        self.actions[depth] = available_actions
+        self.strategies[depth] = strategy
+        return len(available_actions)
+
+    def leave(self, depth, values):
+        information_set = self.information_sets[depth]
+        available_actions = self.actions[depth]
+        strategy = self.strategies[depth]
+        value = sum(strategy[a] * v for a, v in zip(available_actions, values))
+        for a, v in zip(available_actions, values):
+            self.regrets[information_set][a] += v - value
+        return value
+
+
+class OutcomeSamplingWalk(Traversal):
+    """ The walk of outcome_sampling_recursive, which only has a single child
+    to walk at every decision node: the sampled action. The buffers hold, for
+    the decision node expanded at each depth, the node, its player,
+    information set, available actions, strategy, sampled action and sampling
+    probabilities, and pi_i, pi_o and s. Chance nodes are passed straight
+    through.
+    """
+
+    def __init__(self, game, i, regrets, action_counts, epsilon):
+        Traversal.__init__(self, {"nodes": None, "players": 0,
+                                  "information_sets": None, "actions": None,
+                                  "strategies": None, "sampled": None,
+                                  "sampling": None, "pi_i": 0.0, "pi_o": 0.0,
+                                  "s": 0.0})
+        self.game = game
+        self.i = i
+        self.regrets = regrets
+        self.action_counts = action_counts
+        self.epsilon = epsilon
+        buffers = self.buffers
+        self.nodes = buffers.nodes
+        self.players = buffers.players
+        self.information_sets = buffers.information_sets
+        self.actions = buffers.actions
+        self.strategies = buffers.strategies
+        self.sampled = buffers.sampled
+        self.sampling = buffers.sampling
+        self.pi_i = buffers.pi_i
+        self.pi_o = buffers.pi_o
+        self.s = buffers.s
+
+    def walk_from(self, node, pi_i, pi_o, s):
+        """ Walks the history from 'node', with the reach and sampling
+        probabilities pi_i, pi_o and s, and returns its value.
+        """
+        self.pi_i[0] = pi_i
+        self.pi_o[0] = pi_o
+        self.s[0] = s
+        return self.walk(node)
+
+    def enter(self, depth, k):
+        game = self.game
+        if depth == 0:
+            node = self.root
+        else:
+            d = depth - 1
+            a = self.sampled[d]
+            strategy = self.strategies[d]
+            if self.players[d] == self.i:
+                self.pi_i[depth] = self.pi_i[d] * strategy[a]
+                self.pi_o[depth] = self.pi_o[d]
+                self.s[depth] = self.s[d] * self.sampling[d][a]
+            else:
+                self.pi_i[depth] = self.pi_i[d]
+                self.pi_o[depth] = self.pi_o[d] * strategy[a]
+                self.s[depth] = self.s[d] * strategy[a]
+            node = game.child(self.nodes[d], a)
+
+        while True:
+            if game.is_terminal(node):
+                self.leaf_value = game.payoffs(node)[self.i] / self.s[depth], 1.0
+                return 0
+            player = game.which_player(node)
+            if player != 0:
+                break
+            # The chance probability cancels between the reach and the
+            # sampling probability, so it is left out of both.
+            node = game.child(node, game.sample_chance_action(node))
+
+        information_set = game.information_set(node)
+        available_actions = game.available_actions(node)
+        strategy = current_strategy(self.regrets, information_set, available_actions)
+        if player == self.i:
+            uniform = 1.0 / len(available_actions)
+            sampling = {a: self.epsilon * uniform + (1.0 - self.epsilon) * strategy[a]
+                        for a in available_actions}
+            a = sample_action(sampling)
+        else:
+            sampling = None
+            a = sample_action(strategy)
+
+        self.nodes[depth] = node
+        self.players[depth] = player
+        self.information_sets[depth] = information_set
+        self.actions[depth] = available_actions
+        self.strategies[depth] = strategy
+        self.sampled[depth] = a
+        self.sampling[depth] = sampling
+        return 1
+
+    def leave(self, depth, values):
+        utility, tail = values[0]
+        information_set = self.information_sets[depth]
+        available_actions = self.actions[depth]
+        strategy = self.strategies[depth]
+        a = self.sampled[depth]
+        pi_o = self.pi_o[depth]
+        if self.players[depth] == self.i:
+            # The sampled counterfactual regret of every action.
+            regrets = self.regrets
+            w = utility * pi_o
+            for b in available_actions:
+                if b == a:
+                    regrets[information_set][b] += w * tail * (1.0 - strategy[a])
+                else:
+                    regrets[information_set][b] -= w * tail * strategy[a]
+        else:
+            # Update the average strategy of the opponent, weighted by their
+            # reach over the sampling probability ("stochastically weighted
+            # averaging").
+            action_counts = self.action_counts
+            s = self.s[depth]
+            if information_set not in action_counts:
+                action_counts[information_set] = {b: 0.0 for b in available_actions}
+            for b in available_actions:
+                action_counts[information_set][b] += pi_o / s * strategy[b]
+
+        return utility, tail * strategy[a]
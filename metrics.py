@@ -0,0 +1,248 @@
+# coding: utf-8
+# Instrumentation for the solver loops. A Metrics object collects, for every
+# iteration, the time spent in each phase (the traversals, averaging, the
+# convergence check, the exploitability checks, ...), the number of nodes
+# visited and information sets touched by the traversals, and the change in
+# the number of allocated memory blocks. Each iteration's record is passed to
+# callbacks and can be written as a line of JSON to a log file.
+#
+# Instrumentation is off unless a Metrics object is passed to the solver. The
+# solvers then use NULL_METRICS, whose methods do nothing, and the traversals
+# run on the game itself rather than on a counting wrapper, so the hot paths
+# are unchanged.
+#
+# Usage:
+#   metrics = Metrics(log_path="run.jsonl", callbacks=[print])
+#   cfr.cfr(game, metrics=metrics)
+#   print(metrics.summary())
+
+import json
+import sys
+import time
+import tracemalloc
+
+
+class _NullTimer:
+    """ A context manager that does nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullMetrics:
+    """ The metrics used when instrumentation is off. Every method does
+    nothing.
+    """
+
+    enabled = False
+
+    def start_iteration(self, t):
+        pass
+
+    def end_iteration(self, t):
+        pass
+
+    def timer(self, name):
+        return _NULL_TIMER
+
+    def count(self, name, n=1):
+        pass
+
+    def counting_game(self, game):
+        return game
+
+    def counting_compiled_game(self, game):
+        return game
+
+
+NULL_METRICS = NullMetrics()
+
+
+class _Timer:
+    """ Adds the time spent inside a with block to a phase of a Metrics
+    object.
+    """
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        timers = self.metrics.timers
+        timers[self.name] = (timers.get(self.name, 0.0) +
+                             time.perf_counter() - self.start)
+        return False
+
+
+class Metrics(NullMetrics):
+    """ Collects per iteration metrics from a solver.
+    - callbacks: functions called with the record of every iteration, a
+      dictionary with keys "iteration", "time" (the wall time of the whole
+      iteration), "timers" (a dictionary from phases to seconds), "counters"
+      (a dictionary from counter names to counts) and "allocated_blocks" (the
+      change in sys.getallocatedblocks over the iteration).
+    - log_path: if given, every record is appended to this file as a line of
+      JSON.
+    - count_nodes: whether to count the nodes visited ("node_visits") and the
+      information sets touched ("info_set_touches") by the traversals. This
+      runs them on a wrapper of the game, which slows them down.
+    - trace_allocations: whether to also record the peak memory allocated
+      during each iteration ("peak_traced_bytes"), using tracemalloc. This is
+      much slower.
+    """
+
+    enabled = True
+
+    def __init__(self, callbacks=(), log_path=None, count_nodes=True,
+                 trace_allocations=False):
+        self.callbacks = list(callbacks)
+        self.log_path = log_path
+        self.count_nodes = count_nodes
+        self.trace_allocations = trace_allocations
+
+        # The timers and counters of the current iteration, and the totals
+        # over all iterations so far.
+        self.timers = {}
+        self.counters = {}
+        self.total_timers = {}
+        self.total_counters = {}
+        self.num_iterations = 0
+
+        self.log_file = None
+        if log_path is not None:
+            self.log_file = open(log_path, "a")
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start_iteration(self, t):
+        self.timers = {}
+        self.counters = {}
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+        self.iteration_start = time.perf_counter()
+        self.blocks_start = sys.getallocatedblocks()
+
+    def end_iteration(self, t):
+        """ Finishes the record of iteration t and hands it to the callbacks
+        and the log file. Returns the record.
+        """
+        record = {"iteration": t,
+                  "time": time.perf_counter() - self.iteration_start,
+                  "timers": self.timers, "counters": self.counters,
+                  "allocated_blocks": sys.getallocatedblocks() - self.blocks_start}
+        if self.trace_allocations:
+            record["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+
+        for name, seconds in self.timers.items():
+            self.total_timers[name] = self.total_timers.get(name, 0.0) + seconds
+        for name, n in self.counters.items():
+            self.total_counters[name] = self.total_counters.get(name, 0) + n
+        self.num_iterations += 1
+
+        for callback in self.callbacks:
+            callback(record)
+        if self.log_file is not None:
+            self.log_file.write(json.dumps(record) + "\n")
+            self.log_file.flush()
+        return record
+
+    def timer(self, name):
+        """ Returns a context manager adding the time spent inside it to the
+        phase 'name' of the current iteration.
+        """
+        return _Timer(self, name)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def counting_game(self, game):
+        """ Returns the CFRGame 'game', wrapped to count node visits and
+        information set touches if count_nodes is set.
+        """
+        if not self.count_nodes:
+            return game
+        return CountingGame(game, self)
+
+    def counting_compiled_game(self, game):
+        """ The same as counting_game for a CompiledGame, as traversed by
+        cfr.cfr_recursive_compiled.
+        """
+        if not self.count_nodes:
+            return game
+        return CountingCompiledGame(game, self)
+
+    def summary(self):
+        """ Returns the totals over all iterations so far: the number of
+        iterations, the total seconds per phase and the total counts.
+        """
+        return {"iterations": self.num_iterations,
+                "timers": dict(self.total_timers),
+                "counters": dict(self.total_counters)}
+
+    def close(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+
+class CountingGame:
+    """ Wraps a CFRGame and counts the calls the traversals make to it. Every
+    node a traversal visits is checked with is_terminal once, and every
+    decision node asks for its information set once.
+    """
+
+    def __init__(self, game, metrics):
+        self.cfr_game = game
+        self.metrics = metrics
+        self.game = game.game
+
+    def is_terminal(self, node):
+        self.metrics.count("node_visits")
+        return self.cfr_game.is_terminal(node)
+
+    def information_set(self, node):
+        self.metrics.count("info_set_touches")
+        return self.cfr_game.information_set(node)
+
+    def __getattr__(self, name):
+        return getattr(self.cfr_game, name)
+
+
+class _CountingArray:
+    """ Wraps an array and counts the elements read from it by indexing.
+    """
+
+    def __init__(self, array, metrics, name):
+        self.array = array
+        self.metrics = metrics
+        self.name = name
+
+    def __getitem__(self, index):
+        self.metrics.count(self.name)
+        return self.array[index]
+
+
+class CountingCompiledGame:
+    """ Wraps a CompiledGame for cfr.cfr_recursive_compiled, which reads the
+    player of every node it visits once, and the information set of every
+    decision node it visits once.
+    """
+
+    def __init__(self, game, metrics):
+        self.compiled_game = game
+        self.player = _CountingArray(game.player, metrics, "node_visits")
+        self.info_set = _CountingArray(game.info_set, metrics, "info_set_touches")
+
+    def __getattr__(self, name):
+        return getattr(self.compiled_game, name)
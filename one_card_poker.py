@@ -1,7 +1,13 @@
 # coding: utf-8
 # This implements One Card Poker.
 
+import functools
+
+import numpy as np
+
 from extensive_game import ExtensiveGame, ExtensiveGameNode
+from lazy_game import LazyGame
+from public_tree_cfr import PublicTree, create_public_tree
 
 
 class OneCardPoker(ExtensiveGame):
@@ -15,17 +21,51 @@ class OneCardPoker(ExtensiveGame):
     """
 
     @staticmethod
-    def compute_utility(betting_actions, hole_cards):
-        """ Given actions in 'betting_actions' and hole_cards in 'hole_cards',
-        compute the utility for both players at a terminal node.
+    def compute_bets(betting_actions):
+        """ Given actions in 'betting_actions', compute the bets by players 1
+        and 2.
         """
         # The bets are 1 (for the ante), then the sum of the even actions (for
         # player 1) and the odd actions (for player 2).
         bets = {1: 1.0, 2: 1.0}
         for i, action in enumerate(betting_actions):
             bets[(i % 2) + 1] += action
-        winner = 1 if hole_cards[1] > hole_cards[2] else 2
-        loser = 2 if hole_cards[1] > hole_cards[2] else 1
+        return bets
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def betting_line_bets(line):
+        """ compute_bets for the tuple of betting actions 'line', computed once
+        for every line and then looked up. The returned dictionary is shared,
+        so it must not be modified.
+        """
+        return OneCardPoker.compute_bets(line)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def showdown_table(n_cards):
+        """ Returns the winner (1 or 2) of the showdown for every deal in the
+        game with 'n_cards' cards, as an array of shape (n_cards + 1,
+        n_cards + 1) indexed by the cards of players 1 and 2. Built once for
+        each number of cards.
+        """
+        cards = np.arange(n_cards + 1)
+        return np.where(cards[:, None] > cards[None, :], 1, 2)
+
+    @staticmethod
+    def compute_utility(betting_actions, hole_cards, n_cards=None):
+        """ Given actions in 'betting_actions' and hole_cards in 'hole_cards',
+        compute the utility for both players at a terminal node. The winner
+        and the bets are looked up in showdown_table and betting_line_bets.
+        'n_cards' is the number of cards in the deck; by default just enough
+        for the hole cards.
+        """
+        if n_cards is None:
+            n_cards = max(hole_cards[1], hole_cards[2])
+        winner = int(OneCardPoker.showdown_table(n_cards)[
+            hole_cards[1], hole_cards[2]])
+        bets = OneCardPoker.betting_line_bets(tuple(betting_actions))
+        loser = 1 if winner == 2 else 2
         # The winner wins the amount the loser bet, and the loser loses this
         # amount.
         return {winner: bets[loser], loser: -bets[loser]}
@@ -36,6 +76,21 @@ class OneCardPoker(ExtensiveGame):
         cards, defining the deck. The numbers should be unique. Initially this
         should be called with 'action_list' being an empty list.
         """
+        node, children = OneCardPoker.create_node(action_list, cards)
+        for action in children:
+            node.children[action] = OneCardPoker.create_one_card_tree(
+                action_list + [action], cards)
+        if len(action_list) == 0:
+            return ExtensiveGame(node)
+        return node
+
+    @staticmethod
+    def create_node(action_list, cards):
+        """ Creates the node of one card Poker reached by 'action_list', where
+        'cards' is the deck (as in create_one_card_tree), without creating its
+        children. Returns the node and a dictionary from the actions available
+        in the node to the deck after each of them, which is always 'cards'.
+        """
         if len(action_list) == 0:
             # We are at the root of the tree, so we create a chance node for
             # player 1.
@@ -43,14 +98,10 @@ class OneCardPoker(ExtensiveGame):
             # This node is hidden from player 2
             root.hidden_from = [2]
             for card in cards:
-                # Create a game tree below this node.
-                root.children[card] = OneCardPoker.create_one_card_tree(
-                    [card], cards)
                 root.chance_probs[card] = 1.0 / len(cards)
-            return ExtensiveGame(root)
+            return root, {card: cards for card in cards}
         elif len(action_list) == 1:
-            # We are at a chance node for player 2, so we create this chance
-            # node, including its children.
+            # We are at a chance node for player 2.
             node = ExtensiveGameNode(0)
             # This node is hidden from player 1
             node.hidden_from = [1]
@@ -58,27 +109,14 @@ class OneCardPoker(ExtensiveGame):
                 # Player 2 can't be dealt the card that player 1 was dealt.
                 if card == action_list[0]:
                     continue
-                # Otherwise create a child node below
-                node.children[card] = OneCardPoker.create_one_card_tree(
-                    action_list + [card], cards)
                 node.chance_probs[card] = 1.0 / (len(cards) - 1.0)
-            return node
+            return node, {card: cards for card in node.chance_probs}
         elif len(action_list) == 2:
             # It's player 1's first turn.
-            node = ExtensiveGameNode(1)
-            node.children[0] = OneCardPoker.create_one_card_tree(
-                action_list + [0], cards)
-            node.children[1] = OneCardPoker.create_one_card_tree(
-                action_list + [1], cards)
-            return node
+            return ExtensiveGameNode(1), {0: cards, 1: cards}
         elif len(action_list) == 3:
             # It's player 2's first turn.
-            node = ExtensiveGameNode(2)
-            node.children[0] = OneCardPoker.create_one_card_tree(
-                action_list + [0], cards)
-            node.children[1] = OneCardPoker.create_one_card_tree(
-                action_list + [1], cards)
-            return node
+            return ExtensiveGameNode(2), {0: cards, 1: cards}
         elif len(action_list) == 4:
             # It's player 1's second turn (if the node isn't terminal).
             if action_list[3] == 0 or action_list[2] == action_list[3]:
@@ -87,24 +125,19 @@ class OneCardPoker(ExtensiveGame):
                 node = ExtensiveGameNode(-1)
                 hole_cards = {1: action_list[0], 2: action_list[1]}
                 node.utility = OneCardPoker.compute_utility(
-                    action_list[2:], hole_cards)
-                return node
+                    action_list[2:], hole_cards, len(cards))
+                return node, {}
             else:
                 # The actions were [0,1], and so player 1 gets another chance to
                 # call or fold.
-                node = ExtensiveGameNode(1)
-                node.children[0] = OneCardPoker.create_one_card_tree(
-                    action_list + [0], cards)
-                node.children[1] = OneCardPoker.create_one_card_tree(
-                    action_list + [1], cards)
-                return node
+                return ExtensiveGameNode(1), {0: cards, 1: cards}
         elif len(action_list) == 5:
             # It's player 2's second turn (but this actually must be terminal).
             node = ExtensiveGameNode(-1)
             hole_cards = {1: action_list[0], 2: action_list[1]}
             node.utility = OneCardPoker.compute_utility(
-                action_list[2:], hole_cards)
-            return node
+                action_list[2:], hole_cards, len(cards))
+            return node, {}
         assert False
 
     @staticmethod
@@ -114,3 +147,37 @@ class OneCardPoker(ExtensiveGame):
         """
         game_tree = OneCardPoker.create_one_card_tree([], range(1, n_cards + 1))
         return game_tree
+
+    @staticmethod
+    def create_lazy_game(n_cards):
+        """ Creates the One Card Poker game with the given number of cards (see
+        create_game) as a LazyGame, whose nodes are only created when they are
+        visited.
+        """
+        return LazyGame(OneCardPoker.create_node, range(1, n_cards + 1))
+
+    @staticmethod
+    def create_public_tree(n_cards):
+        """ Creates the public tree of One Card Poker with the given number of
+        cards (see create_game), for use with public_tree_cfr. The private
+        hands are the card values.
+        """
+        hands = np.arange(1, n_cards + 1)
+        h1, h2 = hands[:, None], hands[None, :]
+
+        # Each player is dealt a different card uniformly at random.
+        deal_weights = (h1 != h2) / (n_cards * (n_cards - 1.0))
+
+        showdown = OneCardPoker.showdown_table(n_cards)[1:, 1:] == 1
+
+        def showdown_fn(history):
+            return showdown
+
+        # The betting tree is the same below every deal.
+        betting_root = OneCardPoker.create_one_card_tree(
+            [1, 2], range(1, n_cards + 1))
+        root = create_public_tree(
+            betting_root, [], deal_weights, hands,
+            lambda history: OneCardPoker.betting_line_bets(tuple(history)),
+            showdown_fn, None)
+        return PublicTree(root, [int(h) for h in hands])
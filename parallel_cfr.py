@@ -0,0 +1,160 @@
+# coding: utf-8
+# Chance sampled CFR spread over a pool of worker processes. The chance
+# outcomes at the root of the game (e.g. the hole cards of both players) are
+# split between the workers. Every worker traverses the subtrees of its outcomes
+# against the current strategy, and writes its regret and action count
+# increments into shared memory, where the main process merges them.
+
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import best_response
+from cfr import cfr_recursive_compiled
+from compiled_game import CompiledGame, compile_game
+from solver_state import SolverState
+
+
+# The state of a worker process, set up once by _init_worker.
+_worker = {}
+
+
+def _attach(name, shape):
+    """ Returns a shared memory block and a float array view on top of it.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+
+
+def _init_worker(game, strategy_name, deltas_name, num_workers, assignments,
+                 streams):
+    _worker["game"] = game
+    _worker["assignments"] = assignments
+    _worker["streams"] = streams
+    shape = game.action_mask.shape
+    _worker["strategy_block"], _worker["strategy"] = _attach(strategy_name, shape)
+    _worker["deltas_block"], _worker["deltas"] = _attach(
+        deltas_name, (num_workers, 2) + shape)
+
+
+def _run_worker(args):
+    """ Runs iterations 'start' up to start + num_iters over the root outcomes
+    assigned to worker 'w', against the strategy in shared memory, and leaves the
+    summed regret and action count increments in the worker's slot of the
+    shared deltas.
+    """
+    w, start, num_iters, seed = args
+    game = _worker["game"]
+    deltas = _worker["deltas"][w]
+    deltas[:] = 0.0
+    state = SolverState.from_arrays(game.action_mask, deltas[0], deltas[1],
+                                    _worker["strategy"])
+
+    np.random.seed(seed)
+    streams = _worker["streams"]
+    for t in range(start, start + num_iters):
+        for k, node in enumerate(_worker["assignments"][w]):
+            # The deal of the later chance nodes, if they are dealt from deal
+            # streams.
+            deal = streams[w][k].deal(t) if streams is not None else None
+            # Weighting both reach probabilities by the chance probability of
+            # the deal weights the regrets (through pi_{-i}) and the action
+            # counts (through pi_i) by it.
+            p = game.chance_reach[node]
+            for i in [1, 2]:
+                cfr_recursive_compiled(game, node, i, p, p, state, deal=deal)
+
+
+def root_deals(game):
+    """ Returns the nodes reached from the root of a CompiledGame by chance
+    alone, i.e. the first non chance node below every sequence of chance
+    outcomes at the top of the tree.
+    """
+    deals = []
+    node_stack = [game.root]
+    while len(node_stack) > 0:
+        node = node_stack.pop()
+        if game.player[node] == 0:
+            node_stack.extend(game.children(node))
+        else:
+            deals.append(node)
+    return sorted(deals)
+
+
+def parallel_cfr(game, num_iters=10000, num_workers=None, batch_size=1,
+                 info_iters=1000, seed=0, deals=None):
+    """ Runs CFR with the deals at the root (see root_deals) handled in parallel
+    by 'num_workers' processes (by default one per CPU). Every deal is visited
+    in every iteration, and the later chance nodes are sampled as in cfr.cfr.
+    The increments of all workers are merged and the strategy recomputed every
+    'batch_size' iterations. 'game' is a CFRGame wrapping an ExtensiveGame or
+    a CompiledGame. Returns the average strategy in the same format as
+    cfr.cfr.
+
+    With 'deals' (a deal_stream.DealStream of the compiled game), the later
+    chance nodes below every root deal are dealt from a stream of its own,
+    spawned from 'deals', instead of being sampled as they are visited. The
+    deals are then the same whatever the number of workers.
+    """
+    compiled = game.game if isinstance(game.game, CompiledGame) else compile_game(game.game)
+    assert compiled.player[compiled.root] == 0, "The root must be a chance node."
+
+    nodes = root_deals(compiled)
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    num_workers = min(num_workers, len(nodes))
+    assignments = [list(a) for a in np.array_split(nodes, num_workers)]
+    streams = None
+    if deals is not None:
+        # One stream per root deal, split between the workers like the deals.
+        node_streams = dict(zip(nodes, deals.spawn(nodes)))
+        streams = [[node_streams[node] for node in a] for a in assignments]
+
+    state = SolverState.from_game(compiled)
+    shape = state.regrets.shape
+    nbytes = state.regrets.nbytes
+    strategy_block = shared_memory.SharedMemory(create=True, size=nbytes)
+    deltas_block = shared_memory.SharedMemory(
+        create=True, size=2 * num_workers * nbytes)
+    try:
+        strategy = np.ndarray(shape, dtype=np.float64, buffer=strategy_block.buf)
+        deltas = np.ndarray((num_workers, 2) + shape, dtype=np.float64,
+                            buffer=deltas_block.buf)
+        strategy[:] = state.strategy
+
+        with multiprocessing.Pool(
+                num_workers, initializer=_init_worker,
+                initargs=(compiled, strategy_block.name, deltas_block.name,
+                          num_workers, assignments, streams)) as pool:
+            t = 0
+            while t < num_iters:
+                batch = min(batch_size, num_iters - t)
+                pool.map(_run_worker,
+                         [(w, t, batch, [seed, w, t]) for w in range(num_workers)])
+
+                # Merge the increments and recompute the strategy.
+                state.regrets += deltas[:, 0].sum(axis=0)
+                state.action_counts += deltas[:, 1].sum(axis=0)
+                strategy[:] = state.update_strategy()
+
+                # Print progress whenever the batch reaches a multiple of
+                # info_iters.
+                if t == 0 or (t + batch) // info_iters > t // info_iters:
+                    print("t: {}".format(t))
+                    exploitability = best_response.compute_exploitability(
+                        compiled, state.average_strategy()[0])
+                    print("Avg strategy exploitability: {:.4f}".format(exploitability))
+                t += batch
+        # The views must be released before the shared memory is closed.
+        del strategy, deltas
+    finally:
+        strategy_block.close()
+        strategy_block.unlink()
+        deltas_block.close()
+        deltas_block.unlink()
+
+    exploitability = best_response.compute_exploitability(
+        compiled, state.average_strategy()[0])
+    print("Avg strategy exploitability: {:.4f}".format(exploitability))
+    return state.average_strategy_dict(compiled)
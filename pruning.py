@@ -0,0 +1,84 @@
+# coding: utf-8
+# Pruning for chance sampled CFR (see cfr.cfr_recursive_pruned). Two kinds of
+# subtree are skipped by the traversal of player i:
+# - Partial pruning: below a node neither player reaches (both their reach
+#   probabilities are zero), the regret updates of player i are weighted by
+#   the opponent's reach and the action counts by player i's reach, so none
+#   of them change, and the value is weighted by zero above. The subtree is
+#   not walked, which gives the same result as walking it.
+# - Regret-based pruning (Brown and Sandholm, "Regret-Based Pruning in
+#   Extensive-Form Games", 2015): an action of player i with negative regret
+#   R is played with probability zero. Its regret grows by at most the
+#   utility range of player i per iteration, so it stays negative, and the
+#   action unplayed, for at least floor(-R / range) more iterations, which
+#   the traversal skips it for. The skipped iterations' regret updates are
+#   caught up when the action is next walked (see RegretPruning).
+
+
+class RegretPruning:
+    """ The state of regret-based pruning over a CFR solve. Actions are
+    identified by (information set, action) keys, which may be the
+    identifiers and actions of an ExtensiveGame or the information set ids
+    and action positions of a CompiledGame.
+    - utility_range: a dictionary from players 1 and 2 to the difference
+      between their largest and smallest terminal utility (see
+      utility_range).
+    - regret_based: whether to skip actions by their regret. Otherwise, only
+      partial pruning is done.
+    """
+
+    def __init__(self, utility_range, regret_based=True):
+        self.utility_range = utility_range
+        self.regret_based = regret_based
+        # The last iteration each skipped action is skipped in.
+        self.skip_until = {}
+        # The opponent reach probabilities summed over the visits in which
+        # each skipped action was skipped, since it was last walked.
+        self.skipped_reach = {}
+        # The number of actions and of subtrees skipped so far.
+        self.num_skipped_actions = 0
+        self.num_pruned_subtrees = 0
+
+    def is_skipped(self, key, t):
+        """ Whether the action 'key' is skipped in iteration t.
+        """
+        return self.skip_until.get(key, -1) >= t
+
+    def record_skip(self, key, pi_minus_i):
+        """ Records that the action 'key' was skipped in a visit with opponent
+        reach 'pi_minus_i'.
+        """
+        self.skipped_reach[key] = self.skipped_reach.get(key, 0.0) + pi_minus_i
+        self.num_skipped_actions += 1
+
+    def catch_up_reach(self, key, pi_minus_i):
+        """ Returns the opponent reach to weight the value of the action 'key'
+        by when it is walked again: 'pi_minus_i' for the current visit, plus
+        that of the visits it was skipped in. The value of the action in the
+        current visit stands in for its values in the skipped ones, whose
+        share of the regret update (the value of the information set) was
+        already applied when they were skipped.
+        """
+        if key in self.skipped_reach:
+            return pi_minus_i + self.skipped_reach.pop(key)
+        return pi_minus_i
+
+    def update(self, key, regret, player, t):
+        """ Starts skipping the action 'key' of 'player' after iteration t if
+        its 'regret' is negative enough to guarantee it won't be played.
+        """
+        if not self.regret_based or regret >= 0.0:
+            return
+        utility_range = self.utility_range[player]
+        num_iters = int(-regret // utility_range) if utility_range > 0 else 0
+        if num_iters > 0:
+            self.skip_until[key] = t + num_iters
+
+
+def utility_range(game):
+    """ Returns a dictionary from players 1 and 2 to the range of their
+    terminal utilities in the CompiledGame 'game'.
+    """
+    utility = game.utility[game.player == -1]
+    return {1: float(utility[:, 0].max() - utility[:, 0].min()),
+            2: float(utility[:, 1].max() - utility[:, 1].min())}
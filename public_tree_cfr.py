@@ -0,0 +1,331 @@
+# coding: utf-8
+# CFR on the public tree of a card game. Instead of one betting subtree per
+# private card deal, the public betting tree is walked once per iteration and
+# each player carries a range: a vector with one entry per private hand.
+
+import numpy as np
+
+from solver_state import normalize_counts
+from traversal import Traversal
+
+
+class PublicTreeNode:
+    """ A node of a public tree, i.e. a node of the game tree with the private
+    cards left out.
+    """
+
+    def __init__(self, player, history):
+        # Which player is to play in the node, as in ExtensiveGameNode: -1 for
+        # terminal, 0 for chance (board cards), 1 or 2 for the players.
+        self.player = player
+
+        # The public actions (betting actions and board cards) leading to this
+        # node.
+        self.history = history
+
+        # A dictionary from public actions to PublicTreeNode objects.
+        self.children = {}
+
+        # For player nodes, the regrets and action counts of every hand, as
+        # arrays of shape (num_hands, num_actions).
+        self.regrets = None
+        self.action_counts = None
+
+        # For terminal nodes, the bets of each player and the matrices 'win'
+        # and 'lose' of shape (num_hands, num_hands), holding the probability
+        # of each pair of hands (player 1's hand on the rows) and of the chance
+        # outcomes leading to the node, if player 1 wins or loses respectively.
+        self.bets = None
+        self.win = None
+        self.lose = None
+
+
+class PublicTree:
+    """ A public tree together with the private hands of the players.
+    - root: the root PublicTreeNode.
+    - hands: the list of private hands (the same for both players).
+    """
+
+    def __init__(self, root, hands):
+        self.root = root
+        self.hands = hands
+
+    def nodes(self):
+        """ Returns a list of all nodes in the tree.
+        """
+        nodes = []
+        node_stack = [self.root]
+        while len(node_stack) > 0:
+            node = node_stack.pop()
+            nodes.append(node)
+            node_stack.extend(node.children.values())
+        return nodes
+
+    def info_set_id(self, node, hand):
+        """ Returns the identifier of the information set of the player to play
+        in 'node' holding 'hand', in the same format as
+        ExtensiveGame.info_set_ids: player 1's card is hidden from player 2 and
+        vice versa, and everything after the deal is visible to both.
+        """
+        if node.player == 1:
+            return (hand, -1) + node.history
+        return (-1, hand) + node.history
+
+    def strategy_dict(self, probs_fn):
+        """ Builds a strategy dictionary keyed by information set identifiers,
+        where probs_fn(node) returns an array of shape (num_hands,
+        num_actions) of probabilities.
+        """
+        strategy = {}
+        for node in self.nodes():
+            if node.player not in [1, 2]:
+                continue
+            probs = probs_fn(node)
+            for h, hand in enumerate(self.hands):
+                strategy[self.info_set_id(node, hand)] = {
+                    a: float(p) for a, p in zip(node.children, probs[h])}
+        return strategy
+
+
+def create_public_tree(node, history, weights, hands, bets_fn, showdown_fn,
+                       board_fn):
+    """ Converts the betting subtree below a single private card deal (an
+    ExtensiveGameNode) into a public tree. Any deal may be used, as long as all
+    board cards are still possible below it.
+    - history: the public actions leading to 'node'.
+    - weights: array of shape (num_hands, num_hands) with the probability of
+      each pair of private hands and of the board cards in 'history'.
+    - bets_fn(history): returns the bets of both players at a terminal node.
+    - showdown_fn(history): returns a boolean array of shape (num_hands,
+      num_hands) which is True where player 1 wins at a terminal node.
+    - board_fn(history, card): returns an array of shape (num_hands, num_hands)
+      with the probability of dealing board card 'card', given each pair of
+      hands and the earlier board cards in history.
+    """
+    public_node = PublicTreeNode(node.player, tuple(history))
+    if node.player == -1:
+        public_node.bets = bets_fn(history)
+        wins = showdown_fn(history)
+        public_node.win = np.where(wins, weights, 0.0)
+        public_node.lose = np.where(wins, 0.0, weights)
+        return public_node
+
+    for action, child in node.children.items():
+        child_weights = weights
+        if node.player == 0:
+            child_weights = weights * board_fn(history, action)
+        public_node.children[action] = create_public_tree(
+            child, history + [action], child_weights, hands, bets_fn,
+            showdown_fn, board_fn)
+
+    if node.player in [1, 2]:
+        shape = (len(hands), len(node.children))
+        public_node.regrets = np.zeros(shape)
+        public_node.action_counts = np.zeros(shape)
+    return public_node
+
+
+def terminal_values(node, r1, r2):
+    """ Returns the counterfactual values of every hand of player 1 and of
+    player 2 at a terminal node, given the ranges r1 and r2. The loser of the
+    showdown pays their bet to the winner.
+    """
+    v1 = node.bets[2] * node.win.dot(r2) - node.bets[1] * node.lose.dot(r2)
+    v2 = node.bets[1] * node.lose.T.dot(r1) - node.bets[2] * node.win.T.dot(r1)
+    return v1, v2
+
+
+def cfr_pass(node, r1, r2):
+    """ One CFR iteration on the subtree below 'node', updating the regrets and
+    action counts of both players against the current strategy. r1 and r2 are
+    the probabilities with which player 1 and player 2 play to reach the node
+    with each hand. Returns the counterfactual values of each hand of player 1
+    and of player 2. The subtree is walked by a CFRPassWalk.
+    """
+    return CFRPassWalk().walk_from(node, r1, r2)
+
+
+class CFRPassWalk(Traversal):
+    """ The walk of cfr_pass (see traversal.Traversal). The buffers hold, for
+    the node expanded at each depth, the node, its children, its current
+    strategy (for player nodes) and the ranges r1 and r2 reaching it.
+    """
+
+    def __init__(self):
+        Traversal.__init__(self, {"nodes": None, "children": None,
+                                  "strategies": None, "r1": None, "r2": None})
+        buffers = self.buffers
+        self.nodes = buffers.nodes
+        self.children = buffers.children
+        self.strategies = buffers.strategies
+        self.r1 = buffers.r1
+        self.r2 = buffers.r2
+
+    def walk_from(self, node, r1, r2):
+        """ Walks the subtree below 'node', reached with the ranges r1 and r2,
+        and returns its values.
+        """
+        self.r1[0] = r1
+        self.r2[0] = r2
+        return self.walk(node)
+
+    def enter(self, depth, k):
+        if depth == 0:
+            node = self.root
+        else:
+            # The player to play at the parent multiplies their range by the
+            # strategy of each hand when taking the k-th action.
+            d = depth - 1
+            node = self.children[d][k]
+            player = self.nodes[d].player
+            self.r1[depth] = self.r1[d] * self.strategies[d][:, k] if player == 1 else self.r1[d]
+            self.r2[depth] = self.r2[d] * self.strategies[d][:, k] if player == 2 else self.r2[d]
+        if node.player == -1:
+            self.leaf_value = terminal_values(node, self.r1[depth], self.r2[depth])
+            return 0
+
+        if node.player != 0:
+            self.strategies[depth] = current_strategy(node)
+        self.nodes[depth] = node
+        self.children[depth] = list(node.children.values())
+        return len(self.children[depth])
+
+    def leave(self, depth, values):
+        node = self.nodes[depth]
+        n = len(self.children[depth])
+        if node.player == 0:
+            # Board cards are public, so the values are summed over the
+            # children. The chance probabilities are already in the terminal
+            # weights.
+            v1, v2 = 0.0, 0.0
+            for k in range(n):
+                child_v1, child_v2 = values[k]
+                v1 = v1 + child_v1
+                v2 = v2 + child_v2
+            return v1, v2
+
+        # Player p's value is the expectation over their actions, and the
+        # opponent's value is the sum over the children.
+        p = node.player
+        strategy = self.strategies[depth]
+        action_values = np.stack([values[k][p - 1] for k in range(n)], axis=1)
+        value = (strategy * action_values).sum(axis=1)
+        other_value = sum(values[k][2 - p] for k in range(n))
+        node.regrets += action_values - value[:, None]
+        node.action_counts += (self.r1[depth] if p == 1 else self.r2[depth])[:, None] * strategy
+        if p == 1:
+            return value, other_value
+        return other_value, value
+
+
+def current_strategy(node):
+    """ The regret matching strategy of every hand in a player node. All
+    actions are available to every hand, so no action mask is needed.
+    """
+    positive = np.maximum(node.regrets, 0.0)
+    denominator = positive.sum(axis=1, keepdims=True)
+    strategy = np.full(positive.shape, 1.0 / positive.shape[1])
+    np.divide(positive, denominator, out=strategy, where=denominator > 0.0)
+    return strategy
+
+
+def average_strategy(node):
+    """ The average strategy of every hand in a player node.
+    """
+    average, _ = normalize_counts(
+        node.action_counts, np.ones(node.action_counts.shape, dtype=bool))
+    return average
+
+
+def best_response_values(node, r, i, strategy_fn):
+    """ Returns the value of each hand of player i when best responding to the
+    strategy given by strategy_fn, and 'r' is the opponent's range. The
+    subtree is walked by a BestResponseWalk.
+    """
+    return BestResponseWalk(i, strategy_fn).walk_from(node, r)
+
+
+class BestResponseWalk(Traversal):
+    """ The walk of best_response_values. The buffers hold, for the node
+    expanded at each depth, the node, its children, the strategy of the
+    opponent (for their nodes) and the opponent's range reaching it.
+    """
+
+    def __init__(self, i, strategy_fn):
+        Traversal.__init__(self, {"nodes": None, "children": None,
+                                  "strategies": None, "r": None})
+        self.i = i
+        self.strategy_fn = strategy_fn
+        buffers = self.buffers
+        self.nodes = buffers.nodes
+        self.children = buffers.children
+        self.strategies = buffers.strategies
+        self.r = buffers.r
+
+    def walk_from(self, node, r):
+        """ Walks the subtree below 'node', reached with the opponent's range
+        r, and returns its values.
+        """
+        self.r[0] = r
+        return self.walk(node)
+
+    def enter(self, depth, k):
+        i = self.i
+        if depth == 0:
+            node = self.root
+        else:
+            d = depth - 1
+            node = self.children[d][k]
+            if self.nodes[d].player in [0, i]:
+                self.r[depth] = self.r[d]
+            else:
+                self.r[depth] = self.r[d] * self.strategies[d][:, k]
+        r = self.r[depth]
+        if node.player == -1:
+            if i == 1:
+                self.leaf_value = terminal_values(node, np.zeros(len(r)), r)[0]
+            else:
+                self.leaf_value = terminal_values(node, r, np.zeros(len(r)))[1]
+            return 0
+
+        if node.player not in [0, i]:
+            self.strategies[depth] = self.strategy_fn(node)
+        self.nodes[depth] = node
+        self.children[depth] = list(node.children.values())
+        return len(self.children[depth])
+
+    def leave(self, depth, values):
+        n = len(self.children[depth])
+        if self.nodes[depth].player == self.i:
+            # Player i picks the best action separately for each hand.
+            return np.max([values[k] for k in range(n)], axis=0)
+        return sum(values[k] for k in range(n))
+
+
+def compute_exploitability(tree, strategy_fn=average_strategy):
+    """ The same as best_response.compute_exploitability, computed on the
+    public tree: the sum of both players' best response values.
+    """
+    r = np.ones(len(tree.hands))
+    return (best_response_values(tree.root, r, 1, strategy_fn).sum() +
+            best_response_values(tree.root, r, 2, strategy_fn).sum())
+
+
+def public_tree_cfr(tree, num_iters=10000, info_iters=1000):
+    """ Runs full-width CFR on a PublicTree, updating both players once per
+    iteration. Prints the exploitability of the average strategy every
+    'info_iters' iterations, and returns the average strategy in the same
+    format as cfr.cfr.
+    """
+    r = np.ones(len(tree.hands))
+    for t in range(num_iters):
+        cfr_pass(tree.root, r, r)
+
+        if t % info_iters == 0:
+            print("t: {}".format(t))
+            exploitability = compute_exploitability(tree)
+            print("Avg strategy exploitability: {:.4f}".format(exploitability))
+
+    exploitability = compute_exploitability(tree)
+    print("Avg strategy exploitability: {:.4f}".format(exploitability))
+    return tree.strategy_dict(average_strategy)
@@ -0,0 +1,113 @@
+# coding: utf-8
+# Dense array storage for the tables kept by CFR solvers. Information sets are
+# identified by the integer ids of a CompiledGame, and actions by their position
+# within the information set.
+
+import numpy as np
+
+
+def regret_matching(regrets, action_mask):
+    """ Vectorized version of cfr.compute_regret_matching over all information
+    sets at once. Each row plays actions proportionally to positive regret, or
+    uniformly over the available actions if no regret is positive.
+    - regrets: array of shape (num_info_sets, max_actions).
+    - action_mask: boolean array of the same shape, True for available actions.
+    """
+    positive = np.where(action_mask, np.maximum(regrets, 0.0), 0.0)
+    denominator = positive.sum(axis=1, keepdims=True)
+    uniform = action_mask / action_mask.sum(axis=1, keepdims=True)
+    return np.where(denominator > 0.0,
+                    positive / np.where(denominator > 0.0, denominator, 1.0),
+                    uniform)
+
+
+def normalize_counts(action_counts, action_mask):
+    """ Vectorized version of cfr.compute_average_strategy. Returns the average
+    strategy array, and a boolean array which is True for the information sets
+    with a positive total count (the others are filled uniformly).
+    """
+    totals = action_counts.sum(axis=1, keepdims=True)
+    visited = totals[:, 0] > 0
+    uniform = action_mask / action_mask.sum(axis=1, keepdims=True)
+    average = np.where(totals > 0, action_counts / np.where(totals > 0, totals, 1.0),
+                       uniform)
+    return average, visited
+
+
+class SolverState:
+    """ Holds the regrets, action counts and current strategy of a CFR solve as
+    arrays of shape (num_info_sets, max_actions).
+    """
+
+    def __init__(self, action_mask):
+        self.action_mask = action_mask
+        self.regrets = np.zeros(action_mask.shape)
+        self.action_counts = np.zeros(action_mask.shape)
+        self.strategy = regret_matching(self.regrets, action_mask)
+
+    @staticmethod
+    def from_game(game):
+        """ Creates an empty solver state for the given CompiledGame.
+        """
+        return SolverState(game.action_mask)
+
+    @staticmethod
+    def from_arrays(action_mask, regrets, action_counts, strategy):
+        """ Creates a solver state on top of existing arrays (e.g. views of
+        shared memory), without copying them.
+        """
+        state = SolverState.__new__(SolverState)
+        state.action_mask = action_mask
+        state.regrets = regrets
+        state.action_counts = action_counts
+        state.strategy = strategy
+        return state
+
+    def update_strategy(self):
+        """ Recomputes the current strategy from the regrets by regret matching.
+        """
+        self.strategy = regret_matching(self.regrets, self.action_mask)
+        return self.strategy
+
+    def discount(self, t, alpha, beta, gamma):
+        """ Applies the Discounted CFR discounts after iteration t (counting
+        from 1): positive regrets are multiplied by t^alpha / (t^alpha + 1),
+        negative regrets by t^beta / (t^beta + 1) and action counts by
+        (t / (t + 1))^gamma.
+        """
+        positive = t ** alpha / (t ** alpha + 1.0)
+        negative = t ** beta / (t ** beta + 1.0)
+        self.regrets *= np.where(self.regrets > 0, positive, negative)
+        self.action_counts *= (t / (t + 1.0)) ** gamma
+
+    def average_strategy(self):
+        """ Returns the average strategy array and the visited mask, as in
+        normalize_counts.
+        """
+        return normalize_counts(self.action_counts, self.action_mask)
+
+    def average_strategy_dict(self, game):
+        """ Returns the average strategy in the same format as
+        cfr.compute_average_strategy: a dictionary from information set
+        identifiers (only those with positive action counts) to dictionaries
+        from actions to probabilities.
+        """
+        average, visited = self.average_strategy()
+        return game.array_to_strategy(average, np.flatnonzero(visited))
+
+    def strategy_dict(self, game):
+        """ Returns the current strategy as a dictionary over all information
+        sets.
+        """
+        return game.array_to_strategy(self.strategy)
+
+
+def compare_strategy_arrays(s1, s2, action_mask, rows):
+    """ Vectorized version of cfr.compare_strategies, restricted to the
+    information sets in 'rows' (e.g. those visited in both strategies).
+    """
+    if len(rows) == 0:
+        return np.nan
+    diff = np.where(action_mask[rows], s1[rows] - s2[rows], 0.0)
+    num_actions = action_mask[rows].sum(axis=1)
+    return np.mean(np.sqrt((diff ** 2).sum(axis=1) / num_actions))
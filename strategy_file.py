@@ -0,0 +1,146 @@
+# coding: utf-8
+# A binary file format for solved strategies that can be memory mapped and
+# queried one information set at a time, without loading the whole strategy.
+#
+# Layout (all integers little endian unless stated otherwise):
+# - header: see HEADER below.
+# - keys: one fixed size record per information set, sorted. A record holds
+#   the number of entries in the information set identifier followed by the
+#   entries, each stored as a big endian uint32 of (value + 2^31) and padded
+#   with zeros, so that comparing records as bytes compares the identifiers.
+# - actions: int32 array of shape (num_info_sets, max_actions), padded with -1.
+# - probs: float64 array of shape (num_info_sets, max_actions).
+
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"CFRSTRAT"
+VERSION = 1
+
+# magic, version, num_info_sets, max_actions, key_size, keys_offset,
+# actions_offset, probs_offset.
+HEADER = struct.Struct("<8sIQIIQQQ")
+
+
+def encode_key(info_set, key_len):
+    """ Encodes an information set identifier (a tuple of integers) into a
+    fixed size record of 'key_len' entries.
+    """
+    if len(info_set) > key_len:
+        raise KeyError(info_set)
+    values = [len(info_set)] + [v + 2 ** 31 for v in info_set]
+    values += [0] * (key_len - len(info_set))
+    return struct.pack(">{}I".format(len(values)), *values)
+
+
+def _aligned(offset):
+    return (offset + 7) // 8 * 8
+
+
+def write_strategy_file(path, strategy):
+    """ Writes 'strategy', a dictionary from information set identifiers
+    (tuples of integers) to dictionaries from actions to probabilities, as
+    returned by cfr.cfr, to 'path'. The file is written next to 'path' and
+    then renamed over it, so readers never see a partial file.
+    """
+    keys = list(strategy.keys())
+    key_len = max([len(k) for k in keys] + [0])
+    max_actions = max([len(v) for v in strategy.values()] + [1])
+    key_size = 4 * (key_len + 1)
+
+    records = sorted((encode_key(k, key_len), k) for k in keys)
+    actions = np.full((len(keys), max_actions), -1, dtype=np.int32)
+    probs = np.zeros((len(keys), max_actions))
+    for idx, (_, k) in enumerate(records):
+        actions[idx, :len(strategy[k])] = list(strategy[k].keys())
+        probs[idx, :len(strategy[k])] = list(strategy[k].values())
+
+    keys_offset = _aligned(HEADER.size)
+    actions_offset = _aligned(keys_offset + key_size * len(keys))
+    probs_offset = _aligned(actions_offset + actions.nbytes)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(keys), max_actions, key_size,
+                            keys_offset, actions_offset, probs_offset))
+        f.seek(keys_offset)
+        f.write(b"".join(r for r, _ in records))
+        f.seek(actions_offset)
+        f.write(actions.tobytes())
+        f.seek(probs_offset)
+        f.write(probs.tobytes())
+    os.replace(tmp_path, path)
+
+
+class StrategyFile:
+    """ A read only, memory mapped view of a file written by
+    write_strategy_file. It behaves like the strategy dictionary it was written
+    from, but only the pages touched by a lookup are read from disk, and all
+    processes opening the same file share one copy in the page cache.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.num_info_sets, self.max_actions, key_size,
+         keys_offset, actions_offset, probs_offset) = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a strategy file.".format(path))
+        self.key_len = key_size // 4 - 1
+
+        # Views on top of the memory map; nothing is copied.
+        self.keys = np.frombuffer(self.mmap, dtype="S{}".format(key_size),
+                                  count=self.num_info_sets, offset=keys_offset)
+        shape = (self.num_info_sets, self.max_actions)
+        self.actions = np.frombuffer(
+            self.mmap, dtype=np.int32, count=shape[0] * shape[1],
+            offset=actions_offset).reshape(shape)
+        self.probs = np.frombuffer(
+            self.mmap, dtype=np.float64, count=shape[0] * shape[1],
+            offset=probs_offset).reshape(shape)
+
+    def index(self, info_set):
+        """ Returns the row of the information set, by binary search over the
+        sorted key records. Raises KeyError if it is not in the file.
+        """
+        record = encode_key(info_set, self.key_len)
+        idx = np.searchsorted(self.keys, record)
+        if idx == self.num_info_sets or self.keys[idx] != record.rstrip(b"\0"):
+            raise KeyError(info_set)
+        return idx
+
+    def __getitem__(self, info_set):
+        idx = self.index(info_set)
+        return {int(a): float(p) for a, p in
+                zip(self.actions[idx], self.probs[idx]) if a >= 0}
+
+    def get(self, info_set, default=None):
+        try:
+            return self[info_set]
+        except KeyError:
+            return default
+
+    def __contains__(self, info_set):
+        try:
+            self.index(info_set)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return self.num_info_sets
+
+    def close(self):
+        # Drop the views before closing the memory map they point into.
+        self.keys = self.actions = self.probs = None
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,7 @@
+# coding: utf-8
+# The modules live at the top of the repository, which isn't a package.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
@@ -0,0 +1,52 @@
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+import best_response
+from example_strategy import dirichlet_random_strategy
+from leduc_poker import LeducPoker
+
+
+@pytest.fixture(scope="module")
+def game():
+    return LeducPoker.create_game(3)
+
+
+@pytest.fixture(scope="module")
+def strategy(game):
+    np.random.seed(0)
+    strategy = dirichlet_random_strategy(game, 1)
+    strategy.update(dirichlet_random_strategy(game, 2))
+    return strategy
+
+
+def br_strategy_value(compiled, strategy, br_strategy, i):
+    """ The exact value to player i of playing 'br_strategy' against
+    'strategy'.
+    """
+    profile = dict(strategy)
+    profile.update(br_strategy)
+    if i == 1:
+        return compiled.exact_expected_value(profile, strategy)
+    return -compiled.exact_expected_value(strategy, profile)
+
+
+@pytest.mark.parametrize("i", [1, 2])
+def test_compiled_best_response_matches_br(game, strategy, i):
+    compiled = game.compile()
+    expected = best_response.br(game, [game.root], {game.root: 1.0}, strategy,
+                                {}, i)
+    value, br_strategy = best_response.compute_best_response(compiled, strategy, i)
+    assert value == pytest.approx(expected)
+    # The strategy returned must achieve the value, not just the value be
+    # right.
+    assert br_strategy_value(compiled, strategy, br_strategy, i) == pytest.approx(expected)
+
+
+def test_best_responses_of_both_players(game, strategy):
+    compiled = game.compile()
+    best_responses = best_response.compute_best_responses(compiled, strategy)
+    for i in [1, 2]:
+        value, br_strategy = best_responses[i]
+        assert br_strategy_value(compiled, strategy, br_strategy, i) == pytest.approx(value)
@@ -0,0 +1,33 @@
+# coding: utf-8
+
+import pytest
+
+from deal_stream import ChanceTree, DealStream
+from leduc_poker import LeducPoker
+from parallel_cfr import root_deals
+
+
+@pytest.fixture(scope="module")
+def chance_tree():
+    return ChanceTree(LeducPoker.create_game(3).compile())
+
+
+def test_deals_do_not_depend_on_batch_size(chance_tree):
+    stream = DealStream(chance_tree, seed=1, batch_size=64)
+    other = DealStream(chance_tree, seed=1, batch_size=7)
+    # Read the deals out of order in one of them.
+    for t in [500, 3, 64, 63, 200]:
+        assert stream.deal(t).offsets == other.deal(t).offsets
+
+
+def test_spawn_is_reproducible(chance_tree):
+    stream = DealStream(chance_tree, seed=1, batch_size=16)
+    starts = [None] + root_deals(chance_tree.game)[:3]
+    first = stream.spawn(starts)
+    second = stream.spawn(starts)
+    for a, b in zip(first, second):
+        assert [a.deal(t).outcomes for t in range(40)] == \
+            [b.deal(t).outcomes for t in range(40)]
+    # The spawned streams are independent of each other.
+    assert [first[0].deal(t).outcomes for t in range(40)] != \
+        [stream.deal(t).outcomes for t in range(40)]
@@ -0,0 +1,29 @@
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+import cfr
+from cfr_game import CFRGame
+from leduc_poker import LeducPoker
+from pruning import RegretPruning
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_skipped_reach_is_not_caught_up_in_cut_subtrees(monkeypatch, compiled):
+    # An action cut by partial pruning is not walked, so the reach skipped
+    # before must wait for its next walk.
+    catch_up_reach = RegretPruning.catch_up_reach
+    lost = []
+
+    def checked_catch_up_reach(self, key, pi_minus_i):
+        if self.skipped_reach.get(key, 0.0) != 0.0 and pi_minus_i == 0.0:
+            lost.append(key)
+        return catch_up_reach(self, key, pi_minus_i)
+
+    monkeypatch.setattr(RegretPruning, "catch_up_reach", checked_catch_up_reach)
+    game = LeducPoker.create_game(3)
+    np.random.seed(0)
+    cfr.cfr(CFRGame(game.compile() if compiled else game), num_iters=200,
+            info_iters=1000, pruning="regret")
+    assert lost == []
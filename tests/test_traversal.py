@@ -0,0 +1,68 @@
+# coding: utf-8
+
+import contextlib
+import io
+import sys
+
+import pytest
+
+import best_response
+import cfr
+from cfr_game import CFRGame
+from extensive_game import ExtensiveGame, ExtensiveGameNode
+from solver_state import SolverState
+
+
+def chain_game(length):
+    """ A game in which the players take turns to either stop, which ends the
+    game, or go on, for at most 'length' turns.
+    """
+    root = ExtensiveGameNode(1)
+    node = root
+    for d in range(length):
+        stop = ExtensiveGameNode(-1)
+        stop.utility = {1: float(d % 3 - 1), 2: -float(d % 3 - 1)}
+        if d < length - 1:
+            go_on = ExtensiveGameNode(1 + (d + 1) % 2)
+        else:
+            go_on = ExtensiveGameNode(-1)
+            go_on.utility = {1: 0.5, 2: -0.5}
+        node.children = {0: stop, 1: go_on}
+        node = go_on
+    return ExtensiveGame(root)
+
+
+@pytest.fixture(scope="module")
+def game():
+    # Deeper than the recursion limit.
+    return chain_game(sys.getrecursionlimit() + 100)
+
+
+@pytest.mark.parametrize("i", [1, 2])
+def test_cfr_walks_deeper_than_recursion_limit(game, i):
+    value = cfr.cfr_recursive(CFRGame(game), game.root, i, 0, 1.0, 1.0, {},
+                              {}, {}, {})
+    compiled = game.compile()
+    state = SolverState.from_game(compiled)
+    assert cfr.cfr_recursive_compiled(
+        compiled, compiled.root, i, 1.0, 1.0, state) == pytest.approx(value)
+    values = cfr.cfr_recursive_compiled_simultaneous(
+        compiled, compiled.root, 1.0, 1.0, SolverState.from_game(compiled))
+    assert values[i - 1] == pytest.approx(value)
+
+
+@pytest.mark.parametrize("i", [1, 2])
+def test_br_walks_deeper_than_recursion_limit(game, i):
+    strategy = game.complete_strategy_uniformly({}, verbose=False)
+    value = best_response.br(game, [game.root], {game.root: 1.0}, strategy,
+                             {}, i)
+    expected, _ = best_response.compute_best_response(game.compile(), strategy, i)
+    assert value == pytest.approx(expected)
+
+
+def test_print_tree_walks_deeper_than_recursion_limit(game):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        game.print_tree(only_leaves=True)
+    # One line per stop, and one for going on to the end.
+    assert len(output.getvalue().splitlines()) == sys.getrecursionlimit() + 101
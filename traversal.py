@@ -0,0 +1,119 @@
+# coding: utf-8
+# Depth first traversals of game trees with an explicit stack instead of
+# Python recursion, so that walks over deep trees (such as a generic hold'em
+# game with many rounds) are not limited by the recursion limit, and no
+# Python frame with its arguments is set up for every node.
+#
+# The state of a walk at each depth (the node being expanded, its strategy,
+# reach probabilities, the values of its children, ...) is kept in
+# DepthBuffers: one list per field, indexed by depth, allocated once and
+# reused by every node at that depth. Traversal drives the walk over them;
+# the solvers (cfr, best_response, mccfr, public_tree_cfr) and
+# ExtensiveGame.print_tree_recursive subclass it.
+
+
+class DepthBuffers:
+    """ Per depth scratch lists. 'fields' is a dictionary from field names to
+    the value new entries are filled with, and 'rows' a dictionary from field
+    names to functions making a new entry (e.g. a list or an array to be
+    reused as a row of values at that depth). Each field becomes an attribute
+    holding a list with one entry per depth. The lists are grown in place, so
+    references to them stay valid.
+    """
+
+    def __init__(self, fields, rows=None, capacity=64):
+        self.fields = fields
+        self.rows = rows if rows is not None else {}
+        self.capacity = capacity
+        for name, fill in fields.items():
+            setattr(self, name, [fill] * capacity)
+        for name, make in self.rows.items():
+            setattr(self, name, [make() for _ in range(capacity)])
+
+    def ensure(self, depth):
+        """ Makes sure the lists have an entry for 'depth', doubling them if
+        needed.
+        """
+        if depth < self.capacity:
+            return
+        capacity = self.capacity
+        while capacity <= depth:
+            capacity *= 2
+        for name, fill in self.fields.items():
+            getattr(self, name).extend([fill] * (capacity - self.capacity))
+        for name, make in self.rows.items():
+            getattr(self, name).extend(
+                [make() for _ in range(capacity - self.capacity)])
+        self.capacity = capacity
+
+
+class Traversal:
+    """ A depth first walk of a tree, with its stack kept in self.buffers (a
+    DepthBuffers with the per depth 'fields' and 'rows' of the subclass, see
+    DepthBuffers). The root, self.root, is at depth 0. Subclasses define:
+    - enter(depth, k): expands the k-th child of the node expanded one depth
+      up (the root if depth is 0, k being 0), keeping what its children need
+      in the buffers at 'depth', and returns the number of its children. A
+      leaf returns 0, after setting self.leaf_value to its value.
+    - leave(depth, values): returns the value of the node expanded at
+      'depth', where 'values' holds the values of its children in its first
+      entries.
+
+    The values of the children of the node at each depth are written in a
+    row made by 'value_row' (an empty list by default, or e.g. an array of
+    the largest number of children), reused by every node at that depth.
+    """
+
+    def __init__(self, fields, rows=None, value_row=list, capacity=16):
+        rows = dict(rows if rows is not None else {}, child_values=value_row)
+        self.buffers = DepthBuffers(
+            dict(fields, num_children=0, child_index=0), rows, capacity)
+        self.root = None
+        self.leaf_value = None
+
+    def walk(self, root):
+        """ Walks the tree below 'root' and returns its value.
+        """
+        self.root = root
+        enter = self.enter
+        leave = self.leave
+        buffers = self.buffers
+        num_children = buffers.num_children
+        child_index = buffers.child_index
+        child_values = buffers.child_values
+        capacity = buffers.capacity
+
+        depth = 0
+        k = 0
+        while True:
+            n = enter(depth, k)
+            if n > 0:
+                if depth + 1 == capacity:
+                    buffers.ensure(depth + 1)
+                    capacity = buffers.capacity
+                num_children[depth] = n
+                child_index[depth] = k
+                depth += 1
+                k = 0
+                continue
+
+            # A leaf, the k-th child of its parent. Hand its value up, and
+            # move on to the next child of the deepest node with children left
+            # to walk.
+            value = self.leaf_value
+            while depth > 0:
+                depth -= 1
+                values = child_values[depth]
+                try:
+                    values[k] = value
+                except IndexError:
+                    # The row is a list shorter than k + 1.
+                    values.append(value)
+                k += 1
+                if k < num_children[depth]:
+                    depth += 1
+                    break
+                value = leave(depth, values)
+                k = child_index[depth]
+            else:
+                return value
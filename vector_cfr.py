@@ -0,0 +1,133 @@
+# coding: utf-8
+# Full-width (non-sampling) CFR on a CompiledGame. Each iteration pushes reach
+# probabilities down the tree and expected values up the tree one depth level
+# at a time with NumPy, instead of recursing node by node.
+
+import numpy as np
+
+import best_response
+import cfr
+from compiled_game import CompiledGame, compile_game
+from solver_state import SolverState, compare_strategy_arrays
+
+
+class VectorCFR:
+    """ Precomputes the index arrays needed to run full-width CFR iterations on
+    a CompiledGame, and holds the SolverState being updated.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.state = SolverState.from_game(game)
+
+        # Every edge below a player node, identified by the child node id,
+        # along with its parent and its position in the flattened (info set,
+        # action) tables.
+        nodes = np.arange(1, game.num_nodes)
+        parents = game.parent[nodes]
+        player_edges = game.player[parents] > 0
+        self.edge_nodes = nodes[player_edges]
+        self.edge_parents = parents[player_edges]
+        self.edge_player = game.player[self.edge_parents]
+        self.edge_flat = (game.info_set[self.edge_parents] * game.max_actions +
+                          self.edge_nodes - game.child_start[self.edge_parents])
+        self.table_size = game.num_info_sets * game.max_actions
+
+    def iteration(self, cfr_plus=False, weight=1.0, players=(1, 2)):
+        """ Runs one full-width CFR iteration for the given players against the
+        current strategy, then updates the strategy by regret matching. The
+        action counts are incremented with the given weight.
+        """
+        game = self.game
+        state = self.state
+        edge = game.edge_probs(state.strategy)
+
+        # pi_1 and pi_2 hold each player's own contribution to the reach
+        # probability of each node.
+        pi = {p: game.player_reach(edge, p) for p in [1, 2]}
+        values = game.subtree_values(edge)
+
+        for p in players:
+            mask = self.edge_player == p
+            nodes = self.edge_nodes[mask]
+            parents = self.edge_parents[mask]
+            flat = self.edge_flat[mask]
+
+            # Counterfactual regret of each action, weighted by the reach of the
+            # opponent and chance.
+            pi_minus_p = game.chance_reach[parents] * pi[3 - p][parents]
+            regrets = pi_minus_p * (values[nodes, p - 1] - values[parents, p - 1])
+            state.regrets += np.bincount(
+                flat, regrets, self.table_size).reshape(state.regrets.shape)
+            if cfr_plus:
+                np.maximum(state.regrets, 0.0, out=state.regrets)
+
+            # The action counts, weighted by the reach of the player and chance
+            # (matching the expected update of chance sampled CFR).
+            counts = weight * game.chance_reach[parents] * pi[p][parents] * edge[nodes]
+            state.action_counts += np.bincount(
+                flat, counts, self.table_size).reshape(state.action_counts.shape)
+
+        state.update_strategy()
+
+    def step(self, t, variant="cfr", alpha=1.5, beta=0.0, gamma=2.0):
+        """ Runs iteration t (counting from 0) of vector_cfr with the given
+        variant.
+        """
+        weight = cfr.averaging_weight(t, variant)
+        if variant == "cfr":
+            self.iteration(weight=weight)
+        else:
+            # Alternating updates: player 2 plays against the updated strategy
+            # of player 1.
+            for i in [1, 2]:
+                self.iteration(variant == "cfr+", weight, players=(i,))
+        if variant == "dcfr":
+            self.state.discount(t + 1, alpha, beta, gamma)
+
+
+def vector_cfr(game, num_iters=10000, info_iters=100, variant="cfr",
+               alpha=1.5, beta=0.0, gamma=2.0):
+    """ Full-width CFR with the same interface and output as cfr.cfr. 'game' is
+    a CFRGame wrapping either an ExtensiveGame or a CompiledGame. Returns the
+    average strategy as a dictionary from information sets to probabilities
+    over actions. 'variant' selects plain CFR, CFR+ or DCFR as in cfr.cfr.
+    """
+    compiled = game.game if isinstance(game.game, CompiledGame) else compile_game(game.game)
+    solver = VectorCFR(compiled)
+    state = solver.state
+
+    average_strategy = None
+    average_visited = None
+    average_strategy_snapshot = None
+    snapshot_visited = None
+
+    for t in range(num_iters):
+        solver.step(t, variant, alpha, beta, gamma)
+
+        if (t % info_iters == 0) and (average_strategy is not None):
+            print("t: {}".format(t))
+            if average_strategy_snapshot is not None:
+                rows = np.flatnonzero(average_visited & snapshot_visited)
+                snapshot_distance = compare_strategy_arrays(
+                    average_strategy, average_strategy_snapshot,
+                    state.action_mask, rows)
+                print("Distance between strategies (t - 100): {:.10f}".format(snapshot_distance))
+
+                if snapshot_distance < 1e-5:
+                    break
+
+            average_strategy_snapshot = average_strategy
+            snapshot_visited = average_visited
+        average_strategy, average_visited = state.average_strategy()
+
+        if t % 1000 == 0:
+            # We also compute the best response to the current strategy.
+            exploitability = best_response.compute_exploitability(
+                compiled, state.strategy)
+            print("Current strategy exploitability: {:.4f}".format(exploitability))
+
+    exploitability = best_response.compute_exploitability(
+        compiled, state.average_strategy()[0])
+    print("Avg strategy exploitability: {:.4f}".format(exploitability))
+    return state.average_strategy_dict(compiled)